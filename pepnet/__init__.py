@@ -3,7 +3,13 @@ from .output import Output
 from .sequence_input import SequenceInput
 from .discrete_input import DiscreteInput
 from .predictor import Predictor
+from .predictor_group import PredictorGroup
+from .ensemble_predictor import EnsemblePredictor
 from .encoder import Encoder
+from .peptide_batch import PeptideBatch
+from .dataset_store import EncodedDatasetStore
+from .sharded_dataset import ShardedDataset, ShardedDatasetWriter
+from .sparse_labels import SparseLabels
 
 __all__ = [
     "NumericInput",
@@ -11,7 +17,14 @@ __all__ = [
     "DiscreteInput",
     "Output",
     "Predictor",
+    "PredictorGroup",
+    "EnsemblePredictor",
     "Encoder",
+    "PeptideBatch",
+    "EncodedDatasetStore",
+    "ShardedDataset",
+    "ShardedDatasetWriter",
+    "SparseLabels",
 ]
 
 __version__ = "0.4.1"
@@ -0,0 +1,314 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Store peptides encoded under a particular SequenceInput or Encoder
+configuration on disk, so that they can be reopened as memory-mapped arrays
+instead of being encoded again in every process.
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import hashlib
+import os
+
+import numpy as np
+import ujson
+
+from .encoder import Encoder
+from .peptide_batch import PeptideBatch
+
+MANIFEST_FILENAME = "manifest.json"
+ENCODED_FILENAME = "encoded.npy"
+
+
+def _hash_config(config):
+    return hashlib.sha1(
+        ujson.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def hash_peptides(peptides):
+    """
+    Hash of a collection of peptides which depends on their order.
+    """
+    batch = PeptideBatch.from_list(peptides).compact()
+    h = hashlib.sha1()
+    h.update(batch.lengths.astype("<i8").tobytes())
+    h.update(batch.residues.tobytes())
+    return h.hexdigest()
+
+
+def _encoder_config(encoder):
+    return {
+        "tokens": encoder.tokens,
+        "variable_length_sequences": encoder.variable_length_sequences,
+        "add_start_tokens": encoder.add_start_tokens,
+        "add_stop_tokens": encoder.add_stop_tokens,
+        "add_normalized_position": encoder.add_normalized_position,
+        "add_normalized_centrality": encoder.add_normalized_centrality,
+    }
+
+
+def encoding_config(source, encoding=None, max_peptide_length=None):
+    """
+    Returns (config, encode_fn) for a SequenceInput or for an Encoder along
+    with the name of one of its encodings. The config describes the encoded
+    array itself, so a SequenceInput and an Encoder which produce the same
+    array (e.g. an "embedding" input and the "index" encoding) get the same
+    config.
+    """
+    if isinstance(source, Encoder):
+        methods = {
+            "index": source.encode_index_array,
+            "onehot": source.encode_onehot,
+            "blosum": source.encode_blosum,
+            "pmbec": source.encode_pmbec,
+        }
+        if encoding not in methods:
+            raise ValueError("Invalid encoding for Encoder: %s" % (encoding,))
+        if max_peptide_length is None:
+            raise ValueError(
+                "max_peptide_length required to store encoded peptides")
+        config = _encoder_config(source)
+        config["encoding"] = encoding
+        config["padding_index"] = None
+        config["max_peptide_length"] = max_peptide_length
+
+        def encode_fn(peptides):
+            return methods[encoding](
+                peptides, max_peptide_length=max_peptide_length)
+        return config, encode_fn
+    elif hasattr(source, "encoding_config_key"):
+        config = _encoder_config(source.encoder)
+        if source.index_input:
+            config["encoding"] = "index"
+            # compact inputs pad with an extra index past the last token
+            config["padding_index"] = (
+                source.n_symbols if source.compact_input else None)
+        else:
+            config["encoding"] = source.encoding
+            config["padding_index"] = None
+        config["max_peptide_length"] = source.length
+        return config, source._encode_uncached
+    else:
+        raise TypeError(
+            "Expected SequenceInput or Encoder but got %s" % (type(source),))
+
+
+class EncodedArray(object):
+    """
+    Array of already encoded peptides which a Predictor can use in place of
+    raw peptides for a SequenceInput with the same encoding configuration.
+    Slicing returns another EncodedArray backed by the same memory.
+    """
+    def __init__(self, array, config):
+        self.array = array
+        self.config = config
+        self.config_hash = _hash_config(config)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, idx):
+        return EncodedArray(self.array[idx], self.config)
+
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return np.asarray(self.array)
+        return np.asarray(self.array, dtype=dtype)
+
+    def check_compatible(self, source):
+        config, _ = encoding_config(
+            source,
+            encoding=self.config.get("encoding"),
+            max_peptide_length=self.config.get("max_peptide_length"))
+        if _hash_config(config) != self.config_hash:
+            differences = sorted(
+                key for key in set(config).union(self.config)
+                if config.get(key) != self.config.get(key))
+            raise ValueError(
+                "Peptides were encoded with a different configuration "
+                "(differences in %s)" % (", ".join(differences),))
+        return self.array
+
+
+class EncodedDatasetStore(object):
+    """
+    Directory containing an encoded peptide array (as a .npy file) and a
+    manifest describing the encoding configuration and peptides used to
+    create it.
+    """
+    def __init__(self, directory, manifest, mmap_mode="r"):
+        self.directory = directory
+        self.manifest = manifest
+        self.array = np.load(
+            os.path.join(directory, ENCODED_FILENAME), mmap_mode=mmap_mode)
+
+    @property
+    def config(self):
+        return self.manifest["config"]
+
+    @property
+    def peptides_hash(self):
+        return self.manifest["peptides_hash"]
+
+    def __len__(self):
+        return len(self.array)
+
+    @property
+    def encoded(self):
+        """
+        EncodedArray which can be passed to Predictor.fit or predict.
+        """
+        return EncodedArray(self.array, self.config)
+
+    @classmethod
+    def _read_manifest(cls, directory):
+        with open(os.path.join(directory, MANIFEST_FILENAME), "r") as f:
+            return ujson.loads(f.read())
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, MANIFEST_FILENAME))
+
+    @classmethod
+    def create(
+            cls,
+            directory,
+            source,
+            peptides,
+            encoding=None,
+            max_peptide_length=None,
+            chunk_size=100000,
+            mmap_mode="r"):
+        """
+        Encode peptides chunk_size at a time into a .npy file in the given
+        directory and write a manifest next to it.
+
+        Parameters
+        ----------
+        directory : str
+
+        source : SequenceInput or Encoder
+
+        peptides : list of str or PeptideBatch
+
+        encoding : str, optional
+            Required if source is an Encoder: "index", "onehot", "blosum"
+            or "pmbec"
+
+        max_peptide_length : int, optional
+            Required if source is an Encoder
+
+        chunk_size : int
+            Number of peptides to encode at a time
+
+        mmap_mode : str
+            How to open the encoded array after writing it
+        """
+        config, encode_fn = encoding_config(
+            source, encoding=encoding, max_peptide_length=max_peptide_length)
+        if len(peptides) == 0:
+            raise ValueError("Can't store empty collection of peptides")
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        first = encode_fn(peptides[:1])
+        shape = (len(peptides),) + first.shape[1:]
+        array = np.lib.format.open_memmap(
+            os.path.join(directory, ENCODED_FILENAME),
+            mode="w+",
+            dtype=first.dtype,
+            shape=shape)
+        for start in range(0, len(peptides), chunk_size):
+            end = min(len(peptides), start + chunk_size)
+            array[start:end] = encode_fn(peptides[start:end])
+        array.flush()
+        del array
+        manifest = {
+            "config": config,
+            "config_hash": _hash_config(config),
+            "peptides_hash": hash_peptides(peptides),
+            "n_peptides": len(peptides),
+            "shape": list(shape),
+            "dtype": str(first.dtype),
+        }
+        # write the manifest last so that an interrupted run doesn't leave
+        # behind a store which looks complete
+        with open(os.path.join(directory, MANIFEST_FILENAME), "w") as f:
+            f.write(ujson.dumps(manifest))
+        return cls(directory, manifest, mmap_mode=mmap_mode)
+
+    @classmethod
+    def open(
+            cls,
+            directory,
+            source,
+            peptides=None,
+            encoding=None,
+            max_peptide_length=None,
+            mmap_mode="r"):
+        """
+        Open an existing store, checking that it was created with the same
+        encoding configuration (and the same peptides, if given).
+        """
+        manifest = cls._read_manifest(directory)
+        config, _ = encoding_config(
+            source, encoding=encoding, max_peptide_length=max_peptide_length)
+        if _hash_config(config) != manifest["config_hash"]:
+            stored_config = manifest["config"]
+            differences = sorted(
+                key for key in set(config).union(stored_config)
+                if config.get(key) != stored_config.get(key))
+            raise ValueError(
+                "Store in '%s' was encoded with a different configuration "
+                "(differences in %s)" % (directory, ", ".join(differences)))
+        if peptides is not None and hash_peptides(
+                peptides) != manifest["peptides_hash"]:
+            raise ValueError(
+                "Store in '%s' was created from different peptides" % (
+                    directory,))
+        return cls(directory, manifest, mmap_mode=mmap_mode)
+
+    @classmethod
+    def open_or_create(
+            cls,
+            directory,
+            source,
+            peptides,
+            encoding=None,
+            max_peptide_length=None,
+            chunk_size=100000,
+            mmap_mode="r"):
+        """
+        Reuse the store in the given directory if it exists, otherwise encode
+        the peptides and create it.
+        """
+        if cls.exists(directory):
+            return cls.open(
+                directory,
+                source,
+                peptides=peptides,
+                encoding=encoding,
+                max_peptide_length=max_peptide_length,
+                mmap_mode=mmap_mode)
+        return cls.create(
+            directory,
+            source,
+            peptides,
+            encoding=encoding,
+            max_peptide_length=max_peptide_length,
+            chunk_size=chunk_size,
+            mmap_mode=mmap_mode)
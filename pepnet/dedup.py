@@ -0,0 +1,100 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for encoding and predicting each distinct sample only once.
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import numpy as np
+from six import string_types
+
+from .peptide_batch import PeptideBatch
+
+
+class DedupCounter(object):
+    """
+    Running count of how many samples were seen and how many of them
+    were distinct.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n_samples = 0
+        self.n_unique = 0
+
+    def update(self, n_samples, n_unique):
+        self.n_samples += n_samples
+        self.n_unique += n_unique
+
+    @property
+    def ratio(self):
+        """
+        Average number of occurrences of each distinct sample.
+        """
+        if self.n_unique == 0:
+            return 1.0
+        return self.n_samples / self.n_unique
+
+    def __repr__(self):
+        return "DedupCounter(n_samples=%d, n_unique=%d, ratio=%0.2f)" % (
+            self.n_samples, self.n_unique, self.ratio)
+
+
+def _packed_rows(values):
+    """
+    Represent each sample as a row of bytes, so that equal samples have
+    equal rows.
+    """
+    if isinstance(values, PeptideBatch):
+        return values.to_padded_array()
+    if isinstance(values, (list, tuple)) or (
+            isinstance(values, np.ndarray) and values.dtype.kind == "O"):
+        if len(values) > 0 and isinstance(values[0], string_types):
+            return PeptideBatch.from_list(values).to_padded_array()
+    values = np.ascontiguousarray(values)
+    if values.dtype.kind == "O":
+        raise ValueError("Can't deduplicate values of type %s" % (
+            type(values[0]),))
+    return values.reshape((len(values), -1)).view("uint8")
+
+
+def find_unique_samples(columns):
+    """
+    Find distinct samples across one or more aligned collections of values
+    (lists of peptides, PeptideBatches or arrays).
+
+    Returns (unique_indices, inverse) where unique_indices is the index of
+    the first occurrence of each distinct sample and inverse maps every
+    sample to its position in unique_indices.
+    """
+    rows = np.hstack([_packed_rows(values) for values in columns])
+    rows = np.ascontiguousarray(rows)
+    keys = rows.view(np.dtype((np.void, rows.shape[1]))).ravel()
+    _, unique_indices, inverse = np.unique(
+        keys, return_index=True, return_inverse=True)
+    return unique_indices, inverse.ravel()
+
+
+def take_samples(values, indices):
+    """
+    Select samples by index from a list, array or PeptideBatch.
+    """
+    if isinstance(values, (list, tuple)):
+        return [values[i] for i in indices]
+    return values[indices]
@@ -21,7 +21,6 @@ from six import integer_types
 from six.moves import range
 
 from .numeric import Numeric
-from .nn_helpers import make_index_sequence_input, dense_layers, embedding, flatten
 
 class DiscreteInput(Numeric):
     """
@@ -149,6 +148,9 @@ class DiscreteInput(Numeric):
         return index_array
 
     def build(self):
+        from .nn_helpers import (
+            make_index_sequence_input, dense_layers, embedding, flatten)
+
         input_object = make_index_sequence_input(name=self.name, length=1)
         embedded = embedding(
             value=input_object,
@@ -15,12 +15,45 @@ from collections import OrderedDict
 
 from typechecks import require_instance
 from serializable import Serializable
-from pepdata.amino_acid_alphabet import (
-    amino_acid_letter_indices,
-    canonical_amino_acids
-)
-from pepdata.pmbec import pmbec_matrix
-from pepdata.blosum import blosum62_matrix
+
+from .peptide_batch import PeptideBatch
+from .parallel import parallel_encode, resolve_n_jobs
+from .dedup import DedupCounter, find_unique_samples, take_samples
+
+# feature tables derived from pairwise property matrices, keyed by
+# (matrix name, tokens, amino acid alphabet)
+_feature_table_cache = {}
+
+# powers of the FOFE forgetting factor, keyed by (alpha, max length)
+_fofe_powers_cache = {}
+
+
+def _fofe_powers(alpha, max_length):
+    """
+    Returns the vector [1, alpha, alpha ** 2, ..., alpha ** (max_length - 1)]
+    """
+    key = (alpha, max_length)
+    if key not in _fofe_powers_cache:
+        _fofe_powers_cache[key] = alpha ** np.arange(max_length, dtype="float64")
+    return _fofe_powers_cache[key]
+
+
+def _canonical_amino_acids():
+    # pepdata pulls in scikit-learn, so it's only imported once an Encoder
+    # is actually created
+    from pepdata.amino_acid_alphabet import canonical_amino_acids
+    return canonical_amino_acids
+
+
+def _property_matrix(property_name):
+    if property_name == "blosum":
+        from pepdata.blosum import blosum62_matrix
+        return blosum62_matrix
+    elif property_name == "pmbec":
+        from pepdata.pmbec import pmbec_matrix
+        return pmbec_matrix
+    else:
+        raise ValueError("Invalid property matrix: %s" % (property_name,))
 
 
 class Encoder(Serializable):
@@ -33,7 +66,7 @@ class Encoder(Serializable):
     """
     def __init__(
             self,
-            amino_acid_alphabet=canonical_amino_acids,
+            amino_acid_alphabet=None,
             variable_length_sequences=True,
             add_start_tokens=False,
             add_stop_tokens=False,
@@ -42,8 +75,8 @@ class Encoder(Serializable):
         """
         Parameters
         ----------
-        tokens_to_names_dict : dict
-            Dictionary mapping each amino acid to its name
+        amino_acid_alphabet : list of pepdata.amino_acid.AminoAcid, optional
+            Amino acids to encode, default is the 20 canonical amino acids
 
         variable_length_sequences : bool
             Do we expect to encode peptides of varying lengths? If so, include
@@ -67,7 +100,11 @@ class Encoder(Serializable):
         """
         self._tokens_to_names = OrderedDict()
         self._index_dict = {}
+        self._index_lookup_table = None
+        self.dedup_counter = DedupCounter()
 
+        if amino_acid_alphabet is None:
+            amino_acid_alphabet = _canonical_amino_acids()
         self.amino_acid_alphabet = amino_acid_alphabet
         self.variable_length_sequences = variable_length_sequences
         self.add_start_tokens = add_start_tokens
@@ -93,6 +130,8 @@ class Encoder(Serializable):
         assert token not in self._tokens_to_names
         self._index_dict[token] = len(self._index_dict)
         self._tokens_to_names[token] = name
+        # lookup table depends on the set of tokens so it has to be rebuilt
+        self._index_lookup_table = None
 
     def prepare_sequences(self, peptides, padded_peptide_length=None):
         """
@@ -100,6 +139,9 @@ class Encoder(Serializable):
         if padded_peptide_length is provided then pad each peptide to
         be the same length using the gap token '-'.
         """
+        if isinstance(peptides, PeptideBatch):
+            return self._prepare_peptide_batch(peptides, padded_peptide_length)
+
         if self.add_start_tokens:
             peptides = ["^" + p for p in peptides]
             if padded_peptide_length:
@@ -117,6 +159,24 @@ class Encoder(Serializable):
             ]
         return peptides
 
+    def _prepare_peptide_batch(self, peptides, padded_peptide_length=None):
+        """
+        Same as prepare_sequences but for a PeptideBatch.
+        """
+        prefix = "^" if self.add_start_tokens else ""
+        suffix = "$" if self.add_stop_tokens else ""
+        if prefix or suffix:
+            peptides = peptides.add_flanking_tokens(prefix, suffix)
+        if padded_peptide_length:
+            padded_peptide_length += len(prefix) + len(suffix)
+            padded = peptides.to_padded_array(padded_peptide_length)
+            padded[padded == 0] = ord("-")
+            peptides = PeptideBatch(
+                residues=padded.reshape(-1),
+                starts=np.arange(len(peptides)) * padded_peptide_length,
+                lengths=np.full(len(peptides), padded_peptide_length))
+        return peptides
+
     @property
     def tokens(self):
         """
@@ -139,6 +199,27 @@ class Encoder(Serializable):
     def index_dict(self):
         return self._index_dict
 
+    @property
+    def index_lookup_table(self):
+        """
+        Array of 256 entries mapping each byte value to the index of the
+        corresponding token. Bytes which aren't valid tokens map to 255. If
+        we're encoding variable length sequences then the null byte (which
+        NumPy uses to pad fixed-width byte strings) maps to the gap token.
+        """
+        if self._index_lookup_table is None:
+            if len(self._index_dict) >= 255:
+                raise ValueError(
+                    "Too many tokens (%d) for uint8 index encoding" % (
+                        len(self._index_dict),))
+            table = np.full(256, 255, dtype="uint8")
+            for token, idx in self._index_dict.items():
+                table[ord(token)] = idx
+            if self.variable_length_sequences:
+                table[0] = self._index_dict["-"]
+            self._index_lookup_table = table
+        return self._index_lookup_table
+
     def __getitem__(self, k):
         return self._tokens_to_names[k]
 
@@ -152,26 +233,31 @@ class Encoder(Serializable):
             self,
             peptides,
             max_peptide_length=None):
-        require_instance(peptides, (list, tuple, np.ndarray))
+        require_instance(peptides, (list, tuple, np.ndarray, PeptideBatch))
+        if isinstance(peptides, PeptideBatch):
+            lengths = peptides.lengths
+        else:
+            lengths = np.array([len(p) for p in peptides], dtype="int64")
         if max_peptide_length is None:
-            max_peptide_length = max(len(p) for p in peptides)
+            max_peptide_length = lengths.max()
 
         if self.variable_length_sequences:
-            max_observed_length = max(len(p) for p in peptides)
+            max_observed_length = lengths.max()
             if max_observed_length > max_peptide_length:
-                example = [p for p in peptides if len(p) == max_observed_length][0]
+                example = peptides[int(lengths.argmax())]
                 raise ValueError(
                     "Peptide(s) of length %d when max = %d (example '%s')" % (
                         max_observed_length,
                         max_peptide_length,
                         example))
-        elif any(len(p) != max_peptide_length for p in peptides):
-            example = [p for p in peptides if len(p) != max_peptide_length][0]
+        elif (lengths != max_peptide_length).any():
+            example = peptides[int(np.flatnonzero(
+                lengths != max_peptide_length)[0])]
             raise ValueError("Expected all peptides to have length %d, '%s' has length %d" % (
                 max_peptide_length,
                 example,
                 len(example)))
-        return max_peptide_length
+        return int(max_peptide_length)
 
     def _validate_and_prepare_peptides(self, peptides, max_peptide_length=None):
         max_peptide_length = self._validate_peptide_lengths(
@@ -193,108 +279,356 @@ class Encoder(Serializable):
             for peptide in peptides
         ]
 
+    def _peptides_to_byte_array(self, peptides, max_peptide_length=None):
+        """
+        Pack a list of prepared peptides into a (n_peptides, max_peptide_length)
+        uint8 array of their characters, with shorter peptides padded by
+        null bytes. If max_peptide_length isn't given then it's the length
+        of the longest peptide.
+        """
+        if isinstance(peptides, PeptideBatch):
+            return peptides.to_padded_array(max_peptide_length)
+        if max_peptide_length is None:
+            dtype = "S"
+        else:
+            dtype = "S%d" % max_peptide_length
+        try:
+            byte_strings = np.array(peptides, dtype=dtype)
+        except UnicodeEncodeError:
+            raise ValueError("Peptides must only contain ASCII characters")
+        return byte_strings.view("uint8").reshape(
+            (len(peptides), byte_strings.dtype.itemsize))
+
+    def _index_array_from_prepared_peptides(
+            self,
+            peptides,
+            max_peptide_length,
+            dtype="uint8",
+            padding_index=None):
+        """
+        Map prepared peptides to token indices. If padding_index is given then
+        positions past the end of each peptide get that index instead of
+        the index of the gap token.
+        """
+        return self._index_array_from_byte_array(
+            self._peptides_to_byte_array(peptides, max_peptide_length),
+            dtype=dtype,
+            padding_index=padding_index)
+
+    def _index_array_from_byte_array(
+            self,
+            byte_array,
+            dtype="uint8",
+            padding_index=None):
+        """
+        Map an array of peptide characters (from _peptides_to_byte_array)
+        to token indices.
+        """
+        lookup_table = self.index_lookup_table
+        if padding_index is not None:
+            lookup_table = lookup_table.copy()
+            lookup_table[0] = padding_index
+        X_index = lookup_table[byte_array]
+        if (X_index == 255).any():
+            invalid_tokens = {
+                chr(b) for b in np.unique(byte_array[X_index == 255])
+            }
+            raise ValueError("Unknown token(s) %s in peptides" % (
+                sorted(invalid_tokens),))
+        if X_index.dtype != dtype:
+            X_index = X_index.astype(dtype)
+        return X_index
+
     def encode_index_array(
             self,
             peptides,
-            max_peptide_length=None):
+            max_peptide_length=None,
+            dtype="uint8",
+            padding_index=None,
+            out=None,
+            n_jobs=1):
         """
         Encode a set of equal length peptides as a matrix of their
         amino acid indices.
+
+        Parameters
+        ----------
+        peptides : list of str or PeptideBatch
+
+        max_peptide_length : int, optional
+            Length to pad peptides to (before start/stop tokens are added)
+
+        dtype : str
+            Integer type of the returned index matrix
+
+        padding_index : int, optional
+            Index to use for positions past the end of each peptide, by
+            default these get the index of the gap token (0)
+
+        out : np.ndarray, optional
+            Preallocated array to write the encoding into
+
+        n_jobs : int
+            Number of processes to split encoding across (-1 for all CPUs)
         """
         assert not self.add_normalized_centrality
         assert not self.add_normalized_position
+        if resolve_n_jobs(n_jobs) > 1:
+            return parallel_encode(
+                self,
+                "encode_index_array",
+                peptides,
+                n_jobs=n_jobs,
+                out=out,
+                max_peptide_length=self._validate_peptide_lengths(
+                    peptides, max_peptide_length),
+                dtype=dtype,
+                padding_index=padding_index)
         peptides, max_peptide_length = self._validate_and_prepare_peptides(
             peptides, max_peptide_length)
-        n_peptides = len(peptides)
-        X_index = np.zeros((n_peptides, max_peptide_length), dtype=int)
-        index_dict = self.index_dict
-        for i, peptide in enumerate(peptides):
-            for j, amino_acid in enumerate(peptide):
-                # we're expecting the token '-' to have index 0 so it's
-                # OK to only loop until the end of the given sequence
-                X_index[i, j] = index_dict[amino_acid]
+        # we're expecting the token '-' to have index 0 so it's
+        # OK to leave the ends of shorter sequences as null bytes, which
+        # the lookup table maps to the gap token
+        X_index = self._index_array_from_prepared_peptides(
+            peptides,
+            max_peptide_length,
+            dtype=dtype,
+            padding_index=padding_index)
+        if out is not None:
+            self._check_output_buffer(out, X_index.shape, dtype)
+            out[...] = X_index
+            X_index = out
         return X_index
 
-    def _add_extra_features(self, X, peptides):
-        if not self.add_normalized_position and not self.add_normalized_centrality:
-            return X
-        lengths = np.array([len(p) for p in peptides])
-        n = len(X)
-        max_length = lengths.max()
-
-        X_centrality = np.zeros((n, max_length), dtype="float32")
-        X_position = np.zeros((n, max_length), dtype="float32")
-        for i, l in enumerate(lengths):
-            center = (l - 1) / 2
-            vec = np.arange(l)
-            X_centrality[i, :l] = np.abs(vec - center) / center
-            X_position[i, :] = vec / l
-        extra_arrays = []
+    @property
+    def n_extra_features(self):
+        """
+        Number of positional feature channels added after the representation
+        of each residue.
+        """
+        return (
+            int(self.add_normalized_centrality) +
+            int(self.add_normalized_position))
+
+    def _fill_extra_features(self, X_extra, lengths):
+        """
+        Write centrality and/or position channels into X_extra, which has
+        shape (n_peptides, max_length, n_extra_features). Positions past the
+        end of each peptide are set to 0.
+        """
+        max_length = X_extra.shape[1]
+        positions = np.arange(max_length, dtype="float32")[np.newaxis, :]
+        lengths = lengths.astype("float32")[:, np.newaxis]
+        in_peptide = positions < lengths
+        channel = 0
         if self.add_normalized_centrality:
-            extra_arrays.append(X_centrality)
+            center = (lengths - 1) / 2
+            with np.errstate(divide="ignore", invalid="ignore"):
+                centrality = np.abs(positions - center) / center
+            # single residue peptides have no distance from their center
+            X_extra[:, :, channel] = np.where(
+                in_peptide & (center > 0), centrality, 0)
+            channel += 1
         if self.add_normalized_position:
-            extra_arrays.append(X_position)
-        return np.dstack([X] + extra_arrays)
+            X_extra[:, :, channel] = np.where(
+                in_peptide, positions / lengths, 0)
 
-    def _encode_from_pairwise_properties(
-            self, peptides, max_peptide_length, property_matrix):
+    def _check_output_buffer(self, out, shape, dtype):
+        """
+        Make sure that a caller-supplied output array can hold the encoded
+        peptides.
+        """
+        if out.shape != shape:
+            raise ValueError("Expected output buffer of shape %s but got %s" % (
+                shape, out.shape))
+        if out.dtype != np.dtype(dtype):
+            raise ValueError("Expected output buffer of dtype %s but got %s" % (
+                np.dtype(dtype), out.dtype))
+
+    def _encode_from_token_table(
+            self, peptides, max_peptide_length, table, out=None):
+        """
+        Encode peptides by replacing each token index with the corresponding
+        row of a (n_tokens, n_features) table.
+        """
+        n_extra_features = self.n_extra_features
+        if n_extra_features and table.dtype.kind != "f":
+            raise ValueError(
+                "Positional features require a floating point dtype, got %s" % (
+                    table.dtype,))
         peptides, max_peptide_length = self._validate_and_prepare_peptides(
             peptides, max_peptide_length)
-        n_peptides = len(peptides)
-        shape = (n_peptides, max_peptide_length, 20)
-        X = np.zeros(shape, dtype="float32")
-        aa_to_feature_row = {}
-        alphabet_indices = [
-            amino_acid_letter_indices[aa.letter]
-            for aa in self.amino_acid_alphabet
-        ]
-        for aa in self.amino_acid_alphabet:
-            aa_idx = amino_acid_letter_indices[aa.letter]
-            row = property_matrix[aa_idx, :]
-            row = row[alphabet_indices]
-            aa_to_feature_row[aa.letter] = row
-
-        # add zero vectors for gap, start and stop tokens
-        for token in ["-", "^", "$"]:
-            aa_to_feature_row[token] = np.zeros(
-                len(alphabet_indices), dtype="float32")
-        for i, peptide in enumerate(peptides):
-            for j, amino_acid in enumerate(peptide):
-                X[i, j, :] = aa_to_feature_row[amino_acid]
-        return self._add_extra_features(X, peptides)
-
-    def encode_pmbec(self, peptides, max_peptide_length=None):
+        # positions past the end of a peptide get an extra row of zeros,
+        # unlike explicit gap characters which get the gap token's row
+        n_tokens, n_features = table.shape
+        X_index = self._index_array_from_prepared_peptides(
+            peptides, max_peptide_length, padding_index=n_tokens)
+        table = np.vstack([table, np.zeros_like(table[:1])])
+        shape = X_index.shape + (n_features + n_extra_features,)
+        if out is None:
+            out = np.empty(shape, dtype=table.dtype)
+        else:
+            self._check_output_buffer(out, shape, table.dtype)
+        if not n_extra_features:
+            return np.take(table, X_index, axis=0, out=out)
+        # write token features and positional features into separate
+        # channels of the same output array to avoid concatenating copies
+        out[:, :, :n_features] = table[X_index]
+        lengths = (X_index != n_tokens).sum(axis=1)
+        self._fill_extra_features(out[:, :, n_features:], lengths)
+        return out
+
+    def _feature_table(self, property_name):
+        """
+        Returns a float32 array with a row of features for each token,
+        computed from a pairwise amino acid property matrix ("blosum" for
+        BLOSUM62 or "pmbec"). Special tokens get rows of zeros. Tables are
+        cached for each combination of matrix and alphabet.
+        """
+        key = (property_name, tuple(self.tokens), tuple(
+            aa.letter for aa in self.amino_acid_alphabet))
+        if key not in _feature_table_cache:
+            from pepdata.amino_acid_alphabet import amino_acid_letter_indices
+
+            property_matrix = _property_matrix(property_name)
+            alphabet_indices = [
+                amino_acid_letter_indices[aa.letter]
+                for aa in self.amino_acid_alphabet
+            ]
+            table = np.zeros(
+                (len(self.tokens), len(alphabet_indices)), dtype="float32")
+            for token, idx in self.index_dict.items():
+                if token in {"-", "^", "$"}:
+                    # zero vectors for gap, start and stop tokens
+                    continue
+                if token not in amino_acid_letter_indices:
+                    raise ValueError(
+                        "No %s features for token '%s'" % (
+                            property_name, token))
+                row = property_matrix[amino_acid_letter_indices[token], :]
+                table[idx, :] = row[alphabet_indices]
+            _feature_table_cache[key] = table
+        return _feature_table_cache[key]
+
+    def _encode_from_pairwise_properties(
+            self,
+            peptides,
+            max_peptide_length,
+            property_name,
+            out=None):
+        return self._encode_from_token_table(
+            peptides,
+            max_peptide_length,
+            table=self._feature_table(property_name),
+            out=out)
+
+    def feature_table(self, encoding, dtype="float32"):
+        """
+        Returns a (n_tokens, n_features) array whose rows are the
+        representation of each token under the given encoding.
+
+        Parameters
+        ----------
+        encoding : {"onehot", "blosum", "pmbec"}
+
+        dtype : str
+            Type of the one-hot table (BLOSUM and PMBEC are always float32)
+        """
+        if encoding == "onehot":
+            return np.eye(len(self.index_dict), dtype=dtype)
+        elif encoding == "blosum":
+            return self._feature_table("blosum")
+        elif encoding == "pmbec":
+            return self._feature_table("pmbec")
+        else:
+            raise ValueError("Invalid encoding: %s" % (encoding,))
+
+    def encode_pmbec(
+            self, peptides, max_peptide_length=None, out=None, n_jobs=1):
+        if resolve_n_jobs(n_jobs) > 1:
+            return parallel_encode(
+                self,
+                "encode_pmbec",
+                peptides,
+                n_jobs=n_jobs,
+                out=out,
+                max_peptide_length=self._validate_peptide_lengths(
+                    peptides, max_peptide_length))
         return self._encode_from_pairwise_properties(
             peptides=peptides,
             max_peptide_length=max_peptide_length,
-            property_matrix=pmbec_matrix)
-
-    def encode_blosum(self, peptides, max_peptide_length=None):
+            property_name="pmbec",
+            out=out)
+
+    def encode_blosum(
+            self, peptides, max_peptide_length=None, out=None, n_jobs=1):
+        if resolve_n_jobs(n_jobs) > 1:
+            return parallel_encode(
+                self,
+                "encode_blosum",
+                peptides,
+                n_jobs=n_jobs,
+                out=out,
+                max_peptide_length=self._validate_peptide_lengths(
+                    peptides, max_peptide_length))
         return self._encode_from_pairwise_properties(
             peptides=peptides,
             max_peptide_length=max_peptide_length,
-            property_matrix=blosum62_matrix)
+            property_name="blosum",
+            out=out)
 
     def encode_onehot(
             self,
             peptides,
-            max_peptide_length=None):
+            max_peptide_length=None,
+            dtype="float32",
+            out=None,
+            n_jobs=1):
         """
         Encode a set of equal length peptides as a binary matrix,
         where each letter is transformed into a length 20 vector with a single
         element that is 1 (and the others are 0).
+
+        Parameters
+        ----------
+        peptides : list of str or PeptideBatch
+
+        max_peptide_length : int, optional
+            Length to pad peptides to (before start/stop tokens are added)
+
+        dtype : str
+            Type of the returned array, e.g. "uint8" or "float32"
+
+        out : np.ndarray, optional
+            Preallocated array to write the encoding into, useful for reusing
+            memory across batches
+
+        n_jobs : int
+            Number of processes to split encoding across (-1 for all CPUs)
         """
-        peptides, max_peptide_length = self._validate_and_prepare_peptides(
-            peptides, max_peptide_length)
-        index_dict = self.index_dict
-        n_symbols = len(index_dict)
-        X = np.zeros((len(peptides), max_peptide_length, n_symbols), dtype=bool)
-        for i, peptide in enumerate(peptides):
-            for j, amino_acid in enumerate(peptide):
-                X[i, j, index_dict[amino_acid]] = 1
-        return self._add_extra_features(X, peptides)
+        if resolve_n_jobs(n_jobs) > 1:
+            return parallel_encode(
+                self,
+                "encode_onehot",
+                peptides,
+                n_jobs=n_jobs,
+                out=out,
+                max_peptide_length=self._validate_peptide_lengths(
+                    peptides, max_peptide_length),
+                dtype=dtype)
+        return self._encode_from_token_table(
+            peptides,
+            max_peptide_length,
+            table=self.feature_table("onehot", dtype=dtype),
+            out=out)
 
-    def encode_FOFE(self, peptides, alpha=0.7, bidirectional=False):
+    def encode_FOFE(
+            self,
+            peptides,
+            alpha=0.7,
+            bidirectional=False,
+            out=None,
+            n_jobs=1):
         """
         Implementation of FOFE encoding from:
             A Fixed-Size Encoding Method for Variable-Length Sequences with its
@@ -302,7 +636,7 @@ class Encoder(Serializable):
 
         Parameters
         ----------
-        peptides : list of strings
+        peptides : list of strings or PeptideBatch
 
         alpha: float
             Forgetting factor
@@ -310,22 +644,88 @@ class Encoder(Serializable):
         bidirectional: boolean
             Whether to do both a forward pass and a backward pass over each
             peptide
+
+        out : np.ndarray, optional
+            Preallocated float32 array to write the encoding into
+
+        n_jobs : int
+            Number of processes to split encoding across (-1 for all CPUs)
         """
+        if resolve_n_jobs(n_jobs) > 1:
+            return parallel_encode(
+                self,
+                "encode_FOFE",
+                peptides,
+                n_jobs=n_jobs,
+                out=out,
+                alpha=alpha,
+                bidirectional=bidirectional)
         # don't try to do length validation since we're allowed to have
         # multiple peptide lengths in a FOFE encoding
         peptides = self.prepare_sequences(peptides)
         n_peptides = len(peptides)
-        index_dict = self.index_dict
-        n_symbols = len(index_dict)
+        n_symbols = len(self.index_dict)
+        byte_array = self._peptides_to_byte_array(peptides)
+        max_length = byte_array.shape[1]
+        # positions past the end of each peptide are assigned an extra
+        # symbol whose column gets dropped from the result
+        X_index = self._index_array_from_byte_array(
+            byte_array, padding_index=n_symbols)
+        padding = X_index == n_symbols
+        lengths = max_length - padding.sum(axis=1)
+        powers = _fofe_powers(alpha, max_length)
+
+        # position j of a peptide of length l has weight alpha ** (l - j - 1)
+        exponents = lengths[:, np.newaxis] - np.arange(max_length) - 1
+        weights_list = [powers[np.maximum(exponents, 0)]]
         if bidirectional:
-            result = np.zeros((n_peptides, 2 * n_symbols), dtype=float)
+            # in the backward direction the weight is just alpha ** j
+            weights_list.append(
+                np.broadcast_to(powers, (n_peptides, max_length)))
+
+        row_offsets = np.arange(n_peptides)[:, np.newaxis] * (n_symbols + 1)
+        flat_indices = (row_offsets + X_index).ravel()
+        n_bins = n_peptides * (n_symbols + 1)
+        shape = (n_peptides, n_symbols * len(weights_list))
+        if out is None:
+            result = np.empty(shape, dtype="float32")
         else:
-            result = np.zeros((n_peptides, n_symbols), dtype=float)
-        for i, p in enumerate(peptides):
-            l = len(p)
-            for j, amino_acid in enumerate(p):
-                aa_idx = index_dict[amino_acid]
-                result[i, aa_idx] += alpha ** (l - j - 1)
-                if bidirectional:
-                    result[i, n_symbols + aa_idx] += alpha ** j
+            self._check_output_buffer(out, shape, "float32")
+            result = out
+        for i, weights in enumerate(weights_list):
+            counts = np.bincount(
+                flat_indices, weights=weights.ravel(), minlength=n_bins)
+            result[:, i * n_symbols:(i + 1) * n_symbols] = counts.reshape(
+                (n_peptides, n_symbols + 1))[:, :n_symbols]
         return result
+
+    def encode_deduplicated(self, peptides, encoding="onehot", **kwargs):
+        """
+        Encode each distinct peptide only once and then copy its
+        representation to every position where it occurs. The result is the
+        same as calling the encoding method on all the peptides. Counts of
+        all and distinct peptides are added to self.dedup_counter.
+
+        Parameters
+        ----------
+        peptides : list of str or PeptideBatch
+
+        encoding : {"index", "onehot", "blosum", "pmbec", "FOFE"}
+
+        **kwargs : dict
+            Other arguments to the encoding method
+        """
+        methods = {
+            "index": self.encode_index_array,
+            "onehot": self.encode_onehot,
+            "blosum": self.encode_blosum,
+            "pmbec": self.encode_pmbec,
+            "FOFE": self.encode_FOFE,
+        }
+        if encoding not in methods:
+            raise ValueError("Invalid encoding: %s" % (encoding,))
+        unique_indices, inverse = find_unique_samples([peptides])
+        self.dedup_counter.update(len(peptides), len(unique_indices))
+        X_unique = methods[encoding](
+            take_samples(peptides, unique_indices), **kwargs)
+        return X_unique[inverse]
@@ -0,0 +1,186 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from .peptide_batch import PeptideBatch
+
+# default memory budget of the cache shared by SequenceInputs
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+# rough per-entry cost of the dictionary entry, key tuple and array header
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+class EncodingCache(object):
+    """
+    Least-recently-used cache of encoded peptides, keyed by an encoding
+    configuration and the peptide's residues. Each entry is the encoded
+    representation of a single peptide, and entries are evicted when the
+    total size of the cache exceeds max_bytes.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        n_lookups = self.hits + self.misses
+        if n_lookups == 0:
+            return 0.0
+        return self.hits / n_lookups
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "bytes": self.n_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def __repr__(self):
+        return "EncodingCache(%s)" % ", ".join(
+            "%s=%s" % (k, v) for (k, v) in sorted(self.stats().items()))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.n_bytes = 0
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self.n_bytes > self.max_bytes and self._entries:
+            _, row = self._entries.popitem(last=False)
+            self.n_bytes -= row.nbytes + _ENTRY_OVERHEAD_BYTES
+            self.evictions += 1
+
+    def _insert(self, key, row):
+        size = row.nbytes + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.n_bytes -= self._entries.pop(key).nbytes + _ENTRY_OVERHEAD_BYTES
+        self._entries[key] = row
+        self.n_bytes += size
+        self._evict()
+
+    def encode(self, config_key, peptides, encode_fn):
+        """
+        Encode peptides using cached rows where available and calling
+        encode_fn on the distinct peptides which aren't in the cache.
+
+        Parameters
+        ----------
+        config_key : hashable
+            Everything about the encoding besides the peptide (e.g. encoder
+            settings, encoding type and padded length). The encoding of each
+            peptide must only depend on config_key and the peptide itself.
+
+        peptides : iterable of str or PeptideBatch
+
+        encode_fn : callable
+            Function which takes peptides (a PeptideBatch if one was given,
+            otherwise a list of str) and returns an array whose rows are
+            their encodings.
+        """
+        if not isinstance(peptides, PeptideBatch):
+            peptides = list(peptides)
+        residue_keys = _residue_keys(peptides)
+        rows = [None] * len(residue_keys)
+        missing = OrderedDict()
+        with self._lock:
+            for i, residues in enumerate(residue_keys):
+                key = (config_key, residues)
+                row = self._entries.pop(key, None)
+                if row is None:
+                    self.misses += 1
+                    missing.setdefault(residues, []).append(i)
+                else:
+                    self.hits += 1
+                    # re-insert to mark as most recently used
+                    self._entries[key] = row
+                    rows[i] = row
+        if missing:
+            first_indices = [indices[0] for indices in missing.values()]
+            if isinstance(peptides, PeptideBatch):
+                encoded = encode_fn(peptides[np.array(first_indices)])
+            else:
+                encoded = encode_fn([peptides[i] for i in first_indices])
+            with self._lock:
+                for (residues, indices), row in zip(missing.items(), encoded):
+                    row = np.array(row)
+                    self._insert((config_key, residues), row)
+                    for i in indices:
+                        rows[i] = row
+        if len(rows) == 0:
+            return encode_fn(peptides)
+        result = np.empty((len(rows),) + rows[0].shape, dtype=rows[0].dtype)
+        for i, row in enumerate(rows):
+            result[i] = row
+        return result
+
+
+def _residue_keys(peptides):
+    """
+    Bytes of each peptide's residues, so that peptides in a PeptideBatch are
+    looked up without decoding them into strings and share cache entries
+    with the same peptides given as strings.
+    """
+    if isinstance(peptides, PeptideBatch):
+        residues = peptides.residues
+        return [
+            residues[start:start + length].tobytes()
+            for (start, length) in zip(
+                peptides.starts.tolist(), peptides.lengths.tolist())
+        ]
+    try:
+        return [peptide.encode("ascii") for peptide in peptides]
+    except UnicodeEncodeError:
+        raise ValueError("Peptides must only contain ASCII characters")
+
+
+_shared_cache = None
+
+
+def shared_encoding_cache():
+    """
+    Returns the cache used by all SequenceInputs with cache_encodings=True,
+    creating it on first use.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = EncodingCache()
+    return _shared_cache
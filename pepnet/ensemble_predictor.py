@@ -0,0 +1,342 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Ensembles of Predictors evaluated as a single Keras model, with the
+predictions of the members combined inside the model.
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import os
+import sys
+
+from serializable import (
+    Serializable,
+    to_serializable_repr,
+    from_serializable_repr,
+)
+from six import string_types
+import ujson
+
+from .predictor import Predictor
+from .predictor_group import input_encoding_key
+from .weights_file import write_weights_file, read_weights_file
+
+
+def _mean(x):
+    import keras.backend as K
+    return K.mean(x, axis=1)
+
+
+def _median(x):
+    import keras.backend as K
+    import tensorflow as tf
+
+    n_members = K.int_shape(x)[1]
+    # move the member axis last so that top_k sorts across members
+    ndim = K.ndim(x)
+    x = K.permute_dimensions(x, [0] + list(range(2, ndim)) + [1])
+    values = tf.nn.top_k(x, k=n_members).values
+    lower = values[..., (n_members - 1) // 2]
+    upper = values[..., n_members // 2]
+    return (lower + upper) / 2.0
+
+
+def _is_importable(fn):
+    """
+    Can this function be found again by its module and name?
+    """
+    module = sys.modules.get(getattr(fn, "__module__", None))
+    return getattr(module, getattr(fn, "__name__", ""), None) is fn
+
+
+# functions which combine predictions stacked along axis 1 into a single
+# prediction per sample
+REDUCTIONS = {
+    "mean": _mean,
+    "median": _median,
+}
+
+
+class EnsemblePredictor(Serializable):
+    """
+    Ensemble of Predictors which is evaluated as one Keras model. Peptides
+    are only encoded once for all members whose inputs of the same name are
+    encoded the same way, and the members' predictions for each output are
+    combined by a reduction inside the model, so predicting with the
+    ensemble is a single forward pass.
+
+    Parameters
+    ----------
+    predictors : list of Predictor
+        Members, which must have the same input names and the same output
+        names. Predictions are decoded using the output transforms of the
+        first member.
+
+    reduction : str or callable
+        Either "mean", "median", or a function which takes a tensor of
+        member predictions stacked along axis 1 and returns their
+        combination (e.g. a function which returns
+        keras.backend.max(x, axis=1)). Ensembles with a custom reduction
+        can only be serialized if it's a module-level function, which is
+        saved by name and imported again on load.
+    """
+    def __init__(self, predictors, reduction="mean"):
+        predictors = list(predictors)
+        if len(predictors) == 0:
+            raise ValueError(
+                "EnsemblePredictor requires at least one Predictor")
+        if isinstance(reduction, string_types):
+            if reduction not in REDUCTIONS:
+                raise ValueError("Invalid reduction: %s" % (reduction,))
+        elif not callable(reduction):
+            raise TypeError(
+                "Expected reduction to be str or function but got %s" % (
+                    type(reduction),))
+        first = predictors[0]
+        for i, predictor in enumerate(predictors[1:], 1):
+            if sorted(predictor.input_order) != sorted(first.input_order):
+                raise ValueError(
+                    "Predictor %d has inputs %s but expected %s" % (
+                        i, predictor.input_order, first.input_order))
+            if predictor.output_order != first.output_order:
+                raise ValueError(
+                    "Predictor %d has outputs %s but expected %s" % (
+                        i, predictor.output_order, first.output_order))
+        self.predictors = predictors
+        self.reduction = reduction
+        self._plan_shared_inputs()
+        self._model = None
+
+    def __len__(self):
+        return len(self.predictors)
+
+    def _plan_shared_inputs(self):
+        """
+        Assign every member input to an input of the ensemble, with one
+        ensemble input for each distinct encoding of each input name.
+        """
+        keys = {}
+        # list of (ensemble input name, raw input name, input descriptor)
+        self.shared_inputs = []
+        # ensemble input names used by each member, in its input order
+        self.member_input_names = []
+        for predictor in self.predictors:
+            names = []
+            for input_obj in predictor.inputs:
+                key = (input_obj.name, input_encoding_key(input_obj))
+                if key not in keys:
+                    n_encodings = sum(
+                        1 for k in keys if k[0] == input_obj.name)
+                    if n_encodings == 0:
+                        shared_name = input_obj.name
+                    else:
+                        shared_name = "%s_%d" % (input_obj.name, n_encodings)
+                    keys[key] = shared_name
+                    self.shared_inputs.append(
+                        (shared_name, input_obj.name, input_obj))
+                names.append(keys[key])
+            self.member_input_names.append(names)
+
+    @property
+    def n_encodings(self):
+        """
+        Number of times each batch of raw inputs is encoded.
+        """
+        return len(self.shared_inputs)
+
+    @property
+    def model(self):
+        """
+        Keras model with one input per shared encoding and one output per
+        output name, built on first access.
+        """
+        if self._model is None:
+            self._model = self._build()
+        return self._model
+
+    @property
+    def is_built(self):
+        return self._model is not None
+
+    def _reduction_fn(self):
+        if isinstance(self.reduction, string_types):
+            return REDUCTIONS[self.reduction]
+        return self.reduction
+
+    def _build(self):
+        import keras.backend as K
+        from keras.layers import Input, Lambda
+        from keras.models import Model
+
+        keras_inputs = {}
+        for predictor, names in zip(self.predictors, self.member_input_names):
+            for name, x in zip(names, predictor.model.inputs):
+                if name not in keras_inputs:
+                    keras_inputs[name] = Input(
+                        batch_shape=K.int_shape(x),
+                        dtype=K.dtype(x),
+                        name=name)
+        member_outputs = []
+        for predictor, names in zip(self.predictors, self.member_input_names):
+            outputs = predictor.model(
+                [keras_inputs[name] for name in names]
+                if len(names) > 1 else keras_inputs[names[0]])
+            if not isinstance(outputs, list):
+                outputs = [outputs]
+            member_outputs.append(outputs)
+        reduction_fn = self._reduction_fn()
+        combined = []
+        for i, output_name in enumerate(self.predictors[0].output_order):
+            stacked = Lambda(lambda xs: K.stack(xs, axis=1))(
+                [outputs[i] for outputs in member_outputs])
+            combined.append(Lambda(reduction_fn, name=output_name)(stacked))
+        return Model(
+            inputs=[keras_inputs[name] for (name, _, _) in self.shared_inputs],
+            outputs=combined)
+
+    def _prepare_inputs(self, inputs):
+        """
+        Encode raw inputs once for each shared input of the ensemble.
+        """
+        first = self.predictors[0]
+        inputs = first._input_dict(inputs)
+        return [
+            first._encode_input(input_obj, inputs[raw_name])
+            for (_, raw_name, input_obj) in self.shared_inputs
+        ]
+
+    def predict_scores(self, inputs, batch_size=32):
+        """
+        Combined predictions of the members without applying the inverse
+        transforms of their outputs.
+        """
+        return self.predictors[0]._prepare_outputs(
+            self.model.predict(
+                self._prepare_inputs(inputs), batch_size=batch_size),
+            decode=False)
+
+    def predict(self, inputs, batch_size=32):
+        """
+        Combined predictions of the members, in the same form as
+        Predictor.predict.
+        """
+        return self.predictors[0]._prepare_outputs(
+            self.model.predict(
+                self._prepare_inputs(inputs), batch_size=batch_size),
+            decode=True)
+
+    ############################################################################
+    #
+    # Serialization
+    #
+    ############################################################################
+
+    def _reduction_repr(self):
+        if isinstance(self.reduction, string_types):
+            return self.reduction
+        if not _is_importable(self.reduction):
+            raise ValueError(
+                "Can't serialize reduction %s, custom reductions must be "
+                "module-level functions (not lambdas or nested functions)" % (
+                    self.reduction,))
+        return to_serializable_repr(self.reduction)
+
+    @classmethod
+    def _reduction_from_repr(cls, reduction_repr):
+        if isinstance(reduction_repr, string_types):
+            return reduction_repr
+        return from_serializable_repr(reduction_repr)
+
+    def to_dict(self):
+        return {
+            "predictors": [p.to_dict() for p in self.predictors],
+            "reduction": self._reduction_repr(),
+        }
+
+    @classmethod
+    def from_dict(cls, config_dict):
+        return cls(
+            predictors=[
+                Predictor.from_dict(d) for d in config_dict["predictors"]],
+            reduction=cls._reduction_from_repr(config_dict["reduction"]))
+
+    def save(self, filename, weights_filename=None):
+        """
+        Save the members' architectures as JSON and all of their weights
+        in a single binary file (see Predictor.save).
+
+        Parameters
+        ----------
+        filename : str
+
+        weights_filename : str, optional
+            Path of binary weights file, defaults to filename + ".weights"
+        """
+        if weights_filename is None:
+            weights_filename = filename + ".weights"
+        import keras.backend as K
+
+        weights = []
+        weight_counts = []
+        for predictor in self.predictors:
+            member_weights = K.batch_get_value(predictor.model.weights)
+            weights.extend(member_weights)
+            weight_counts.append(len(member_weights))
+        config_dict = {
+            "predictors": [p._architecture_dict() for p in self.predictors],
+            "reduction": self._reduction_repr(),
+            "weights": write_weights_file(weights_filename, weights),
+            "weight_counts": weight_counts,
+            "weights_filename": os.path.relpath(
+                weights_filename, os.path.dirname(os.path.abspath(filename))),
+        }
+        with open(filename, "w") as f:
+            f.write(ujson.dumps(config_dict))
+
+    @classmethod
+    def load(cls, filename, mmap_mode=None):
+        """
+        Load an ensemble written by save. Members are only built when the
+        ensemble is first used.
+
+        Parameters
+        ----------
+        filename : str
+
+        mmap_mode : str, optional
+            If given (e.g. "r") then memory map the weights file instead of
+            reading it into memory.
+        """
+        with open(filename, "r") as f:
+            config_dict = ujson.loads(f.read())
+        weights_filename = os.path.join(
+            os.path.dirname(os.path.abspath(filename)),
+            config_dict["weights_filename"])
+        weights = read_weights_file(
+            weights_filename, config_dict["weights"], mmap_mode=mmap_mode)
+        predictors = []
+        start = 0
+        for architecture, n_weights in zip(
+                config_dict["predictors"], config_dict["weight_counts"]):
+            predictor = Predictor.from_dict(architecture)
+            predictor.set_weights(weights[start:start + n_weights])
+            predictors.append(predictor)
+            start += n_weights
+        return cls(
+            predictors=predictors,
+            reduction=cls._reduction_from_repr(config_dict["reduction"]))
@@ -20,22 +20,34 @@ class MaskedGlobalMaxPooling1D(keras.layers.pooling._GlobalPooling1D):
     where each sample is masked to allow for variable-length inputs.
     Returns a tensor of shape (n_samples, n_dims) after averaging across
     time in a mask-sensitive fashion.
+
+    By default masked steps are zeroed, so the result is max(0, max(x))
+    over the unmasked steps. If exclude_masked is True then masked steps
+    are never the max, which gives the same result as pooling over the
+    unpadded sequence.
     """
-    def __init__(self, **kwargs):
+    def __init__(self, exclude_masked=False, **kwargs):
         super(MaskedGlobalMaxPooling1D, self).__init__(**kwargs)
         self.supports_masking = True
+        self.exclude_masked = exclude_masked
 
     def call(self, x, mask=None):
         if mask is None:
             return K.max(x, axis=1)
-        mask = K.cast(mask, "float32")
+        mask = K.cast(mask, K.dtype(x))
         expanded_mask = K.expand_dims(mask)
         # zero embedded vectors which come from masked characters
         x_masked = x * expanded_mask
-
-        # one flaw here is that we're returning max(0, max(x[:, i])) instead of
-        # max(x[:, i])
+        if self.exclude_masked:
+            # move masked steps below the minimum of each sequence
+            x_min = K.min(x, axis=1, keepdims=True)
+            x_masked += (x_min - 1) * (1 - expanded_mask)
         return K.max(x_masked, axis=1)
 
+    def get_config(self):
+        config = super(MaskedGlobalMaxPooling1D, self).get_config()
+        config["exclude_masked"] = self.exclude_masked
+        return config
+
     def compute_mask(self, x, mask):
         return None
@@ -0,0 +1,32 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from keras.layers import Layer
+import keras.backend as K
+
+class ZeroMaskedSteps(Layer):
+    """
+    Set the activations of masked time steps to 0 and pass the mask along.
+    Convolutions over a padded sequence then see the same values past the
+    end of each peptide as they would if the padding were trimmed off.
+    """
+    def __init__(self, **kwargs):
+        super(ZeroMaskedSteps, self).__init__(**kwargs)
+        self.supports_masking = True
+
+    def call(self, x, mask=None):
+        if mask is None:
+            return x
+        return x * K.expand_dims(K.cast(mask, K.dtype(x)))
+
+    def compute_mask(self, x, mask=None):
+        return mask
@@ -14,7 +14,7 @@
 
 
 import keras.backend as K
-from tensorflow import debugging 
+import tensorflow as tf
 
 def positive_only_mse(y_true, y_pred):
     """
@@ -28,22 +28,32 @@ def positive_only_mse(y_true, y_pred):
     squared *= K.cast(mask, "float32")
     return K.mean(squared, axis=-1)
 
+def _masked_mean(elementwise_loss, y_true, y_pred):
+    """
+    Mean loss over the observed (non-NaN) targets of each sample, which is
+    only computed for samples with any observed targets (others get zero).
+    """
+    observed = 1.0 - K.cast(tf.math.is_nan(y_true), K.floatx())
+    n_observed = K.sum(observed, axis=-1)
+    labeled = tf.where(n_observed > 0)
+    observed = tf.gather_nd(observed, labeled)
+    y_true = tf.gather_nd(y_true, labeled)
+    values = elementwise_loss(
+        tf.where(observed > 0, y_true, K.zeros_like(y_true)),
+        tf.gather_nd(y_pred, labeled))
+    per_sample = K.sum(values * observed, axis=-1) / tf.gather_nd(
+        n_observed, labeled)
+    return tf.scatter_nd(
+        labeled, per_sample, tf.shape(n_observed, out_type=labeled.dtype))
+
+def _squared_error(y_true, y_pred):
+    return K.square(y_pred - y_true)
+
+def _binary_crossentropy(y_true, y_pred):
+    return K.binary_crossentropy(output=y_pred, target=y_true)
+
 def masked_mse(y_true, y_pred):
-    mask = debugging.is_nan(y_true)
-    diff = y_pred - y_true
-    squared = K.square(diff)
-    sum_squared_error = K.sum(
-        K.switch(mask, K.zeros(K.shape(squared)), squared),
-        axis=-1)
-    n_valid_per_sample = K.sum(K.cast(~mask, dtype='float32'), axis=-1)
-    return sum_squared_error / n_valid_per_sample
+    return _masked_mean(_squared_error, y_true, y_pred)
 
 def masked_binary_crossentropy(y_true, y_pred):
-    mask = debugging.is_nan(y_true)
-    cross_entropy_values = K.binary_crossentropy(
-        output=y_pred,
-        target=y_true)
-    sum_cross_entropy_values = K.sum(
-        K.switch(mask, K.zeros(K.shape(cross_entropy_values)), cross_entropy_values), axis=-1)
-    n_valid_per_sample = K.sum(K.cast(~mask, dtype='float32'), axis=-1)
-    return sum_cross_entropy_values / n_valid_per_sample
+    return _masked_mean(_binary_crossentropy, y_true, y_pred)
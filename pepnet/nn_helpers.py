@@ -21,6 +21,7 @@ from .keras_layers.masked_global_average_pooling import (
 from .keras_layers.masked_global_max_pooling import (
     MaskedGlobalMaxPooling1D as GlobalMaxPooling1D)
 from .keras_layers.drop_mask import DropMask
+from .keras_layers.zero_masked_steps import ZeroMaskedSteps
 
 from keras.layers import (
     Input,
@@ -37,6 +38,7 @@ from keras.layers import (
     Dot,
     Flatten,
     Lambda,
+    Masking,
     LSTM,
     GRU,
     Bidirectional
@@ -86,6 +88,16 @@ def flatten(value, drop_mask=False):
         value = DropMask()(value)
     return Flatten()(value)
 
+def mask_zero_vectors(value):
+    """
+    Mask time steps whose vectors are all zero (e.g. padding after the end
+    of a peptide).
+    """
+    return Masking(mask_value=0.0)(value)
+
+def zero_masked_steps(value):
+    return ZeroMaskedSteps()(value)
+
 def regularize(value, batch_normalization=False, dropout=0.0):
     if batch_normalization:
         value = BatchNormalization()(value)
@@ -99,8 +111,9 @@ def embedding(
         output_dim,
         dropout=0,
         initial_weights=None,
-        mask_zero=False):
-    if initial_weights:
+        mask_zero=False,
+        trainable=True):
+    if initial_weights is not None:
         n_rows, n_cols = initial_weights.shape
         if n_rows != n_symbols or n_cols != output_dim:
             raise ValueError(
@@ -112,12 +125,14 @@ def embedding(
             input_dim=n_symbols,
             output_dim=output_dim,
             mask_zero=mask_zero,
-            weights=[initial_weights])
+            weights=[initial_weights],
+            trainable=trainable)
     else:
         embedding_layer = Embedding(
             input_dim=n_symbols,
             output_dim=output_dim,
-            mask_zero=mask_zero)
+            mask_zero=mask_zero,
+            trainable=trainable)
 
     value = embedding_layer(value)
 
@@ -231,9 +246,10 @@ def aligned_convolutions(
 def local_max_pooling(value, size=3, stride=2):
     return MaxPooling1D(pool_size=size, strides=stride)(value)
 
-def global_max_pooling(value, batch_normalization=False, dropout=0):
+def global_max_pooling(
+        value, batch_normalization=False, dropout=0, exclude_masked=False):
     return regularize(
-        value=GlobalMaxPooling1D()(value),
+        value=GlobalMaxPooling1D(exclude_masked=exclude_masked)(value),
         batch_normalization=batch_normalization,
         dropout=dropout)
 
@@ -244,12 +260,13 @@ def global_mean_pooling(value, batch_normalization=False, dropout=0):
         dropout=dropout)
 
 def global_max_and_mean_pooling(
-        value, batch_normalization=False, dropout=0):
+        value, batch_normalization=False, dropout=0, exclude_masked=False):
     return merge([
         global_max_pooling(
             value=value,
             batch_normalization=batch_normalization,
-            dropout=dropout),
+            dropout=dropout,
+            exclude_masked=exclude_masked),
         global_mean_pooling(
             value=value,
             batch_normalization=batch_normalization,
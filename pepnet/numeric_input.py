@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .nn_helpers import dense_layers, make_numeric_input
 from .numeric import Numeric
 
 class NumericInput(Numeric):
@@ -21,6 +20,8 @@ class NumericInput(Numeric):
     NumericOutput (defined in base class Numeric).
     """
     def build(self):
+        from .nn_helpers import dense_layers, make_numeric_input
+
         input_object = make_numeric_input(
             name=self.name, dim=self.dim, dtype=self.dtype)
         hidden = dense_layers(
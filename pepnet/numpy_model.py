@@ -0,0 +1,883 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Forward pass of a trained Keras model re-implemented with NumPy, so that
+small batches can be scored without the overhead of Keras (or importing
+TensorFlow at all).
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import os
+
+import numpy as np
+import ujson
+
+from .weights_file import write_weights_file, read_weights_file
+
+
+############################################################################
+#
+# Activation functions
+#
+############################################################################
+
+def _linear(x):
+    return x
+
+
+def _relu(x):
+    return np.maximum(x, 0)
+
+
+def _sigmoid(x):
+    # same as 1 / (1 + exp(-x)) but doesn't overflow for large negative x
+    return np.exp(-np.logaddexp(0, -x)).astype(x.dtype, copy=False)
+
+
+def _hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0, 1)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def _softplus(x):
+    return np.logaddexp(0, x).astype(x.dtype, copy=False)
+
+
+def _softsign(x):
+    return x / (1 + np.abs(x))
+
+
+def _elu(x):
+    return np.where(x > 0, x, np.expm1(x))
+
+
+def _selu(x):
+    alpha = 1.6732632423543772848170429916717
+    scale = 1.0507009873554804934193349852946
+    return scale * np.where(x > 0, x, alpha * np.expm1(x))
+
+
+_ACTIVATIONS = {
+    "linear": _linear,
+    "relu": _relu,
+    "tanh": np.tanh,
+    "sigmoid": _sigmoid,
+    "hard_sigmoid": _hard_sigmoid,
+    "softmax": _softmax,
+    "softplus": _softplus,
+    "softsign": _softsign,
+    "elu": _elu,
+    "selu": _selu,
+    "exponential": np.exp,
+}
+
+
+def _activation_name(fn):
+    name = getattr(fn, "__name__", None)
+    if name not in _ACTIVATIONS:
+        raise ValueError("Activation '%s' not supported by NumPy engine" % (
+            name,))
+    return name
+
+
+############################################################################
+#
+# Layers: each op takes (config, weights, input values, input masks) and
+# returns the output value and mask.
+#
+############################################################################
+
+def _combine_masks(masks):
+    """
+    Keras merge layers keep a time step if it isn't masked in any input.
+    """
+    masks = [m for m in masks if m is not None]
+    if len(masks) == 0:
+        return None
+    result = masks[0]
+    for m in masks[1:]:
+        result = result & m
+    return result
+
+
+def _identity_op(config, weights, values, masks):
+    return values[0], masks[0]
+
+
+def _drop_mask_op(config, weights, values, masks):
+    return values[0], None
+
+
+def _activation_op(config, weights, values, masks):
+    return _ACTIVATIONS[config["activation"]](values[0]), masks[0]
+
+
+def _one_minus_op(config, weights, values, masks):
+    return 1.0 - values[0], masks[0]
+
+
+def _embedding_op(config, weights, values, masks):
+    indices = values[0].astype("int64", copy=False)
+    mask = (indices != 0) if config["mask_zero"] else None
+    return np.take(weights[0], indices, axis=0), mask
+
+
+def _dense_op(config, weights, values, masks):
+    result = np.dot(values[0], weights[0])
+    if config["use_bias"]:
+        result += weights[1]
+    return _ACTIVATIONS[config["activation"]](result), masks[0]
+
+
+def _same_padding(length, window, stride):
+    n_out = -(-length // stride)
+    total = max((n_out - 1) * stride + window - length, 0)
+    return total // 2, total - total // 2
+
+
+def _conv1d_op(config, weights, values, masks):
+    x = values[0]
+    kernel = weights[0]
+    width = kernel.shape[0]
+    stride = config["strides"]
+    dilation = config["dilation_rate"]
+    span = (width - 1) * dilation + 1
+    if config["padding"] == "same":
+        left, right = _same_padding(x.shape[1], span, stride)
+    elif config["padding"] == "causal":
+        left, right = span - 1, 0
+    else:
+        left, right = 0, 0
+    if left or right:
+        x = np.pad(x, ((0, 0), (left, right), (0, 0)), mode="constant")
+    n_out = (x.shape[1] - span) // stride + 1
+    result = np.zeros((x.shape[0], n_out, kernel.shape[2]), dtype=x.dtype)
+    # add up the contribution of each filter position
+    for i in range(width):
+        start = i * dilation
+        window = x[:, start:start + (n_out - 1) * stride + 1:stride]
+        result += np.dot(window, kernel[i])
+    if config["use_bias"]:
+        result += weights[1]
+    result = _ACTIVATIONS[config["activation"]](result)
+    return result, (masks[0] if config["masked"] else None)
+
+
+def _max_pool_1d(x, pool_size, stride, padding, fill_value):
+    if padding == "same":
+        left, right = _same_padding(x.shape[1], pool_size, stride)
+        pad_width = [(0, 0), (left, right)] + [(0, 0)] * (x.ndim - 2)
+        x = np.pad(x, pad_width, mode="constant", constant_values=fill_value)
+    n_out = (x.shape[1] - pool_size) // stride + 1
+    result = x[:, :(n_out - 1) * stride + 1:stride]
+    for i in range(1, pool_size):
+        result = np.maximum(result, x[:, i:i + (n_out - 1) * stride + 1:stride])
+    return result
+
+
+def _max_pooling1d_op(config, weights, values, masks):
+    result = _max_pool_1d(
+        values[0],
+        config["pool_size"],
+        config["strides"],
+        config["padding"],
+        fill_value=-np.inf)
+    mask = masks[0]
+    if config["masked"] and mask is not None:
+        mask = _max_pool_1d(
+            mask,
+            config["pool_size"],
+            config["strides"],
+            config["padding"],
+            fill_value=False)
+    else:
+        mask = None
+    return result, mask
+
+
+def _global_average_pooling1d_op(config, weights, values, masks):
+    x, mask = values[0], masks[0]
+    if mask is None or not config["masked"]:
+        return x.mean(axis=1), None
+    mask = mask.astype(x.dtype)
+    return (x * mask[:, :, np.newaxis]).sum(axis=1) / mask.sum(
+        axis=1, keepdims=True), None
+
+
+def _global_max_pooling1d_op(config, weights, values, masks):
+    x, mask = values[0], masks[0]
+    if mask is None or not config["masked"]:
+        return x.max(axis=1), None
+    mask = mask[:, :, np.newaxis]
+    if config.get("exclude_masked", False):
+        x_masked = np.where(mask, x, x.min(axis=1, keepdims=True) - 1)
+    else:
+        x_masked = x * mask.astype(x.dtype)
+    return x_masked.max(axis=1), None
+
+
+def _zero_masked_steps_op(config, weights, values, masks):
+    x, mask = values[0], masks[0]
+    if mask is None:
+        return x, None
+    return x * mask.astype(x.dtype)[:, :, np.newaxis], mask
+
+
+def _masking_op(config, weights, values, masks):
+    x = values[0]
+    mask = (x != config["mask_value"]).any(axis=-1)
+    return x * mask.astype(x.dtype)[:, :, np.newaxis], mask
+
+
+def _batch_normalization_op(config, weights, values, masks):
+    x = values[0]
+    weights = list(weights)
+    gamma = weights.pop(0) if config["scale"] else None
+    beta = weights.pop(0) if config["center"] else None
+    mean, variance = weights
+    shape = [1] * x.ndim
+    shape[config["axis"]] = -1
+    scale = 1.0 / np.sqrt(variance + config["epsilon"])
+    if gamma is not None:
+        scale = scale * gamma
+    offset = -mean * scale
+    if beta is not None:
+        offset = offset + beta
+    result = x * scale.reshape(shape) + offset.reshape(shape)
+    return result.astype(x.dtype, copy=False), masks[0]
+
+
+def _flatten_op(config, weights, values, masks):
+    return values[0].reshape((len(values[0]), -1)), None
+
+
+def _reshape_op(config, weights, values, masks):
+    return values[0].reshape(
+        (len(values[0]),) + tuple(config["target_shape"])), None
+
+
+def _concatenate_op(config, weights, values, masks):
+    return np.concatenate(values, axis=config["axis"]), _combine_masks(masks)
+
+
+def _add_op(config, weights, values, masks):
+    result = values[0]
+    for x in values[1:]:
+        result = result + x
+    return result, _combine_masks(masks)
+
+
+def _subtract_op(config, weights, values, masks):
+    return values[0] - values[1], _combine_masks(masks)
+
+
+def _multiply_op(config, weights, values, masks):
+    result = values[0]
+    for x in values[1:]:
+        result = result * x
+    return result, _combine_masks(masks)
+
+
+def _average_op(config, weights, values, masks):
+    total, mask = _add_op(config, weights, values, masks)
+    return total / len(values), mask
+
+
+def _maximum_op(config, weights, values, masks):
+    result = values[0]
+    for x in values[1:]:
+        result = np.maximum(result, x)
+    return result, _combine_masks(masks)
+
+
+def _run_rnn(step, x, mask, n_states, units, go_backwards, return_sequences):
+    """
+    Apply a recurrent step function over time. Masked time steps keep the
+    previous output and states, same as the Keras implementation.
+    """
+    n_samples, n_timesteps = x.shape[:2]
+    states = [
+        np.zeros((n_samples, units), dtype=x.dtype) for _ in range(n_states)]
+    output = np.zeros((n_samples, units), dtype=x.dtype)
+    outputs = []
+    time_steps = range(n_timesteps)
+    if go_backwards:
+        time_steps = reversed(time_steps)
+    for t in time_steps:
+        new_output, new_states = step(x[:, t], states)
+        if mask is not None:
+            keep = mask[:, t][:, np.newaxis]
+            new_output = np.where(keep, new_output, output)
+            new_states = [
+                np.where(keep, new_state, state)
+                for (new_state, state) in zip(new_states, states)
+            ]
+        output = new_output
+        states = new_states
+        outputs.append(output)
+    if return_sequences:
+        return np.stack(outputs, axis=1)
+    return output
+
+
+def _lstm(config, weights, x, mask):
+    units = config["units"]
+    activation = _ACTIVATIONS[config["activation"]]
+    recurrent_activation = _ACTIVATIONS[config["recurrent_activation"]]
+    kernel, recurrent_kernel = weights[:2]
+    # input projections for all time steps at once
+    x_projected = np.dot(x, kernel)
+    if config["use_bias"]:
+        x_projected += weights[2]
+
+    def step(x_t, states):
+        h, c = states
+        z = x_t + np.dot(h, recurrent_kernel)
+        i = recurrent_activation(z[:, :units])
+        f = recurrent_activation(z[:, units:2 * units])
+        c = f * c + i * activation(z[:, 2 * units:3 * units])
+        o = recurrent_activation(z[:, 3 * units:])
+        h = o * activation(c)
+        return h, [h, c]
+
+    return _run_rnn(
+        step, x_projected, mask,
+        n_states=2,
+        units=units,
+        go_backwards=config["go_backwards"],
+        return_sequences=config["return_sequences"])
+
+
+def _gru(config, weights, x, mask):
+    units = config["units"]
+    activation = _ACTIVATIONS[config["activation"]]
+    recurrent_activation = _ACTIVATIONS[config["recurrent_activation"]]
+    kernel, recurrent_kernel = weights[:2]
+    reset_after = config["reset_after"]
+    x_projected = np.dot(x, kernel)
+    recurrent_bias = None
+    if config["use_bias"]:
+        bias = weights[2]
+        if reset_after:
+            bias, recurrent_bias = bias[0], bias[1]
+        x_projected += bias
+
+    def step(x_t, states):
+        h = states[0]
+        if reset_after:
+            h_projected = np.dot(h, recurrent_kernel)
+            if recurrent_bias is not None:
+                h_projected += recurrent_bias
+            z = recurrent_activation(x_t[:, :units] + h_projected[:, :units])
+            r = recurrent_activation(
+                x_t[:, units:2 * units] + h_projected[:, units:2 * units])
+            hh = activation(x_t[:, 2 * units:] + r * h_projected[:, 2 * units:])
+        else:
+            h_projected = np.dot(h, recurrent_kernel[:, :2 * units])
+            z = recurrent_activation(x_t[:, :units] + h_projected[:, :units])
+            r = recurrent_activation(
+                x_t[:, units:2 * units] + h_projected[:, units:])
+            hh = activation(
+                x_t[:, 2 * units:] +
+                np.dot(r * h, recurrent_kernel[:, 2 * units:]))
+        h = z * h + (1 - z) * hh
+        return h, [h]
+
+    return _run_rnn(
+        step, x_projected, mask,
+        n_states=1,
+        units=units,
+        go_backwards=config["go_backwards"],
+        return_sequences=config["return_sequences"])
+
+
+_RNNS = {"lstm": _lstm, "gru": _gru}
+
+
+def _rnn_op(config, weights, values, masks):
+    result = _RNNS[config["rnn_type"]](config, weights, values[0], masks[0])
+    return result, (masks[0] if config["return_sequences"] else None)
+
+
+def _bidirectional_op(config, weights, values, masks):
+    forward_config = config["forward"]
+    backward_config = config["backward"]
+    n_forward = config["n_forward_weights"]
+    forward = _RNNS[forward_config["rnn_type"]](
+        forward_config, weights[:n_forward], values[0], masks[0])
+    backward = _RNNS[backward_config["rnn_type"]](
+        backward_config, weights[n_forward:], values[0], masks[0])
+    if config["return_sequences"]:
+        # outputs of the backward layer are in reverse time order
+        backward = backward[:, ::-1]
+    merge_mode = config["merge_mode"]
+    if merge_mode == "concat":
+        result = np.concatenate([forward, backward], axis=-1)
+    elif merge_mode == "sum":
+        result = forward + backward
+    elif merge_mode == "mul":
+        result = forward * backward
+    else:
+        result = (forward + backward) / 2
+    return result, (masks[0] if config["return_sequences"] else None)
+
+
+_OPS = {
+    "identity": _identity_op,
+    "drop_mask": _drop_mask_op,
+    "zero_masked_steps": _zero_masked_steps_op,
+    "masking": _masking_op,
+    "activation": _activation_op,
+    "one_minus": _one_minus_op,
+    "embedding": _embedding_op,
+    "dense": _dense_op,
+    "conv1d": _conv1d_op,
+    "max_pooling1d": _max_pooling1d_op,
+    "global_average_pooling1d": _global_average_pooling1d_op,
+    "global_max_pooling1d": _global_max_pooling1d_op,
+    "batch_normalization": _batch_normalization_op,
+    "flatten": _flatten_op,
+    "reshape": _reshape_op,
+    "concatenate": _concatenate_op,
+    "add": _add_op,
+    "subtract": _subtract_op,
+    "multiply": _multiply_op,
+    "average": _average_op,
+    "maximum": _maximum_op,
+    "rnn": _rnn_op,
+    "bidirectional": _bidirectional_op,
+}
+
+
+############################################################################
+#
+# Conversion of Keras layers to ops
+#
+############################################################################
+
+# layers which only have an effect during training
+_IDENTITY_LAYERS = {
+    "Dropout",
+    "SpatialDropout1D",
+    "GaussianNoise",
+    "GaussianDropout",
+    "AlphaDropout",
+}
+
+_MERGE_LAYERS = {
+    "Add": "add",
+    "Subtract": "subtract",
+    "Multiply": "multiply",
+    "Average": "average",
+    "Maximum": "maximum",
+}
+
+
+def _rnn_config(layer):
+    return {
+        "rnn_type": type(layer).__name__.lower(),
+        "units": layer.units,
+        "activation": _activation_name(layer.activation),
+        "recurrent_activation": _activation_name(layer.recurrent_activation),
+        "use_bias": layer.use_bias,
+        "reset_after": getattr(layer, "reset_after", False),
+        "go_backwards": layer.go_backwards,
+        "return_sequences": layer.return_sequences,
+    }
+
+
+def _lambda_op_type(layer):
+    """
+    Lambda layers can't be translated in general, but the gates of highway
+    layers only use 1 - x, which we recognize by evaluating the function on
+    a probe array.
+    """
+    probe = np.linspace(-2, 2, 12).astype("float32").reshape((3, 4))
+    try:
+        result = np.asarray(
+            layer.function(probe, **(layer.arguments or {})), dtype="float32")
+    except Exception:
+        result = None
+    if result is not None and result.shape == probe.shape:
+        if np.allclose(result, 1.0 - probe):
+            return "one_minus"
+        elif np.allclose(result, probe):
+            return "identity"
+    raise ValueError(
+        "Lambda layer '%s' not supported by NumPy engine" % (layer.name,))
+
+
+def _convert_layer(layer):
+    """
+    Returns op type, op configuration and list of weight arrays for a
+    Keras layer.
+    """
+    class_name = type(layer).__name__
+    masked = class_name.startswith("Masked")
+    if masked:
+        class_name = class_name[len("Masked"):]
+    weights = layer.get_weights()
+    if class_name in _IDENTITY_LAYERS:
+        return "identity", {}, []
+    elif class_name == "DropMask":
+        return "drop_mask", {}, []
+    elif class_name == "ZeroMaskedSteps":
+        return "zero_masked_steps", {}, []
+    elif class_name == "Masking":
+        return "masking", {"mask_value": float(layer.mask_value)}, []
+    elif class_name == "Activation":
+        return "activation", {
+            "activation": _activation_name(layer.activation)}, []
+    elif class_name == "Lambda":
+        return _lambda_op_type(layer), {}, []
+    elif class_name == "Embedding":
+        return "embedding", {"mask_zero": bool(layer.mask_zero)}, weights
+    elif class_name == "Dense":
+        return "dense", {
+            "activation": _activation_name(layer.activation),
+            "use_bias": layer.use_bias,
+        }, weights
+    elif class_name == "TimeDistributed":
+        if type(layer.layer).__name__ != "Dense":
+            raise ValueError(
+                "Only Dense layers can be TimeDistributed in NumPy engine")
+        return _convert_layer(layer.layer)
+    elif class_name == "Conv1D":
+        return "conv1d", {
+            "strides": layer.strides[0],
+            "dilation_rate": layer.dilation_rate[0],
+            "padding": layer.padding,
+            "activation": _activation_name(layer.activation),
+            "use_bias": layer.use_bias,
+            "masked": masked,
+        }, weights
+    elif class_name == "MaxPooling1D":
+        return "max_pooling1d", {
+            "pool_size": layer.pool_size[0],
+            "strides": layer.strides[0],
+            "padding": layer.padding,
+            "masked": masked,
+        }, []
+    elif class_name == "GlobalAveragePooling1D":
+        return "global_average_pooling1d", {"masked": masked}, []
+    elif class_name == "GlobalMaxPooling1D":
+        return "global_max_pooling1d", {
+            "masked": masked,
+            "exclude_masked": bool(getattr(layer, "exclude_masked", False)),
+        }, []
+    elif class_name == "BatchNormalization":
+        axis = layer.axis
+        if isinstance(axis, (list, tuple)):
+            axis = axis[0]
+        return "batch_normalization", {
+            "axis": axis,
+            "epsilon": float(layer.epsilon),
+            "center": layer.center,
+            "scale": layer.scale,
+        }, weights
+    elif class_name == "Flatten":
+        return "flatten", {}, []
+    elif class_name == "Reshape":
+        return "reshape", {"target_shape": list(layer.target_shape)}, []
+    elif class_name == "Concatenate":
+        return "concatenate", {"axis": layer.axis}, []
+    elif class_name in _MERGE_LAYERS:
+        return _MERGE_LAYERS[class_name], {}, []
+    elif class_name in ("LSTM", "GRU"):
+        return "rnn", _rnn_config(layer), weights
+    elif class_name == "Bidirectional":
+        if layer.merge_mode not in ("concat", "sum", "mul", "ave"):
+            raise ValueError(
+                "Bidirectional merge mode '%s' not supported by NumPy "
+                "engine" % (layer.merge_mode,))
+        return "bidirectional", {
+            "forward": _rnn_config(layer.forward_layer),
+            "backward": _rnn_config(layer.backward_layer),
+            "n_forward_weights": len(layer.forward_layer.get_weights()),
+            "merge_mode": layer.merge_mode,
+            "return_sequences": layer.return_sequences,
+        }, weights
+    else:
+        raise ValueError(
+            "Layer '%s' of type %s not supported by NumPy engine" % (
+                layer.name, type(layer).__name__))
+
+
+def _as_list(x):
+    if isinstance(x, (list, tuple)):
+        return list(x)
+    return [x]
+
+
+def _inbound_nodes(layer):
+    # renamed to _inbound_nodes in Keras 2.1.3
+    nodes = getattr(layer, "_inbound_nodes", None)
+    if nodes is None:
+        nodes = getattr(layer, "inbound_nodes", [])
+    return nodes
+
+
+class NumpyModel(object):
+    """
+    Sequence of NumPy ops equivalent to the forward pass of a Keras model.
+    Each op reads values (and their masks) from integer tensor IDs and
+    writes a single output tensor.
+    """
+    def __init__(
+            self,
+            ops,
+            weights,
+            input_ids,
+            output_ids,
+            input_dtypes=None):
+        """
+        Parameters
+        ----------
+        ops : list of dict
+            Each op has keys "type", "config", "inputs" (tensor IDs),
+            "output" (tensor ID) and "weights" (indices into weights)
+
+        weights : list of np.ndarray
+
+        input_ids : list of int
+            Tensor ID of each model input
+
+        output_ids : list of int
+            Tensor ID of each model output
+
+        input_dtypes : list of str, optional
+            Types which inputs get converted to
+        """
+        self.ops = ops
+        self.weights = weights
+        self.input_ids = input_ids
+        self.output_ids = output_ids
+        if input_dtypes is None:
+            input_dtypes = ["float32"] * len(input_ids)
+        self.input_dtypes = input_dtypes
+
+    @classmethod
+    def from_keras_model(cls, model):
+        """
+        Translate a built Keras model into NumPy ops, raising a ValueError for
+        layers which aren't supported.
+        """
+        tensor_ids = {}
+        input_ids = []
+        input_dtypes = []
+        for tensor in model.inputs:
+            tensor_ids[id(tensor)] = len(tensor_ids)
+            input_ids.append(tensor_ids[id(tensor)])
+            input_dtypes.append(
+                getattr(tensor.dtype, "name", str(tensor.dtype)))
+        ops = []
+        weights = []
+        layer_ops = {}
+        for layer in model.layers:
+            if type(layer).__name__ == "InputLayer":
+                continue
+            for node in _inbound_nodes(layer):
+                input_tensors = _as_list(node.input_tensors)
+                if any(id(t) not in tensor_ids for t in input_tensors):
+                    # node belongs to a different model
+                    continue
+                output_tensors = _as_list(node.output_tensors)
+                if len(output_tensors) != 1:
+                    raise ValueError(
+                        "Layer '%s' has %d outputs, expected 1" % (
+                            layer.name, len(output_tensors)))
+                if layer.name not in layer_ops:
+                    # shared layers only get their weights stored once
+                    op_type, config, layer_weights = _convert_layer(layer)
+                    weight_indices = list(range(
+                        len(weights), len(weights) + len(layer_weights)))
+                    weights.extend(np.asarray(w) for w in layer_weights)
+                    layer_ops[layer.name] = (op_type, config, weight_indices)
+                op_type, config, weight_indices = layer_ops[layer.name]
+                tensor_ids[id(output_tensors[0])] = len(tensor_ids)
+                ops.append({
+                    "type": op_type,
+                    "config": config,
+                    "inputs": [tensor_ids[id(t)] for t in input_tensors],
+                    "output": tensor_ids[id(output_tensors[0])],
+                    "weights": weight_indices,
+                })
+        output_ids = []
+        for tensor in model.outputs:
+            if id(tensor) not in tensor_ids:
+                raise ValueError("Couldn't trace model output %s" % (tensor,))
+            output_ids.append(tensor_ids[id(tensor)])
+        # drop ops whose results don't contribute to any output
+        needed = set(output_ids)
+        kept_ops = []
+        for op in reversed(ops):
+            if op["output"] in needed:
+                kept_ops.append(op)
+                needed.update(op["inputs"])
+        return cls(
+            ops=kept_ops[::-1],
+            weights=weights,
+            input_ids=input_ids,
+            output_ids=output_ids,
+            input_dtypes=input_dtypes)
+
+    @property
+    def num_inputs(self):
+        return len(self.input_ids)
+
+    def predict(self, inputs):
+        """
+        Evaluate the model on a list of encoded input arrays (or a single
+        array if there's one input). Returns a list of output arrays, or
+        a single array if there's one output.
+        """
+        inputs = _as_list(inputs)
+        if len(inputs) != self.num_inputs:
+            raise ValueError("Expected %d inputs but got %d" % (
+                self.num_inputs, len(inputs)))
+        values = {}
+        masks = {}
+        for tensor_id, x, dtype in zip(
+                self.input_ids, inputs, self.input_dtypes):
+            values[tensor_id] = np.asarray(x, dtype=dtype)
+            masks[tensor_id] = None
+        for op in self.ops:
+            value, mask = _OPS[op["type"]](
+                op["config"],
+                [self.weights[i] for i in op["weights"]],
+                [values[i] for i in op["inputs"]],
+                [masks[i] for i in op["inputs"]])
+            values[op["output"]] = value
+            masks[op["output"]] = mask
+        outputs = [values[i] for i in self.output_ids]
+        if len(outputs) == 1:
+            return outputs[0]
+        return outputs
+
+    def _spec_dict(self):
+        return {
+            "ops": self.ops,
+            "input_ids": self.input_ids,
+            "output_ids": self.output_ids,
+            "input_dtypes": self.input_dtypes,
+        }
+
+    @classmethod
+    def _from_spec_dict(cls, spec, weights):
+        return cls(
+            ops=spec["ops"],
+            weights=weights,
+            input_ids=spec["input_ids"],
+            output_ids=spec["output_ids"],
+            input_dtypes=spec["input_dtypes"])
+
+
+class NumpyPredictor(object):
+    """
+    Predictor whose forward pass runs in NumPy. Inputs are encoded and
+    outputs decoded by the same input/output objects as the Predictor it was
+    compiled from, so predictions match Predictor.predict.
+    """
+    def __init__(self, architecture, model):
+        """
+        Parameters
+        ----------
+        architecture : dict
+            Predictor configuration without weights
+
+        model : NumpyModel
+        """
+        self.architecture = architecture
+        self.model = model
+        self._predictor = None
+
+    @property
+    def predictor(self):
+        """
+        Predictor with the same inputs and outputs, which is used to encode
+        inputs and decode outputs but never builds its Keras model.
+        """
+        if self._predictor is None:
+            from .predictor import Predictor
+            self._predictor = Predictor.from_dict(self.architecture)
+        return self._predictor
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_predictor"] = None
+        return state
+
+    def _predict_raw(self, inputs):
+        predictor = self.predictor
+        encoded = predictor._prepare_inputs(inputs)
+        if isinstance(encoded, dict):
+            encoded = [encoded[name] for name in predictor.input_order]
+        return self.model.predict(encoded)
+
+    def predict_scores(self, inputs):
+        """
+        Predict outputs without applying their inverse transforms.
+        """
+        return self.predictor._prepare_outputs(
+            self._predict_raw(inputs), decode=False)
+
+    def predict(self, inputs):
+        """
+        Predict outputs for the given inputs.
+        """
+        return self.predictor._prepare_outputs(
+            self._predict_raw(inputs), decode=True)
+
+    def save(self, filename, weights_filename=None):
+        """
+        Save as JSON with a separate binary weights file, in the same layout
+        as Predictor.save.
+        """
+        if weights_filename is None:
+            weights_filename = filename + ".weights"
+        config_dict = {
+            "architecture": self.architecture,
+            "numpy_model": self.model._spec_dict(),
+            "weights": write_weights_file(weights_filename, self.model.weights),
+            "weights_filename": os.path.relpath(
+                weights_filename, os.path.dirname(os.path.abspath(filename))),
+        }
+        with open(filename, "w") as f:
+            f.write(ujson.dumps(config_dict))
+
+    @classmethod
+    def load(cls, filename, mmap_mode=None):
+        """
+        Load a NumpyPredictor written by save, optionally memory mapping its
+        weights.
+        """
+        with open(filename, "r") as f:
+            config_dict = ujson.loads(f.read())
+        weights_filename = os.path.join(
+            os.path.dirname(os.path.abspath(filename)),
+            config_dict["weights_filename"])
+        weights = read_weights_file(
+            weights_filename, config_dict["weights"], mmap_mode=mmap_mode)
+        return cls(
+            architecture=config_dict["architecture"],
+            model=NumpyModel._from_spec_dict(
+                config_dict["numpy_model"], weights))
@@ -10,11 +10,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import keras.backend as K
-
-from .nn_helpers import dense_layers, dense, flatten
 from .numeric import Numeric
-from .losses import masked_mse, masked_binary_crossentropy
 
 class Output(Numeric):
     """
@@ -50,6 +46,9 @@ class Output(Numeric):
         self.dropout = dropout
 
     def build(self, value):
+        import keras.backend as K
+        from .nn_helpers import dense_layers, dense, flatten
+
         hidden = dense_layers(
             value,
             layer_sizes=self.dense_layer_sizes,
@@ -77,6 +76,8 @@ class Output(Numeric):
         If output requires masking then apply it to the loss function,
         otherwise just return the loss function.
         """
+        from .losses import masked_mse, masked_binary_crossentropy
+
         if self.loss == "mse":
             return masked_mse
         elif self.loss == "binary_crossentropy":
@@ -0,0 +1,213 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Encode large collections of peptides using a pool of worker processes, each
+of which writes its part of the result directly into a memory-mapped file
+that becomes the returned array.
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import atexit
+import mmap
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from .peptide_batch import PeptideBatch
+
+# below this many peptides it's faster to encode in the current process than
+# to hand slices of the peptides to worker processes
+MIN_PEPTIDES_FOR_PARALLEL_ENCODING = 100000
+
+# directory backed by memory (when available) for the files which worker
+# processes write encoded peptides into
+SHARED_MEMORY_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+_pool = None
+_pool_size = 0
+
+
+def resolve_n_jobs(n_jobs):
+    """
+    Convert n_jobs argument to a number of processes, where None means 1
+    and negative values count back from the number of CPUs (-1 means all).
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        n_jobs = multiprocessing.cpu_count() + 1 + n_jobs
+    return max(1, n_jobs)
+
+
+def _pool_context():
+    """
+    Worker processes are started from a forkserver (or spawned where that
+    isn't available) rather than forked from the current process, which may
+    already be running TensorFlow's thread pools.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def get_pool(n_jobs):
+    """
+    Returns the pool of worker processes shared by calls to parallel_encode,
+    only starting new processes when a different number of them is needed.
+    """
+    global _pool, _pool_size
+    if _pool is None or _pool_size != n_jobs:
+        shutdown_pool()
+        _pool = _pool_context().Pool(n_jobs)
+        _pool_size = n_jobs
+    return _pool
+
+
+def shutdown_pool():
+    """
+    Stop the worker processes used by parallel_encode, if any are running.
+    """
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+        _pool_size = 0
+
+
+atexit.register(shutdown_pool)
+
+
+def _encode_slice(args):
+    (encoder, method_name, peptides, kwargs,
+        filename, offset, shape, dtype) = args
+    # only map the rows which this worker writes
+    result = np.memmap(
+        filename, dtype=dtype, mode="r+", offset=offset, shape=shape)
+    getattr(encoder, method_name)(peptides, out=result, n_jobs=1, **kwargs)
+    result.flush()
+    del result
+
+
+def _slice_peptides(peptides, start, end):
+    peptides = peptides[start:end]
+    if isinstance(peptides, PeptideBatch):
+        # don't send the whole residue buffer to each worker
+        peptides = peptides.compact()
+    return peptides
+
+
+def _is_file_backed(array):
+    """
+    Is this array a whole np.memmap (rather than a view of one) which
+    workers can open by filename? Results of parallel_encode are memmaps of
+    files which have already been unlinked, so those don't count.
+    """
+    return (
+        isinstance(array, np.memmap) and
+        isinstance(array.base, mmap.mmap) and
+        array.filename is not None and
+        os.path.exists(array.filename) and
+        array.flags.c_contiguous)
+
+
+def parallel_encode(
+        encoder,
+        method_name,
+        peptides,
+        n_jobs,
+        out=None,
+        **kwargs):
+    """
+    Call an encoding method of an Encoder on slices of the given peptides in
+    separate processes. Falls back to encoding in the current process when
+    n_jobs is 1 or there are fewer than MIN_PEPTIDES_FOR_PARALLEL_ENCODING
+    peptides.
+
+    Workers write their slices directly into the returned array, which is an
+    np.memmap of an already unlinked file in SHARED_MEMORY_DIR, so the
+    result is never copied and its memory is released along with the array.
+
+    Parameters
+    ----------
+    encoder : Encoder
+
+    method_name : str
+        Name of encoding method, which must accept out and n_jobs arguments
+
+    peptides : list of str or PeptideBatch
+
+    n_jobs : int
+        Number of worker processes
+
+    out : np.ndarray, optional
+        Array to write the result into. Workers write directly into an
+        np.memmap (e.g. one created by np.lib.format.open_memmap), any other
+        array gets the result copied into it.
+
+    **kwargs : dict
+        Other arguments to the encoding method, which must be the same for
+        every slice of the peptides (e.g. an explicit max_peptide_length)
+    """
+    method = getattr(encoder, method_name)
+    n_jobs = resolve_n_jobs(n_jobs)
+    n_peptides = len(peptides)
+    if n_jobs == 1 or n_peptides < MIN_PEPTIDES_FOR_PARALLEL_ENCODING:
+        return method(peptides, out=out, n_jobs=1, **kwargs)
+
+    # encode the first peptide to find out the shape and type of each row
+    first = method(peptides[:1], n_jobs=1, **kwargs)
+    shape = (n_peptides,) + first.shape[1:]
+    dtype = first.dtype
+    if out is not None and (out.shape != shape or out.dtype != dtype):
+        raise ValueError(
+            "Expected output buffer with shape %s and dtype %s, "
+            "got %s and %s" % (shape, dtype, out.shape, out.dtype))
+
+    temporary_filename = None
+    if out is not None and _is_file_backed(out):
+        result = out
+    else:
+        fd, temporary_filename = tempfile.mkstemp(
+            prefix="pepnet-encoded-", dir=SHARED_MEMORY_DIR)
+        os.close(fd)
+        result = np.memmap(
+            temporary_filename, dtype=dtype, mode="w+", shape=shape)
+    try:
+        row_bytes = int(np.prod(shape[1:])) * dtype.itemsize
+        boundaries = np.linspace(0, n_peptides, n_jobs + 1).astype(int)
+        tasks = [
+            (encoder, method_name,
+                _slice_peptides(peptides, start, end), kwargs,
+                result.filename, result.offset + start * row_bytes,
+                (end - start,) + shape[1:], dtype)
+            for (start, end) in zip(boundaries[:-1], boundaries[1:])
+            if end > start
+        ]
+        get_pool(n_jobs).map(_encode_slice, tasks)
+    finally:
+        if temporary_filename is not None:
+            # the mapping stays valid after the file is unlinked and its
+            # memory is freed once the returned array is garbage collected
+            os.unlink(temporary_filename)
+    if out is not None and out is not result:
+        out[...] = result
+        return out
+    return result
@@ -0,0 +1,244 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import numpy as np
+from six import integer_types, string_types
+
+
+class PeptideBatch(object):
+    """
+    Collection of peptides packed into a single uint8 buffer of residues,
+    along with the start offset and length of each peptide in that buffer.
+    Slicing a batch shares its buffer rather than copying residues, so large
+    collections of peptides can be held in memory and encoded without
+    creating a Python string for each one.
+    """
+    def __init__(self, residues, starts, lengths):
+        """
+        Parameters
+        ----------
+        residues : np.ndarray
+            Flat uint8 array containing the characters of all peptides
+
+        starts : np.ndarray
+            Offset of each peptide's first residue in residues
+
+        lengths : np.ndarray
+            Number of residues in each peptide
+        """
+        residues = np.asarray(residues)
+        if residues.dtype != np.uint8 or residues.ndim != 1:
+            raise ValueError(
+                "Expected residues to be 1d uint8 array, got %s with shape %s" % (
+                    residues.dtype, residues.shape))
+        starts = np.asarray(starts, dtype="int64")
+        lengths = np.asarray(lengths, dtype="int64")
+        if starts.shape != lengths.shape or starts.ndim != 1:
+            raise ValueError(
+                "Mismatched shapes for starts %s and lengths %s" % (
+                    starts.shape, lengths.shape))
+        self.residues = residues
+        self.starts = starts
+        self.lengths = lengths
+
+    @classmethod
+    def from_list(cls, peptides):
+        """
+        Pack a list of peptide strings.
+        """
+        if isinstance(peptides, PeptideBatch):
+            return peptides
+        peptides = list(peptides)
+        try:
+            residues = np.frombuffer(
+                "".join(peptides).encode("ascii"), dtype="uint8")
+        except UnicodeEncodeError:
+            raise ValueError("Peptides must only contain ASCII characters")
+        lengths = np.fromiter(
+            (len(p) for p in peptides), dtype="int64", count=len(peptides))
+        starts = np.zeros_like(lengths)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        return cls(residues, starts, lengths)
+
+    @classmethod
+    def from_array(cls, peptides):
+        """
+        Wrap a NumPy array of fixed-width byte strings (dtype "S") without
+        copying it. Arrays of unicode strings are converted to bytes first.
+        """
+        peptides = np.asarray(peptides)
+        if peptides.ndim != 1:
+            raise ValueError(
+                "Expected 1d array of peptides, got shape %s" % (
+                    peptides.shape,))
+        if peptides.dtype.kind == "U":
+            try:
+                peptides = peptides.astype("S%d" % max(
+                    1, peptides.dtype.itemsize // 4))
+            except UnicodeEncodeError:
+                raise ValueError("Peptides must only contain ASCII characters")
+        elif peptides.dtype.kind != "S":
+            return cls.from_list(peptides)
+        peptides = np.ascontiguousarray(peptides)
+        width = peptides.dtype.itemsize
+        residues = peptides.view("uint8").reshape(-1)
+        starts = np.arange(len(peptides), dtype="int64") * width
+        lengths = np.char.str_len(peptides).astype("int64")
+        return cls(residues, starts, lengths)
+
+    @classmethod
+    def concatenate(cls, batches):
+        """
+        Combine several batches (or lists of peptides) into a single batch
+        with its own residue buffer.
+        """
+        batches = [cls.from_list(b) for b in batches]
+        if len(batches) == 0:
+            return cls.from_list([])
+        lengths = np.concatenate([b.lengths for b in batches])
+        residues = np.concatenate([b.compact().residues for b in batches])
+        starts = np.zeros_like(lengths)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        return cls(residues.astype("uint8", copy=False), starts, lengths)
+
+    @classmethod
+    def from_file(cls, path, mmap_mode=None):
+        """
+        Read peptides from a text file with one peptide per line. Empty
+        lines are skipped.
+
+        Parameters
+        ----------
+        path : str
+
+        mmap_mode : str, optional
+            If given (e.g. "r") then memory map the file rather than reading
+            it into memory.
+        """
+        if mmap_mode:
+            data = np.memmap(path, dtype="uint8", mode=mmap_mode)
+        else:
+            data = np.fromfile(path, dtype="uint8")
+        newlines = np.flatnonzero(data == ord("\n"))
+        starts = np.concatenate([[0], newlines + 1]).astype("int64")
+        ends = np.concatenate([newlines, [len(data)]]).astype("int64")
+        # drop carriage returns from Windows line endings
+        nonempty = ends > starts
+        ends[nonempty] -= data[ends[nonempty] - 1] == ord("\r")
+        lengths = ends - starts
+        keep = lengths > 0
+        return cls(data, starts[keep], lengths[keep])
+
+    def to_file(self, path):
+        """
+        Write peptides to a text file with one peptide per line.
+        """
+        with open(path, "wb") as f:
+            for i in range(len(self)):
+                start = self.starts[i]
+                f.write(self.residues[start:start + self.lengths[i]].tobytes())
+                f.write(b"\n")
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def max_length(self):
+        if len(self) == 0:
+            return 0
+        return int(self.lengths.max())
+
+    def __getitem__(self, idx):
+        if isinstance(idx, integer_types) or isinstance(idx, np.integer):
+            start = self.starts[idx]
+            return self.residues[
+                start:start + self.lengths[idx]].tobytes().decode("ascii")
+        return PeptideBatch(
+            residues=self.residues,
+            starts=self.starts[idx],
+            lengths=self.lengths[idx])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_list(self):
+        return list(self)
+
+    def __repr__(self):
+        n = len(self)
+        if n <= 6:
+            peptides = self.to_list()
+        else:
+            peptides = self[:3].to_list() + ["..."] + self[-3:].to_list()
+        return "PeptideBatch(n=%d, peptides=%s)" % (n, peptides)
+
+    def to_padded_array(self, max_length=None):
+        """
+        Returns (n_peptides, max_length) uint8 array of residues, with shorter
+        peptides padded by null bytes.
+        """
+        if max_length is None:
+            max_length = self.max_length
+        if len(self) > 0 and self.max_length > max_length:
+            raise ValueError("Peptide(s) longer than max length %d" % (
+                max_length,))
+        positions = np.arange(max_length)
+        indices = self.starts[:, np.newaxis] + positions
+        padding = positions >= self.lengths[:, np.newaxis]
+        if len(self.residues) > 0:
+            np.minimum(indices, len(self.residues) - 1, out=indices)
+            result = self.residues[indices]
+        else:
+            result = np.zeros(indices.shape, dtype="uint8")
+        result[padding] = 0
+        return result
+
+    def compact(self):
+        """
+        Returns copy of this batch whose residue buffer only contains its
+        own peptides (useful after slicing a much larger batch).
+        """
+        return self.add_flanking_tokens()
+
+    def add_flanking_tokens(self, prefix="", suffix=""):
+        """
+        Returns new batch with prefix and suffix strings added to the
+        beginning and end of each peptide.
+        """
+        if not isinstance(prefix, string_types) or not isinstance(
+                suffix, string_types):
+            raise TypeError("Expected prefix and suffix to be strings")
+        n_prefix = len(prefix)
+        n_suffix = len(suffix)
+        lengths = self.lengths + n_prefix + n_suffix
+        starts = np.zeros_like(lengths)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        residues = np.zeros(lengths.sum(), dtype="uint8")
+        for i, c in enumerate(prefix):
+            residues[starts + i] = ord(c)
+        for i, c in enumerate(suffix):
+            residues[starts + lengths - n_suffix + i] = ord(c)
+        # copy every peptide's residues into place after its prefix
+        n_residues = self.lengths.sum()
+        offsets_in_peptide = np.arange(n_residues) - np.repeat(
+            np.cumsum(self.lengths) - self.lengths, self.lengths)
+        source = np.repeat(self.starts, self.lengths) + offsets_in_peptide
+        dest = np.repeat(starts + n_prefix, self.lengths) + offsets_in_peptide
+        residues[dest] = self.residues[source]
+        return PeptideBatch(residues, starts, lengths)
@@ -11,12 +11,11 @@
 # limitations under the License.
 
 from collections import OrderedDict
+from itertools import islice
+import os
 
 from six import string_types
 import numpy as np
-from keras.models import Model
-from keras.utils import plot_model
-import keras.backend as K
 from serializable import Serializable
 import ujson
 
@@ -24,7 +23,21 @@ from .numeric_input import NumericInput
 from .sequence_input import SequenceInput
 from .discrete_input import DiscreteInput
 from .output import Output
-from .nn_helpers import merge, dense_layers, tensor_shape
+from .peptide_batch import PeptideBatch
+from .prefetch import prefetch
+from .dedup import DedupCounter, find_unique_samples, take_samples
+from .dataset_store import EncodedArray
+from .sharded_dataset import ShardedDataset, DEFAULT_SHUFFLE_BUFFER_SIZE
+from .sparse_labels import SparseLabels
+from .weights_file import write_weights_file, read_weights_file
+
+# training sets with at least this many samples are encoded one batch at a
+# time by a PredictorSequence instead of all at once before training
+SEQUENCE_FIT_MIN_SAMPLES = 100000
+
+# default number of samples score_small can evaluate without falling back
+# to predict
+SMALL_BATCH_MAX_SIZE = 64
 
 
 class Predictor(Serializable):
@@ -78,7 +91,50 @@ class Predictor(Serializable):
         self.dense_batch_normalization = dense_batch_normalization
         self.optimizer = optimizer
         self.training_metrics = training_metrics
-        self.model = self._build_and_compile()
+        self.dedup_counter = DedupCounter()
+        if self.num_inputs == 0:
+            raise ValueError("Predictor must have at least one input")
+        # the Keras model is only built when it's first needed and only
+        # compiled when training, so predictors which are loaded just for
+        # prediction skip the cost of building the loss and optimizer
+        self._model = None
+        self._compiled = False
+        self._pending_weights = None
+        # backend function and input buffers used by score_small
+        self._small_batch_state = None
+
+    @property
+    def model(self):
+        """
+        Keras model, which is built (but not compiled) on first access.
+        """
+        if self._model is None:
+            self._model = self._build()
+            if self._pending_weights is not None:
+                weights = self._pending_weights
+                self._pending_weights = None
+                self.set_weights(weights)
+        return self._model
+
+    @property
+    def is_built(self):
+        return self._model is not None
+
+    def build(self, compile=False):
+        """
+        Build the Keras model now instead of when it's first used, and
+        optionally compile it for training.
+        """
+        if compile:
+            return self._compiled_model()
+        return self.model
+
+    def _compiled_model(self):
+        model = self.model
+        if not self._compiled:
+            self._compile(model)
+            self._compiled = True
+        return model
 
     @property
     def use_input_dict(self):
@@ -145,6 +201,10 @@ class Predictor(Serializable):
         return outputs[0]
 
     def _build(self):
+        import keras.backend as K
+        from keras.models import Model
+        from .nn_helpers import merge, dense_layers
+
         input_dict = {}
         subgraphs_dict = OrderedDict()
         for (input_name, input_descriptor) in self.inputs_dict.items():
@@ -200,13 +260,6 @@ class Predictor(Serializable):
             loss = self._get_single_output().loss_fn
         model.compile(loss=loss, optimizer=self.optimizer, metrics=self.training_metrics)
 
-    def _build_and_compile(self):
-        if self.num_inputs == 0:
-            raise ValueError("Predictor must have at least one input")
-        model = self._build()
-        self._compile(model)
-        return model
-
     @property
     def num_inputs(self):
         return len(self.input_order)
@@ -221,21 +274,32 @@ class Predictor(Serializable):
     #
     ############################################################################
 
-    def _prepare_inputs(self, inputs):
+    def _input_dict(self, inputs):
         """
-        Returns dictionary of input name -> input value if use_input_dict is
-        True else, returns just encoded representation of single input.
+        Returns dictionary of input name -> raw (not yet encoded) values.
         """
-        if isinstance(inputs, (list, np.ndarray)):
+        if isinstance(inputs, (list, np.ndarray, PeptideBatch, EncodedArray)):
             if self.num_inputs != 1:
                 raise ValueError("Expected %d inputs but got 1" % self.num_inputs)
-            inputs = {self.input_order[0]: inputs}
+            return {self.input_order[0]: inputs}
         elif not isinstance(inputs, dict):
             raise TypeError(
-                "Expected inputs to be list, array, or dict, got %s" % (
+                "Expected inputs to be list, array, PeptideBatch, "
+                "EncodedArray, or dict, got %s" % (
                     type(inputs)))
+        return inputs
+
+    def _prepare_inputs(self, inputs, trim_padding=False):
+        """
+        Returns dictionary of input name -> input value if use_input_dict is
+        True else, returns just encoded representation of single input.
+
+        If trim_padding is True then peptides of SequenceInputs with
+        dynamic_length are only padded to the longest peptide given.
+        """
+        inputs = self._input_dict(inputs)
         encoded_inputs = {
-            name: i.encode(inputs[name])
+            name: self._encode_input(i, inputs[name], trim_padding=trim_padding)
             for name, i in self.inputs_dict.items()
         }
         lengths = {name: len(x) for (name, x) in encoded_inputs.items()}
@@ -247,10 +311,100 @@ class Predictor(Serializable):
         else:
             return list(encoded_inputs.values())[0]
 
+    def _encode_input(self, input_obj, values, trim_padding=False):
+        """
+        Encode values for a single input, using the array inside an
+        EncodedArray (e.g. from an EncodedDatasetStore) without copying it.
+        """
+        if isinstance(values, EncodedArray):
+            return values.check_compatible(input_obj)
+        if trim_padding and len(values) > 0 and isinstance(
+                input_obj, SequenceInput) and input_obj.dynamic_length:
+            return input_obj.encode(
+                values, length=int(self._peptide_lengths(values).max()))
+        return input_obj.encode(values)
+
+    ############################################################################
+    #
+    # Grouping samples by peptide length
+    #
+    ############################################################################
+
+    def _dynamic_length_inputs(self):
+        return [
+            i for i in self.inputs
+            if isinstance(i, SequenceInput) and i.dynamic_length
+        ]
+
+    def _check_bucketing(self):
+        if len(self._dynamic_length_inputs()) == 0:
+            raise ValueError(
+                "Bucketing by length requires a SequenceInput with "
+                "dynamic_length=True")
+
+    def _peptide_lengths(self, peptides):
+        if isinstance(peptides, PeptideBatch):
+            return peptides.lengths
+        if isinstance(peptides, EncodedArray):
+            raise ValueError("Can't group encoded peptides by length")
+        return np.array([len(p) for p in peptides], dtype="int64")
+
+    def _take_samples(self, values, indices):
+        """
+        Select samples by index from raw inputs, encoded inputs or outputs,
+        any of which might be a dictionary.
+        """
+        if isinstance(values, dict):
+            return {
+                name: take_samples(x, indices) for (name, x) in values.items()
+            }
+        return take_samples(values, indices)
+
+    def _length_buckets(self, inputs, batch_size=None):
+        """
+        Returns list of index arrays, each of which selects samples whose
+        peptides have the same length for every SequenceInput with
+        dynamic_length. Buckets are split into pieces of at most batch_size
+        samples.
+        """
+        self._check_bucketing()
+        inputs = self._input_dict(inputs)
+        if self._num_samples(inputs) == 0:
+            return []
+        keys = np.column_stack([
+            self._peptide_lengths(inputs[i.name])
+            for i in self._dynamic_length_inputs()
+        ])
+        _, bucket_ids = np.unique(keys, axis=0, return_inverse=True)
+        bucket_ids = bucket_ids.ravel()
+        order = np.argsort(bucket_ids, kind="mergesort")
+        boundaries = np.flatnonzero(np.diff(bucket_ids[order])) + 1
+        buckets = []
+        for indices in np.split(order, boundaries):
+            if batch_size:
+                buckets.extend(
+                    indices[start:start + batch_size]
+                    for start in range(0, len(indices), batch_size))
+            else:
+                buckets.append(indices)
+        return buckets
+
+    def _encoded_buckets(self, inputs, batch_size=None):
+        """
+        Generate (indices, encoded_inputs) for each length bucket, with
+        peptides only padded to the length of their bucket.
+        """
+        for indices in self._length_buckets(inputs, batch_size):
+            yield indices, self._prepare_inputs(
+                self._take_samples(inputs, indices), trim_padding=True)
+
     def _prepare_outputs(self, outputs, encode=False, decode=False):
         """
         Returns a dictionary from output name to array of output values.
+        SparseLabels are kept sparse, see _dense_outputs.
         """
+        if isinstance(outputs, SparseLabels):
+            outputs = self._split_sparse_labels(outputs)
         if isinstance(outputs, list):
             outputs = np.array(outputs).squeeze().T
 
@@ -276,7 +430,7 @@ class Predictor(Serializable):
                  "got %s (value=%s)" % (type(outputs), outputs)))
         if encode:
             outputs = {
-                name: output.encode(outputs[name])
+                name: self._encode_output(output, outputs[name])
                 for name, output in self.outputs_dict.items()
             }
         if decode:
@@ -293,15 +447,416 @@ class Predictor(Serializable):
         else:
             return list(outputs.values())[0]
 
-    def predict_scores(self, inputs):
-        return self._prepare_outputs(
-            self.model.predict(self._prepare_inputs(inputs)),
-            decode=False)
+    def _split_sparse_labels(self, labels):
+        """
+        Assign the columns of SparseLabels either to a single output with one
+        dimension per column or to one output per column.
+        """
+        if self.num_outputs == 1:
+            output = self.outputs[0]
+            if output.dim != labels.n_columns:
+                raise ValueError(
+                    "Expected %d label columns for output '%s' but got %d" % (
+                        output.dim, output.name, labels.n_columns))
+            return {output.name: labels}
+        if labels.n_columns != self.num_outputs:
+            raise ValueError("Expected %d outputs but got %d" % (
+                self.num_outputs, labels.n_columns))
+        return {
+            name: labels.column(i)
+            for i, name in enumerate(self.output_order)
+        }
+
+    def _encode_output(self, output, values):
+        if isinstance(values, SparseLabels):
+            return values.with_values(output.encode(values.values))
+        return output.encode(values)
+
+    def _has_sparse_outputs(self, outputs):
+        if isinstance(outputs, dict):
+            return any(isinstance(x, SparseLabels) for x in outputs.values())
+        return isinstance(outputs, SparseLabels)
+
+    def _dense_outputs(self, outputs):
+        """
+        Densify SparseLabels among prepared outputs (with NaN for missing
+        labels), which should only be done one batch at a time.
+        """
+        if isinstance(outputs, dict):
+            return {
+                name: self._dense_outputs(x) for (name, x) in outputs.items()
+            }
+        if isinstance(outputs, SparseLabels):
+            return outputs.to_dense()
+        return outputs
 
-    def predict(self, inputs):
+    def _num_samples(self, inputs):
+        """
+        Number of samples in raw (not yet encoded) inputs.
+        """
+        if isinstance(inputs, dict):
+            if len(inputs) == 0:
+                raise ValueError("Expected at least one input")
+            return len(list(inputs.values())[0])
+        return len(inputs)
+
+    def _slice_inputs(self, inputs, start, end):
+        """
+        Select samples [start:end) from raw (not yet encoded) inputs.
+        """
+        if isinstance(inputs, dict):
+            return {name: x[start:end] for (name, x) in inputs.items()}
+        return inputs[start:end]
+
+    def _encoded_chunks(self, inputs, chunk_size):
+        """
+        Generate (slice, encoded_inputs) for consecutive chunks of
+        raw inputs.
+        """
+        n_samples = self._num_samples(inputs)
+        for start in range(0, n_samples, chunk_size):
+            end = min(n_samples, start + chunk_size)
+            yield slice(start, end), self._prepare_inputs(
+                self._slice_inputs(inputs, start, end))
+
+    def _predict_raw_deduplicated(
+            self,
+            inputs,
+            chunk_size=None,
+            prefetch_depth=0,
+            bucket_by_length=False):
+        """
+        Same as _predict_raw but only encodes and predicts each distinct
+        sample once, then copies predictions back to every occurrence.
+        """
+        if isinstance(inputs, dict):
+            names = sorted(inputs.keys())
+            unique_indices, inverse = find_unique_samples(
+                [inputs[name] for name in names])
+            unique_inputs = {
+                name: take_samples(inputs[name], unique_indices)
+                for name in names
+            }
+        else:
+            unique_indices, inverse = find_unique_samples([inputs])
+            unique_inputs = take_samples(inputs, unique_indices)
+        self.dedup_counter.update(len(inverse), len(unique_indices))
+        predictions = self._predict_raw(
+            unique_inputs,
+            chunk_size=chunk_size,
+            prefetch_depth=prefetch_depth,
+            bucket_by_length=bucket_by_length)
+        if isinstance(predictions, list):
+            return [p[inverse] for p in predictions]
+        return predictions[inverse]
+
+    def _predict_raw(
+            self,
+            inputs,
+            chunk_size=None,
+            prefetch_depth=0,
+            bucket_by_length=False):
+        """
+        Returns result of the Keras model's predict method, optionally
+        encoding and predicting chunk_size samples at a time and writing
+        the predictions into preallocated arrays, which bounds the memory
+        used by encoded inputs. If prefetch_depth > 0 then upcoming chunks
+        are encoded on a background thread while the model evaluates the
+        current chunk. If bucket_by_length is True then samples are
+        predicted in groups of equal peptide length.
+        """
+        n_samples = self._num_samples(inputs)
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError("Invalid chunk size: %s" % (chunk_size,))
+        if bucket_by_length and n_samples > 0:
+            chunks = self._encoded_buckets(inputs, chunk_size)
+        elif chunk_size is None or n_samples <= chunk_size:
+            return self.model.predict(self._prepare_inputs(inputs))
+        else:
+            chunks = self._encoded_chunks(inputs, chunk_size)
+        if prefetch_depth:
+            chunks = prefetch(chunks, queue_depth=prefetch_depth)
+        results = None
+        try:
+            for indices, encoded_inputs in chunks:
+                chunk_predictions = self.model.predict(encoded_inputs)
+                if isinstance(chunk_predictions, list):
+                    chunk_predictions_list = chunk_predictions
+                else:
+                    chunk_predictions_list = [chunk_predictions]
+                if results is None:
+                    results = [
+                        np.empty((n_samples,) + p.shape[1:], dtype=p.dtype)
+                        for p in chunk_predictions_list
+                    ]
+                for result, p in zip(results, chunk_predictions_list):
+                    result[indices] = p
+        finally:
+            # stop the prefetch thread if the model raised
+            chunks.close()
+        if isinstance(chunk_predictions, list):
+            return results
+        return results[0]
+
+    def _predict(
+            self,
+            inputs,
+            decode,
+            chunk_size=None,
+            prefetch_depth=0,
+            dedup=False,
+            bucket_by_length=False):
+        """
+        Prediction pipeline shared by predict and predict_scores, which only
+        differ in whether the inverse transforms of outputs are applied.
+        """
+        if bucket_by_length:
+            self._check_bucketing()
+        if dedup:
+            predict_fn = self._predict_raw_deduplicated
+        else:
+            predict_fn = self._predict_raw
         return self._prepare_outputs(
-            self.model.predict(self._prepare_inputs(inputs)),
-            decode=True)
+            predict_fn(
+                inputs,
+                chunk_size=chunk_size,
+                prefetch_depth=prefetch_depth,
+                bucket_by_length=bucket_by_length),
+            decode=decode)
+
+    def predict_scores(
+            self,
+            inputs,
+            chunk_size=None,
+            prefetch_depth=0,
+            dedup=False,
+            bucket_by_length=False):
+        """
+        Predict outputs without applying their inverse transforms. Takes the
+        same options as predict.
+        """
+        return self._predict(
+            inputs,
+            decode=False,
+            chunk_size=chunk_size,
+            prefetch_depth=prefetch_depth,
+            dedup=dedup,
+            bucket_by_length=bucket_by_length)
+
+    def predict(
+            self,
+            inputs,
+            chunk_size=None,
+            prefetch_depth=0,
+            dedup=False,
+            bucket_by_length=False):
+        """
+        Predict outputs for the given inputs.
+
+        Parameters
+        ----------
+        inputs : list, array, PeptideBatch or dict
+
+        chunk_size : int, optional
+            If given, encode and predict this many samples at a time to bound
+            memory usage on large inputs.
+
+        prefetch_depth : int
+            Number of chunks to encode ahead on a background thread while
+            the model evaluates the current chunk (only used with chunk_size).
+
+        dedup : bool
+            Only encode and predict each distinct sample once, counts of
+            samples and distinct samples are added to self.dedup_counter.
+
+        bucket_by_length : bool
+            Predict groups of samples with equal peptide lengths together,
+            padding peptides of SequenceInputs with dynamic_length only to
+            the length of their group. Predictions are identical to those
+            with full padding when the model masks padding.
+        """
+        return self._predict(
+            inputs,
+            decode=True,
+            chunk_size=chunk_size,
+            prefetch_depth=prefetch_depth,
+            dedup=dedup,
+            bucket_by_length=bucket_by_length)
+
+    def _collate_inputs(self, samples):
+        """
+        Combine a list of individual samples (either peptide strings or
+        dictionaries mapping input names to values) into a batch of inputs.
+        """
+        if len(samples) == 0 or not isinstance(samples[0], dict):
+            return samples
+        batch = {}
+        for name, input_obj in self.inputs_dict.items():
+            values = [sample[name] for sample in samples]
+            if isinstance(input_obj, NumericInput):
+                values = np.array(values)
+            batch[name] = values
+        return batch
+
+    def _encoded_batches(self, inputs, batch_size):
+        """
+        Generate (input_batch, encoded_inputs) for consecutive batches
+        of samples from an iterable.
+        """
+        iterator = iter(inputs)
+        while True:
+            samples = list(islice(iterator, batch_size))
+            if len(samples) == 0:
+                break
+            input_batch = self._collate_inputs(samples)
+            yield input_batch, self._prepare_inputs(input_batch)
+
+    def predict_iter(
+            self, inputs, batch_size=1024, decode=True, prefetch_depth=0):
+        """
+        Lazily predict outputs for an iterable of samples, which can be
+        arbitrarily long (e.g. a generator of peptides from a FASTA file).
+
+        Parameters
+        ----------
+        inputs : iterable
+            Each element is either a single peptide string (for predictors
+            with one input) or a dictionary from input names to values.
+
+        batch_size : int
+            Number of samples to encode and predict at a time.
+
+        decode : bool
+            Apply inverse transforms of outputs (as in predict) or return
+            raw scores (as in predict_scores).
+
+        prefetch_depth : int
+            Number of batches to collect and encode ahead on a background
+            thread while the model evaluates the current batch.
+
+        Yields (input_batch, predictions) pairs, where predictions has the
+        same format as the result of predict.
+        """
+        if batch_size <= 0:
+            raise ValueError("Invalid batch size: %s" % (batch_size,))
+        batches = self._encoded_batches(inputs, batch_size)
+        if prefetch_depth:
+            batches = prefetch(batches, queue_depth=prefetch_depth)
+        try:
+            for input_batch, encoded_inputs in batches:
+                predictions = self._prepare_outputs(
+                    self.model.predict(encoded_inputs),
+                    decode=decode)
+                yield input_batch, predictions
+        finally:
+            # stop the prefetch thread if the model raised or the caller
+            # stopped iterating early
+            batches.close()
+
+    def warmup(
+            self,
+            example_inputs,
+            max_batch_size=SMALL_BATCH_MAX_SIZE,
+            n_iters=3):
+        """
+        Prepare for score_small: build the model, create a backend function
+        which evaluates it without Keras' batching logic, allocate input
+        buffers for up to max_batch_size samples, and run the function a
+        few times so that the first real request isn't slow.
+
+        Parameters
+        ----------
+        example_inputs : list, array, PeptideBatch or dict
+            Representative inputs, of which at most max_batch_size samples
+            are used for the warmup runs
+
+        max_batch_size : int
+            Largest number of samples score_small will handle without falling
+            back to predict
+
+        n_iters : int
+            Number of warmup evaluations
+        """
+        import keras.backend as K
+
+        if max_batch_size <= 0:
+            raise ValueError("Invalid max batch size: %s" % (max_batch_size,))
+        model = self.model
+        fn_inputs = list(model.inputs)
+        learning_phase = []
+        if model.uses_learning_phase and not isinstance(
+                K.learning_phase(), int):
+            fn_inputs.append(K.learning_phase())
+            learning_phase = [0]
+        fn = K.function(fn_inputs, model.outputs)
+        buffers = []
+        for name, x in zip(self.input_order, model.inputs):
+            # inputs with dynamic_length have no fixed number of time steps,
+            # so their buffers hold peptides padded to the full length
+            shape = tuple(
+                self.inputs_dict[name].padded_length if dim is None else dim
+                for dim in K.int_shape(x)[1:])
+            buffers.append(
+                np.zeros((max_batch_size,) + shape, dtype=K.dtype(x)))
+        self._small_batch_state = (fn, learning_phase, buffers)
+        example_inputs = self._input_dict(example_inputs)
+        n_examples = min(self._num_samples(example_inputs), max_batch_size)
+        example_inputs = self._take_samples(
+            example_inputs, np.arange(n_examples))
+        for _ in range(n_iters):
+            self.score_small(example_inputs)
+
+    def _encode_into(self, input_obj, values, out):
+        if isinstance(values, EncodedArray):
+            out[...] = values.check_compatible(input_obj).reshape(out.shape)
+        elif isinstance(input_obj, SequenceInput):
+            input_obj.encode(values, out=out)
+        else:
+            out[...] = np.asarray(input_obj.encode(values)).reshape(out.shape)
+
+    def score_small(self, inputs, decode=True):
+        """
+        Low latency prediction for small numbers of samples, which encodes
+        directly into preallocated buffers and calls the backend function
+        created by warmup. If warmup hasn't been called then it's called
+        with these inputs, unless there are more than SMALL_BATCH_MAX_SIZE
+        of them. Empty batches and batches larger than the warmup
+        max_batch_size are passed on to predict.
+
+        Parameters
+        ----------
+        inputs : list, array, PeptideBatch or dict
+
+        decode : bool
+            Apply inverse transforms of outputs, as in predict (otherwise
+            same as predict_scores)
+        """
+        n_samples = self._num_samples(inputs)
+        if self._small_batch_state is None:
+            max_batch_size = SMALL_BATCH_MAX_SIZE
+        else:
+            max_batch_size = len(self._small_batch_state[2][0])
+        if n_samples == 0 or n_samples > max_batch_size:
+            if decode:
+                return self.predict(inputs)
+            return self.predict_scores(inputs)
+        if self._small_batch_state is None:
+            self.warmup(inputs)
+        fn, learning_phase, buffers = self._small_batch_state
+        if not isinstance(inputs, dict):
+            if self.num_inputs != 1:
+                raise ValueError(
+                    "Expected %d inputs but got 1" % self.num_inputs)
+            inputs = {self.input_order[0]: inputs}
+        batch = []
+        for name, buffer in zip(self.input_order, buffers):
+            out = buffer[:n_samples]
+            self._encode_into(self.inputs_dict[name], inputs[name], out)
+            batch.append(out)
+        outputs = fn(batch + learning_phase)
+        if len(outputs) == 1:
+            outputs = outputs[0]
+        return self._prepare_outputs(outputs, decode=decode)
 
     ############################################################################
     #
@@ -319,7 +874,8 @@ class Predictor(Serializable):
                     }
         return sample_weight
 
-    def _prepare_data_tuple(self, data_tuple):
+    def _prepare_data_tuple(
+            self, data_tuple, trim_padding=False, encode_outputs=False):
         """
         Data generators return either (input, output) or
         (input, output, weights) tuples. This function transforms
@@ -333,25 +889,215 @@ class Predictor(Serializable):
                 "Dataset expected to be (X, Y, weights), got %d elements" % (
                     len(data_tuple),)
             inputs, outputs, weights = data_tuple
-        inputs = self._prepare_inputs(inputs)
-        outputs = self._prepare_outputs(outputs)
+        inputs = self._prepare_inputs(inputs, trim_padding=trim_padding)
+        outputs = self._dense_outputs(
+            self._prepare_outputs(outputs, encode=encode_outputs))
         weights = self._prepare_sample_weights(weights)
         return inputs, outputs, weights
 
-    def _wrap_data_generator(self, generator):
+    def _wrap_data_generator(
+            self, generator, trim_padding=False, encode_outputs=False):
         for data_tuple in generator:
-            yield self._prepare_data_tuple(data_tuple)
+            yield self._prepare_data_tuple(
+                data_tuple,
+                trim_padding=trim_padding,
+                encode_outputs=encode_outputs)
 
-    def fit(self,
+    def _fit_dataset(
+            self,
+            dataset,
+            batch_size,
+            epochs,
+            class_weight,
+            validation_data,
+            shuffle,
+            shuffle_buffer_size,
+            callbacks,
+            max_queue_size):
+        """
+        Train on batches streamed from the shards of a ShardedDataset, which
+        are encoded one batch at a time.
+        """
+        if validation_data is not None:
+            validation_data = self._prepare_data_tuple(validation_data)
+        batches = dataset.batch_generator(
+            batch_size=batch_size,
+            shuffle=shuffle,
+            shuffle_buffer_size=shuffle_buffer_size)
+        return self._compiled_model().fit_generator(
+            generator=self._wrap_data_generator(batches, encode_outputs=True),
+            steps_per_epoch=dataset.n_batches(batch_size),
+            epochs=epochs,
+            class_weight=class_weight,
+            validation_data=validation_data,
+            callbacks=callbacks,
+            max_queue_size=max_queue_size)
+
+    def _bucketed_batches(self, buckets, batch_size, shuffle):
+        """
+        Endlessly generate (inputs, outputs, weights) batches drawn from
+        a single bucket of already encoded samples at a time. When shuffle is
+        True the samples within each bucket and the order of batches are
+        shuffled every epoch.
+        """
+        while True:
+            batches = []
+            for bucket_index, (inputs, _, _) in enumerate(buckets):
+                n_samples = self._num_samples(inputs)
+                if shuffle:
+                    order = np.random.permutation(n_samples)
+                else:
+                    order = np.arange(n_samples)
+                for start in range(0, n_samples, batch_size):
+                    batches.append(
+                        (bucket_index, order[start:start + batch_size]))
+            if shuffle:
+                batches = [
+                    batches[i] for i in np.random.permutation(len(batches))]
+            for bucket_index, indices in batches:
+                inputs, outputs, weights = buckets[bucket_index]
+                if weights is not None:
+                    weights = self._take_samples(weights, indices)
+                yield (
+                    self._take_samples(inputs, indices),
+                    self._dense_outputs(self._take_samples(outputs, indices)),
+                    weights)
+
+    def _fit_bucketed(
+            self,
             inputs,
             outputs,
+            batch_size,
+            epochs,
+            sample_weight,
+            class_weight,
+            validation_data,
+            shuffle,
+            callbacks):
+        outputs = self._prepare_outputs(outputs, encode=True)
+        sample_weight = self._prepare_sample_weights(sample_weight)
+        buckets = []
+        steps_per_epoch = 0
+        # encode each bucket once up front, padded to its own length
+        for indices, encoded_inputs in self._encoded_buckets(inputs):
+            if sample_weight is None:
+                bucket_weights = None
+            else:
+                bucket_weights = self._take_samples(sample_weight, indices)
+            buckets.append((
+                encoded_inputs,
+                self._take_samples(outputs, indices),
+                bucket_weights))
+            steps_per_epoch += (len(indices) + batch_size - 1) // batch_size
+        if steps_per_epoch == 0:
+            raise ValueError("Can't fit without any samples")
+        if validation_data is not None:
+            validation_data = self._prepare_data_tuple(validation_data)
+        return self._compiled_model().fit_generator(
+            generator=self._bucketed_batches(buckets, batch_size, shuffle),
+            steps_per_epoch=steps_per_epoch,
+            epochs=epochs,
+            class_weight=class_weight,
+            validation_data=validation_data,
+            callbacks=callbacks)
+
+    def fit(self,
+            inputs,
+            outputs=None,
             batch_size=32,
             epochs=100,
             sample_weight=None,
             class_weight=None,
             validation_data=None,
             shuffle=True,
-            callbacks=[]):
+            callbacks=[],
+            bucket_by_length=False,
+            workers=1,
+            use_multiprocessing=False,
+            max_queue_size=10,
+            sequence_min_samples=SEQUENCE_FIT_MIN_SAMPLES,
+            shuffle_buffer_size=DEFAULT_SHUFFLE_BUFFER_SIZE):
+        """
+        Train the model on the given inputs and outputs. If bucket_by_length
+        is True then every batch only contains samples with the same peptide
+        lengths, which are padded to that length instead of the maximum
+        length of their SequenceInput (requires dynamic_length=True).
+
+        Outputs can be given as SparseLabels, which are only densified (with
+        NaN for missing labels) one batch at a time.
+
+        Which Keras training method is used depends on the size of the
+        training set: with fewer than sequence_min_samples samples (100,000
+        by default) all inputs are encoded up front and passed to the Keras
+        model's fit, while larger training sets (or any training set when
+        workers > 1 or outputs are SparseLabels) are wrapped in a
+        PredictorSequence and trained with fit_generator. The sequence
+        encodes each batch when Keras asks for it, so upcoming batches are
+        encoded by the given number of worker threads (or processes, if
+        use_multiprocessing is True), keeping up to max_queue_size batches
+        ready ahead of the model. Pass sequence_min_samples=None to always
+        encode the whole training set up front (unless workers > 1 or
+        outputs are SparseLabels).
+
+        If inputs is a ShardedDataset then outputs and sample weights are
+        read from it too, and batches are streamed from disk with only about
+        shuffle_buffer_size samples held in memory at a time.
+        """
+        if isinstance(inputs, ShardedDataset):
+            if outputs is not None or sample_weight is not None:
+                raise ValueError(
+                    "Outputs and sample weights of a ShardedDataset are read "
+                    "from the dataset itself")
+            if bucket_by_length or workers > 1:
+                raise ValueError(
+                    "bucket_by_length and workers aren't supported "
+                    "for a ShardedDataset")
+            return self._fit_dataset(
+                inputs,
+                batch_size=batch_size,
+                epochs=epochs,
+                class_weight=class_weight,
+                validation_data=validation_data,
+                shuffle=shuffle,
+                shuffle_buffer_size=shuffle_buffer_size,
+                callbacks=callbacks,
+                max_queue_size=max_queue_size)
+        if outputs is None:
+            raise ValueError("Expected outputs")
+        if bucket_by_length:
+            return self._fit_bucketed(
+                inputs,
+                outputs,
+                batch_size=batch_size,
+                epochs=epochs,
+                sample_weight=sample_weight,
+                class_weight=class_weight,
+                validation_data=validation_data,
+                shuffle=shuffle,
+                callbacks=callbacks)
+        use_sequence = (
+            workers > 1 or
+            self._has_sparse_outputs(outputs) or
+            (sequence_min_samples is not None and self._num_samples(
+                self._input_dict(inputs)) >= sequence_min_samples))
+        if use_sequence:
+            if validation_data is not None:
+                validation_data = self._prepare_data_tuple(validation_data)
+            return self.fit_generator(
+                self.make_sequence(
+                    inputs,
+                    outputs,
+                    sample_weight=sample_weight,
+                    batch_size=batch_size,
+                    shuffle=shuffle),
+                epochs=epochs,
+                class_weight=class_weight,
+                validation_data=validation_data,
+                shuffle=shuffle,
+                callbacks=callbacks,
+                workers=workers,
+                use_multiprocessing=use_multiprocessing,
+                max_queue_size=max_queue_size)
         inputs = self._prepare_inputs(inputs)
         outputs = self._prepare_outputs(outputs, encode=True)
         sample_weight = self._prepare_sample_weights(sample_weight)
@@ -359,7 +1105,7 @@ class Predictor(Serializable):
         if validation_data is not None:
             validation_data = self._prepare_data_tuple(validation_data)
 
-        return self.model.fit(
+        return self._compiled_model().fit(
             inputs,
             outputs,
             batch_size=batch_size,
@@ -370,10 +1116,31 @@ class Predictor(Serializable):
             validation_data=validation_data,
             callbacks=callbacks)
 
+    def make_sequence(
+            self,
+            inputs,
+            outputs,
+            sample_weight=None,
+            batch_size=32,
+            shuffle=True):
+        """
+        Returns a PredictorSequence which encodes batches of the given
+        training data on demand, for use with fit_generator.
+        """
+        from .training_sequence import PredictorSequence
+        return PredictorSequence(
+            self,
+            inputs,
+            outputs,
+            sample_weight=sample_weight,
+            batch_size=batch_size,
+            shuffle=shuffle)
+
     def fit_generator(
             self,
             generator,
-            steps_per_epoch,
+            steps_per_epoch=None,
+            bucket_by_length=False,
             **kwargs):
         """
         Expects a generator which returns tuples of
@@ -382,10 +1149,29 @@ class Predictor(Serializable):
             (inputs, outputs, sample_weights)
         which are then transformed appropriately before being
         passed on to the fit_generator method of the underlying
-        Keras model.
+        Keras model. If bucket_by_length is True then peptides of
+        SequenceInputs with dynamic_length are only padded to the longest
+        peptide in each batch, so the generator should yield batches of
+        similar lengths.
+
+        A PredictorSequence (see make_sequence) already yields encoded
+        batches and is passed to Keras as is, which allows the workers and
+        use_multiprocessing options of Keras to encode batches in parallel.
         """
-        return self.model.fit_generator(
-            generator=self._wrap_data_generator(generator),
+        from .training_sequence import PredictorSequence
+        if isinstance(generator, PredictorSequence):
+            if bucket_by_length:
+                raise ValueError(
+                    "Can't bucket a PredictorSequence by length")
+            return self._compiled_model().fit_generator(
+                generator=generator,
+                steps_per_epoch=steps_per_epoch,
+                **kwargs)
+        if bucket_by_length:
+            self._check_bucketing()
+        return self._compiled_model().fit_generator(
+            generator=self._wrap_data_generator(
+                generator, trim_padding=bucket_by_length),
             steps_per_epoch=steps_per_epoch,
             **kwargs)
 
@@ -396,6 +1182,7 @@ class Predictor(Serializable):
     ############################################################################
 
     def save_diagram(self, filename="model.png"):
+        from keras.utils import plot_model
         plot_model(self.model, to_file=filename)
 
     ############################################################################
@@ -436,21 +1223,44 @@ class Predictor(Serializable):
         else:
             raise ValueError("Invalid output name: %s" % (name,))
 
+    def compile_numpy(self):
+        """
+        Returns a NumpyPredictor which makes the same predictions as this
+        Predictor by evaluating its layers with NumPy, avoiding the overhead
+        of Keras for small batches. NumpyPredictors can be saved, loaded and
+        pickled without importing Keras or TensorFlow.
+        """
+        from .numpy_model import NumpyModel, NumpyPredictor
+        return NumpyPredictor(
+            architecture=self._architecture_dict(),
+            model=NumpyModel.from_keras_model(self.model))
+
     def get_weights(self):
-        return [w.get_value().squeeze() for w in self.model.weights]
+        import keras.backend as K
+        return [w.squeeze() for w in K.batch_get_value(self.model.weights)]
 
     def set_weights(self, weights):
+        if not self.is_built:
+            # keep the weights until the model gets built
+            self._pending_weights = list(weights)
+            return
         if len(self.model.weights) != len(weights):
             raise ValueError("Expected %d weight arrays but got %d" % (
                 len(self.model.weights),
                 len(weights)))
+        import keras.backend as K
+        from .nn_helpers import tensor_shape
+
+        assignments = []
         for w_tensor, w_values in zip(self.model.weights, weights):
             shape = tensor_shape(w_tensor)
-            w_compatible = w_values.reshape(shape)
-            w_compatible = w_compatible.astype(w_tensor.dtype)
-            w_tensor.set_value(w_compatible)
+            w_compatible = np.asarray(w_values).reshape(shape)
+            w_compatible = w_compatible.astype(w_tensor.dtype, copy=False)
+            assignments.append((w_tensor, w_compatible))
+        # assign all weights at once rather than one backend call per tensor
+        K.batch_set_value(assignments)
 
-    def to_dict(self):
+    def _architecture_dict(self):
         return {
             "inputs": [self._input_to_repr(i) for i in self.inputs],
             "outputs": [self._output_to_repr(o) for o in self.outputs],
@@ -461,19 +1271,77 @@ class Predictor(Serializable):
             "dense_batch_normalization": self.dense_batch_normalization,
             "optimizer": self.optimizer,
             "training_metrics": self.training_metrics,
-            "model_weights": [w.tolist() for w in self.get_weights()]
         }
 
+    def to_dict(self):
+        config_dict = self._architecture_dict()
+        config_dict["model_weights"] = [w.tolist() for w in self.get_weights()]
+        return config_dict
+
     @classmethod
     def from_dict(self, config_dict):
-        model_weights_as_lists = config_dict.pop("model_weights")
-        model_weights = [np.array(values) for values in model_weights_as_lists]
+        config_dict = dict(config_dict)
+        model_weights_as_lists = config_dict.pop("model_weights", None)
         input_reprs = config_dict.pop("inputs")
         output_reprs = config_dict.pop("outputs")
         inputs = [self._input_from_repr(i) for i in input_reprs]
         outputs = [self._output_from_repr(o) for o in output_reprs]
         predictor = Predictor(inputs=inputs, outputs=outputs, **config_dict)
-        predictor.set_weights(model_weights)
+        if model_weights_as_lists is not None:
+            predictor.set_weights(
+                [np.array(values) for values in model_weights_as_lists])
+        return predictor
+
+    def save(self, filename, weights_filename=None):
+        """
+        Save architecture as JSON and weights as a single binary file, which
+        is much smaller and faster to load than the weights in to_json.
+
+        Parameters
+        ----------
+        filename : str
+            Path of JSON file with architecture and weight offset table
+
+        weights_filename : str, optional
+            Path of binary weights file, defaults to filename + ".weights"
+        """
+        if weights_filename is None:
+            weights_filename = filename + ".weights"
+        import keras.backend as K
+
+        config_dict = self._architecture_dict()
+        config_dict["weights"] = write_weights_file(
+            weights_filename, K.batch_get_value(self.model.weights))
+        config_dict["weights_filename"] = os.path.relpath(
+            weights_filename, os.path.dirname(os.path.abspath(filename)))
+        with open(filename, "w") as f:
+            f.write(ujson.dumps(config_dict))
+
+    @classmethod
+    def load(cls, filename, mmap_mode=None):
+        """
+        Load a Predictor written by save. Also accepts files written by
+        to_json_file.
+
+        Parameters
+        ----------
+        filename : str
+
+        mmap_mode : str, optional
+            If given (e.g. "r") then memory map the weights file instead of
+            reading it into memory.
+        """
+        with open(filename, "r") as f:
+            config_dict = ujson.loads(f.read())
+        if "weights" not in config_dict:
+            return cls.from_dict(config_dict)
+        weight_table = config_dict.pop("weights")
+        weights_filename = os.path.join(
+            os.path.dirname(os.path.abspath(filename)),
+            config_dict.pop("weights_filename"))
+        predictor = cls.from_dict(config_dict)
+        predictor.set_weights(read_weights_file(
+            weights_filename, weight_table, mmap_mode=mmap_mode))
         return predictor
 
     def to_json(self):
@@ -0,0 +1,346 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Train many Predictors with the same inputs at once, as a single Keras model
+which evaluates every member on one encoding of each batch.
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+from .dedup import take_samples
+from .discrete_input import DiscreteInput
+from .numeric import Numeric
+from .predictor import SEQUENCE_FIT_MIN_SAMPLES
+from .sequence_input import SequenceInput
+from .sharded_dataset import ShardedDataset
+
+
+def input_encoding_key(input_obj):
+    """
+    Everything which determines how raw values are encoded for an input,
+    so that inputs with equal keys can share a single encoding.
+    """
+    if isinstance(input_obj, SequenceInput):
+        return (
+            "sequence",
+            input_obj.encoding_config_key,
+            input_obj.dynamic_length,
+        )
+    elif isinstance(input_obj, DiscreteInput):
+        return (
+            "discrete",
+            tuple(input_obj.choices),
+            input_obj.transform,
+        )
+    elif isinstance(input_obj, Numeric):
+        return (
+            "numeric",
+            input_obj.dim,
+            input_obj.dtype,
+            input_obj.transform,
+        )
+    raise TypeError("Unsupported input type: %s" % (type(input_obj),))
+
+
+class PredictorGroup(object):
+    """
+    Group of Predictors with identically encoded inputs (e.g. variations of
+    one architecture in a hyperparameter sweep) which are trained together.
+
+    The members' Keras models are applied to a shared set of Keras inputs
+    and combined into one model whose outputs are all of the members'
+    outputs, with each member's loss on its own outputs. Members keep their
+    own parameters (the total loss is a sum of terms which each depend on one
+    member), so training the group trains every member as if it had been
+    fit separately, but each batch is only encoded once and all members are
+    evaluated in the same call into the backend. Since the group's model
+    reuses the members' layers, the members hold their trained weights
+    afterwards and can be used (or saved) on their own.
+
+    Parameters
+    ----------
+    predictors : list of Predictor
+        Must all have the same input names with the same encodings, the
+        same output names, and the same optimizer.
+    """
+    def __init__(self, predictors):
+        predictors = list(predictors)
+        if len(predictors) == 0:
+            raise ValueError("PredictorGroup requires at least one Predictor")
+        first = predictors[0]
+        for i, predictor in enumerate(predictors[1:], 1):
+            if predictor.input_order != first.input_order:
+                raise ValueError(
+                    "Predictor %d has inputs %s but expected %s" % (
+                        i, predictor.input_order, first.input_order))
+            for input_obj in predictor.inputs:
+                expected = first.inputs_dict[input_obj.name]
+                if input_encoding_key(input_obj) != input_encoding_key(
+                        expected):
+                    raise ValueError(
+                        "Input '%s' of predictor %d is encoded differently" % (
+                            input_obj.name, i))
+            if predictor.output_order != first.output_order:
+                raise ValueError(
+                    "Predictor %d has outputs %s but expected %s" % (
+                        i, predictor.output_order, first.output_order))
+            if predictor.optimizer != first.optimizer:
+                raise ValueError(
+                    "Predictor %d uses optimizer %s but expected %s" % (
+                        i, predictor.optimizer, first.optimizer))
+        self.predictors = predictors
+        self._model = None
+        self._compiled = False
+
+    def __len__(self):
+        return len(self.predictors)
+
+    def __getitem__(self, idx):
+        return self.predictors[idx]
+
+    def __iter__(self):
+        return iter(self.predictors)
+
+    @property
+    def model(self):
+        """
+        Keras model whose outputs are the outputs of every member in order,
+        built on first access.
+        """
+        if self._model is None:
+            self._model = self._build()
+        return self._model
+
+    def _build(self):
+        import keras.backend as K
+        from keras.layers import Input
+        from keras.models import Model
+
+        first_model = self.predictors[0].model
+        inputs = [
+            Input(
+                batch_shape=K.int_shape(x),
+                dtype=K.dtype(x),
+                name=name)
+            for (name, x) in zip(
+                self.predictors[0].input_order, first_model.inputs)
+        ]
+        outputs = []
+        for i, predictor in enumerate(self.predictors):
+            member_model = predictor.model
+            for x, member_input in zip(inputs, member_model.inputs):
+                if K.int_shape(x) != K.int_shape(member_input):
+                    raise ValueError(
+                        "Predictor %d expects input shape %s but got %s" % (
+                            i,
+                            K.int_shape(member_input),
+                            K.int_shape(x)))
+            member_outputs = member_model(
+                inputs if len(inputs) > 1 else inputs[0])
+            if not isinstance(member_outputs, list):
+                member_outputs = [member_outputs]
+            outputs.extend(member_outputs)
+        return Model(inputs=inputs, outputs=outputs)
+
+    def _compiled_model(self):
+        model = self.model
+        if not self._compiled:
+            model.compile(
+                loss=[
+                    output.loss_fn
+                    for predictor in self.predictors
+                    for output in predictor.outputs
+                ],
+                optimizer=self.predictors[0].optimizer)
+            self._compiled = True
+        return model
+
+    def _input_dict(self, inputs):
+        return self.predictors[0]._input_dict(inputs)
+
+    def _num_samples(self, inputs):
+        return self.predictors[0]._num_samples(inputs)
+
+    def _prepare_inputs(self, inputs):
+        return self.predictors[0]._prepare_inputs(inputs)
+
+    def _take_samples(self, values, indices):
+        """
+        Select samples from raw inputs (a dictionary) or from the list of
+        arrays prepared for the group model's outputs.
+        """
+        if isinstance(values, list):
+            return [take_samples(x, indices) for x in values]
+        return self.predictors[0]._take_samples(values, indices)
+
+    def _output_arrays(self, predictor, outputs):
+        outputs = predictor._prepare_outputs(outputs, encode=True)
+        if not isinstance(outputs, dict):
+            outputs = {predictor.output_order[0]: outputs}
+        return [outputs[name] for name in predictor.output_order]
+
+    def _prepare_outputs(self, outputs, encode=True):
+        """
+        Encode the same targets for each member (with its own output
+        transforms), returning a list matching the group model's outputs.
+        SparseLabels are kept sparse, see _dense_outputs.
+        """
+        return [
+            array
+            for predictor in self.predictors
+            for array in self._output_arrays(predictor, outputs)
+        ]
+
+    def _dense_outputs(self, outputs):
+        return [self.predictors[0]._dense_outputs(x) for x in outputs]
+
+    def _for_each_output(self, value):
+        """
+        Expand an argument given for all outputs or as a dictionary
+        of output name -> value into a list matching the group model's
+        outputs.
+        """
+        output_names = set(self.predictors[0].output_order)
+        result = []
+        for predictor in self.predictors:
+            for name in predictor.output_order:
+                if isinstance(value, dict) and set(value).issubset(
+                        output_names):
+                    result.append(value.get(name))
+                else:
+                    result.append(value)
+        return result
+
+    def _prepare_sample_weights(self, sample_weight):
+        if sample_weight is None:
+            return None
+        output_names = self.predictors[0].output_order
+        if isinstance(sample_weight, dict) and set(sample_weight).issubset(
+                output_names):
+            missing = [
+                name for name in output_names if name not in sample_weight]
+            if missing:
+                raise ValueError(
+                    "Missing sample weights for output(s) %s" % (
+                        ", ".join(missing),))
+        return self._for_each_output(sample_weight)
+
+    def _prepare_class_weights(self, class_weight):
+        if class_weight is None:
+            return None
+        return self._for_each_output(class_weight)
+
+    def _prepare_data_tuple(self, data_tuple):
+        if len(data_tuple) == 2:
+            inputs, outputs = data_tuple
+            weights = None
+        else:
+            inputs, outputs, weights = data_tuple
+        return (
+            self._prepare_inputs(inputs),
+            self._dense_outputs(self._prepare_outputs(outputs)),
+            self._prepare_sample_weights(weights))
+
+    def fit(self,
+            inputs,
+            outputs,
+            batch_size=32,
+            epochs=100,
+            sample_weight=None,
+            class_weight=None,
+            validation_data=None,
+            shuffle=True,
+            callbacks=[],
+            verbose=1,
+            workers=1,
+            use_multiprocessing=False,
+            max_queue_size=10,
+            sequence_min_samples=SEQUENCE_FIT_MIN_SAMPLES):
+        """
+        Train every member on the same inputs and outputs, which are given
+        in the same form as for Predictor.fit. Sample and class weights
+        are either used for every output or given as a dictionary from
+        output name to weights. Returns the Keras History, which records the
+        loss of each member's outputs separately.
+
+        As in Predictor.fit, large training sets and SparseLabels outputs
+        are encoded (and densified) one batch at a time by a
+        PredictorSequence. Training from a ShardedDataset or with batches
+        bucketed by peptide length isn't supported for groups.
+        """
+        if isinstance(inputs, ShardedDataset):
+            raise ValueError(
+                "PredictorGroup can't be trained on a ShardedDataset")
+        if validation_data is not None:
+            validation_data = self._prepare_data_tuple(validation_data)
+        class_weight = self._prepare_class_weights(class_weight)
+        use_sequence = (
+            workers > 1 or
+            any(p._has_sparse_outputs(outputs) for p in self.predictors) or
+            (sequence_min_samples is not None and self._num_samples(
+                self._input_dict(inputs)) >= sequence_min_samples))
+        if use_sequence:
+            from .training_sequence import PredictorSequence
+            return self._compiled_model().fit_generator(
+                PredictorSequence(
+                    self,
+                    inputs,
+                    outputs,
+                    sample_weight=sample_weight,
+                    batch_size=batch_size,
+                    shuffle=shuffle),
+                epochs=epochs,
+                class_weight=class_weight,
+                validation_data=validation_data,
+                shuffle=shuffle,
+                callbacks=callbacks,
+                verbose=verbose,
+                workers=workers,
+                use_multiprocessing=use_multiprocessing,
+                max_queue_size=max_queue_size)
+        return self._compiled_model().fit(
+            self._prepare_inputs(inputs),
+            self._dense_outputs(self._prepare_outputs(outputs)),
+            batch_size=batch_size,
+            epochs=epochs,
+            sample_weight=self._prepare_sample_weights(sample_weight),
+            class_weight=class_weight,
+            shuffle=shuffle,
+            validation_data=validation_data,
+            callbacks=callbacks,
+            verbose=verbose)
+
+    def predict(self, inputs, batch_size=32):
+        """
+        Returns list with the predictions of each member, in the same form
+        as Predictor.predict.
+        """
+        predictions = self.model.predict(
+            self._prepare_inputs(inputs), batch_size=batch_size)
+        if not isinstance(predictions, list):
+            predictions = [predictions]
+        results = []
+        start = 0
+        for predictor in self.predictors:
+            end = start + predictor.num_outputs
+            member_predictions = predictions[start:end]
+            if predictor.num_outputs == 1:
+                member_predictions = member_predictions[0]
+            results.append(predictor._prepare_outputs(
+                member_predictions, decode=True))
+            start = end
+        return results
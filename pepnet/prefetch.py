@@ -0,0 +1,81 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import sys
+from threading import Thread, Event
+
+from six import reraise
+from six.moves.queue import Queue, Full
+
+_ITEM = "item"
+_DONE = "done"
+_ERROR = "error"
+
+PREFETCH_THREAD_NAME = "pepnet-prefetch"
+
+
+def prefetch(iterable, queue_depth=1):
+    """
+    Consume an iterable on a background thread, keeping up to queue_depth
+    of its elements ready ahead of the caller. Useful for overlapping the
+    encoding of the next batch (mostly NumPy work which releases the GIL)
+    with model evaluation of the current batch.
+
+    Exceptions raised by the iterable are re-raised in the caller's thread.
+    If the caller stops iterating early then the background thread is
+    stopped before this generator is closed.
+    """
+    if queue_depth <= 0:
+        raise ValueError("Invalid queue depth: %s" % (queue_depth,))
+    queue = Queue(maxsize=queue_depth)
+    stop = Event()
+
+    def put(kind, value):
+        # keep checking whether the consumer has gone away so that we
+        # don't block forever on a full queue
+        while not stop.is_set():
+            try:
+                queue.put((kind, value), timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for item in iterable:
+                if not put(_ITEM, item):
+                    return
+            put(_DONE, None)
+        except BaseException:
+            put(_ERROR, sys.exc_info())
+
+    thread = Thread(target=worker, name=PREFETCH_THREAD_NAME)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            kind, value = queue.get()
+            if kind == _DONE:
+                break
+            elif kind == _ERROR:
+                reraise(*value)
+            yield value
+    finally:
+        stop.set()
+        thread.join()
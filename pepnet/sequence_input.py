@@ -10,22 +10,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import numpy as np
 from serializable import Serializable
-import keras.backend as K
-
-from .nn_helpers import (
-    aligned_convolutions,
-    embedding,
-    make_vector_sequence_input,
-    make_index_sequence_input,
-    local_max_pooling,
-    global_max_and_mean_pooling,
-    flatten,
-    recurrent_layers,
-    highway_layers,
-    dense_layers
-)
+from six import string_types
+
 from .encoder import Encoder
+from .encoding_cache import shared_encoding_cache
 
 class SequenceInput(Serializable):
     def __init__(
@@ -36,6 +26,9 @@ class SequenceInput(Serializable):
             mask_zero=None,
             # embedding of symbol indices into vectors
             encoding="onehot",
+            compact_input=False,
+            cache_encodings=False,
+            dynamic_length=False,
             add_start_tokens=False,
             add_stop_tokens=False,
             add_normalized_position=False,
@@ -92,6 +85,28 @@ class SequenceInput(Serializable):
                 - blosum62: rows of BLOSUM62 matrix
                 - pmbec: rows of PMBEC matrix
 
+        compact_input : bool
+            For "onehot", "blosum" and "pmbec" encodings, feed the model
+            an array of token indices and expand them into vectors with a
+            frozen embedding layer inside the model, rather than encoding
+            each residue as a dense vector before calling the model.
+
+        cache_encodings : bool
+            Keep encoded peptides in a memory-bounded LRU cache which is
+            shared by all SequenceInputs with the same encoding settings
+            (see pepnet.encoding_cache).
+
+        dynamic_length : bool
+            Build the model with an unspecified number of time steps, so that
+            batches of short peptides only need to be padded to the longest
+            peptide in the batch (see the bucket_by_length options of
+            Predictor). Requires variable_length, mask_zero for the
+            "embedding" encoding, layers which summarize the sequence (global
+            pooling or an RNN without return_sequences) and no max pooling
+            between convolutional layers. For the other encodings, time steps
+            whose vectors are all zero (padding, along with the start, stop
+            and gap tokens of BLOSUM and PMBEC encodings) are masked.
+
         add_start_tokens : bool
             Add "^" token to start of each sequence
 
@@ -188,6 +203,8 @@ class SequenceInput(Serializable):
         if encoding not in {"embedding", "onehot", "blosum", "pmbec"}:
             raise ValueError("Invalid encoding: %s" % encoding)
         self.encoding = encoding
+        self.compact_input = compact_input
+        self.cache_encodings = cache_encodings
         self.add_start_tokens = add_start_tokens
         self.add_stop_tokens = add_stop_tokens
         self.variable_length = variable_length
@@ -210,12 +227,19 @@ class SequenceInput(Serializable):
             int(add_normalized_centrality))
         if self.encoding == "embedding":
             self.n_input_dims = None
-            assert self.extra_input_dims is None
+            if self.extra_input_dims:
+                raise ValueError(
+                    "Positional features not supported for embedding encoding")
         elif self.encoding == "onehot":
             self.n_input_dims = self.n_symbols + self.extra_input_dims
         else:
             self.n_input_dims = 20 + self.extra_input_dims
 
+        if self.compact_input and self.encoding != "embedding":
+            if self.extra_input_dims:
+                raise ValueError(
+                    "Positional features not supported with compact_input")
+
         if mask_zero is None:
             mask_zero = variable_length
 
@@ -254,18 +278,92 @@ class SequenceInput(Serializable):
         self.highway_dropout = highway_dropout
         self.highway_activation = highway_activation
 
+        self.dynamic_length = dynamic_length
+        if dynamic_length:
+            if not variable_length:
+                raise ValueError("dynamic_length requires variable_length")
+            if not self._summarizes_sequence:
+                raise ValueError(
+                    "dynamic_length requires global pooling or an RNN which "
+                    "doesn't return sequences")
+            if self.encoding == "embedding" and not mask_zero:
+                raise ValueError("dynamic_length requires mask_zero")
+            if self._has_local_pooling:
+                raise ValueError(
+                    "dynamic_length doesn't support max pooling between "
+                    "convolutional layers")
+
+    @property
+    def _summarizes_sequence(self):
+        """
+        Is the sequence reduced to a fixed size vector before any layers
+        which need to know its length?
+        """
+        if self.global_pooling:
+            return True
+        if isinstance(self.rnn_layer_sizes, int):
+            has_rnn = self.rnn_layer_sizes > 0
+        else:
+            has_rnn = len(self.rnn_layer_sizes) > 0
+        return has_rnn and not self.return_sequences
+
+    @property
+    def _has_local_pooling(self):
+        """
+        Is max pooling applied between convolutional layers?
+        """
+        if isinstance(self.conv_filter_sizes, dict):
+            conv_filter_sizes = [self.conv_filter_sizes]
+        else:
+            conv_filter_sizes = self.conv_filter_sizes
+        conv_layers = [
+            d for d in conv_filter_sizes
+            if any(not isinstance(k, string_types) for k in d)
+        ]
+        if self.repeat_conv_layers * len(conv_layers) < 2:
+            return False
+        return any(
+            d.get("pool_size", self.pool_size) > 1 or
+            d.get("pool_stride", self.pool_stride) > 1
+            for d in conv_layers)
+
+    @property
+    def index_input(self):
+        """
+        Does the model take token indices (rather than vectors) as input?
+        """
+        return self.encoding == "embedding" or self.compact_input
+
     def _build_input(self):
-        if self.encoding == "embedding":
-            return make_index_sequence_input(
-                name=self.name, length=self.padded_length)
+        from .nn_helpers import (
+            make_index_sequence_input, make_vector_sequence_input)
+
+        length = None if self.dynamic_length else self.padded_length
+        if self.index_input:
+            return make_index_sequence_input(name=self.name, length=length)
         else:
             return make_vector_sequence_input(
                 name=self.name,
-                length=self.padded_length,
+                length=length,
                 n_dims=self.n_input_dims)
 
 
     def _build_embedding(self, input_object):
+        from .nn_helpers import mask_zero_vectors, zero_masked_steps
+
+        value = self._build_unmasked_embedding(input_object)
+        if self.dynamic_length:
+            # padding has to be masked (and zero) so that layers after the
+            # embedding give the same results as when it's trimmed off
+            if self.encoding == "embedding":
+                value = zero_masked_steps(value)
+            else:
+                value = mask_zero_vectors(value)
+        return value
+
+    def _build_unmasked_embedding(self, input_object):
+        from .nn_helpers import embedding
+
         if self.encoding == "embedding":
             if self.embedding_dim <= 0:
                 raise ValueError(
@@ -276,10 +374,25 @@ class SequenceInput(Serializable):
                 output_dim=self.embedding_dim,
                 mask_zero=self.mask_zero,
                 dropout=self.embedding_dropout)
+        elif self.compact_input:
+            # positions past the end of a peptide get an extra all-zero
+            # row, same as when the encoding happens outside the model
+            table = self.encoder.feature_table(self.encoding)
+            table = np.vstack([table, np.zeros_like(table[:1])])
+            return embedding(
+                input_object,
+                n_symbols=len(table),
+                output_dim=self.n_input_dims,
+                initial_weights=table,
+                mask_zero=False,
+                trainable=False)
         else:
             return input_object
 
     def _build_conv(self, value):
+        from .nn_helpers import (
+            aligned_convolutions, local_max_pooling, zero_masked_steps)
+
         if self.conv_filter_sizes:
             if isinstance(self.conv_filter_sizes, dict):
                 # if only one dictionary is given, then treat it as a single
@@ -325,6 +438,8 @@ class SequenceInput(Serializable):
                         batch_normalization=batch_normalization,
                         activation=activation,
                         weight_source=conv_weight_source)
+                    if self.dynamic_length:
+                        value = zero_masked_steps(value)
 
                     conv_layer_index += 1
 
@@ -337,6 +452,8 @@ class SequenceInput(Serializable):
         return value
 
     def _build_rnn(self, value):
+        from .nn_helpers import recurrent_layers
+
         if isinstance(self.rnn_layer_sizes, int):
             rnn_layer_sizes = [self.rnn_layer_sizes]
         else:
@@ -352,14 +469,21 @@ class SequenceInput(Serializable):
         return value
 
     def _build_global_pooling(self, value):
+        from .nn_helpers import global_max_and_mean_pooling
+
         if self.global_pooling:
             value = global_max_and_mean_pooling(
                 value,
                 batch_normalization=self.global_pooling_batch_normalization,
-                dropout=self.global_pooling_dropout)
+                dropout=self.global_pooling_dropout,
+                # padding mustn't affect the max of trimmed sequences
+                exclude_masked=self.dynamic_length)
         return value
 
     def _build_dense(self, value):
+        import keras.backend as K
+        from .nn_helpers import flatten, dense_layers
+
         if K.ndim(value) > 2 and not self.return_sequences:
             value = flatten(value, drop_mask=self.mask_zero)
 
@@ -372,6 +496,9 @@ class SequenceInput(Serializable):
         return value
 
     def _build_highway(self, value):
+        import keras.backend as K
+        from .nn_helpers import flatten, highway_layers
+
         if K.ndim(value) > 2 and not self.return_sequences:
             value = flatten(value, drop_mask=self.mask_zero)
         if self.n_highway_layers:
@@ -393,16 +520,85 @@ class SequenceInput(Serializable):
         value = self._build_highway(value)
         return input_object, value
 
-    def encode(self, peptides):
+    @property
+    def encoding_config_key(self):
+        """
+        Everything besides a peptide's sequence which determines how
+        it's encoded by this input.
+        """
+        return (
+            self.encoding,
+            self.compact_input,
+            self.length,
+            self.variable_length,
+            self.add_start_tokens,
+            self.add_stop_tokens,
+            self.add_normalized_position,
+            self.add_normalized_centrality,
+            tuple(self.encoder.tokens),
+        )
+
+    def encode(self, peptides, out=None, length=None):
+        """
+        Encode a list of peptide strings or a PeptideBatch using this
+        input's encoding.
+
+        Parameters
+        ----------
+        peptides : list of str or PeptideBatch
+
+        out : np.ndarray, optional
+            Array to write the encoded peptides into. Index encodings are
+            converted to the type of this array.
+
+        length : int, optional
+            Pad peptides to this length instead of self.length, which only
+            makes sense for inputs with dynamic_length.
+        """
+        if length is None:
+            length = self.length
+        elif length > self.length:
+            raise ValueError(
+                "Can't pad peptides to %d, longer than input length %d" % (
+                    length, self.length))
+        if self.cache_encodings:
+            config_key = self.encoding_config_key
+            if length != self.length:
+                config_key += (length,)
+            result = shared_encoding_cache().encode(
+                config_key,
+                peptides,
+                lambda x: self._encode_uncached(x, length=length))
+            if out is None:
+                return result
+            out[...] = result
+            return out
+        return self._encode_uncached(peptides, out=out, length=length)
+
+    def _encode_uncached(self, peptides, out=None, length=None):
+        if length is None:
+            length = self.length
+        index_dtype = "uint8" if out is None else out.dtype
         if self.encoding == "embedding":
-            fn = self.encoder.encode_index_array
+            return self.encoder.encode_index_array(
+                peptides,
+                max_peptide_length=length,
+                dtype=index_dtype,
+                out=out)
+        elif self.compact_input:
+            return self.encoder.encode_index_array(
+                peptides,
+                max_peptide_length=length,
+                dtype=index_dtype,
+                padding_index=self.n_symbols,
+                out=out)
         elif self.encoding == "onehot":
             fn = self.encoder.encode_onehot
         elif self.encoding == "pmbec":
             fn = self.encoder.encode_pmbec
         elif self.encoding == "blosum":
             fn = self.encoder.encode_blosum
-        return fn(peptides, max_peptide_length=self.length)
+        return fn(peptides, max_peptide_length=length, out=out)
 
     @classmethod
     def from_dict(cls, config_dict):
@@ -0,0 +1,389 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Training data (inputs, outputs and sample weights) split into fixed-size
+shards on disk, which can be streamed in shuffled batches while only holding
+a bounded number of samples in memory.
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+from collections import OrderedDict
+import os
+
+import numpy as np
+from six import string_types
+import ujson
+
+from .peptide_batch import PeptideBatch
+
+MANIFEST_FILENAME = "manifest.json"
+SHARD_FILENAME_FORMAT = "shard-%05d.npz"
+
+# default number of samples held in memory for shuffling across shards
+DEFAULT_SHUFFLE_BUFFER_SIZE = 100000
+
+_FIELDS = ["inputs", "outputs", "sample_weight"]
+
+
+def _is_peptides(values):
+    if isinstance(values, PeptideBatch):
+        return True
+    if isinstance(values, np.ndarray) and values.dtype.kind != "O":
+        return values.dtype.kind in "SU"
+    return len(values) > 0 and isinstance(values[0], string_types)
+
+
+def _to_column(values):
+    """
+    Returns either a PeptideBatch (for collections of peptides) or an array.
+    """
+    if _is_peptides(values):
+        if isinstance(values, np.ndarray):
+            return PeptideBatch.from_array(values)
+        return PeptideBatch.from_list(values)
+    return np.asarray(values)
+
+
+def _field_spec(values):
+    if values is None:
+        return None
+    if isinstance(values, dict):
+        return {
+            "is_dict": True,
+            "names": sorted(values.keys()),
+        }
+    return {"is_dict": False, "names": [""]}
+
+
+def _flatten(field, values):
+    """
+    Returns dictionary of column key -> PeptideBatch or array for the
+    inputs, outputs or sample weights of a dataset.
+    """
+    if values is None:
+        return OrderedDict()
+    if not isinstance(values, dict):
+        values = {"": values}
+    return OrderedDict(
+        ("%s:%s" % (field, name), _to_column(values[name]))
+        for name in sorted(values.keys()))
+
+
+def _unflatten(field, spec, columns):
+    if spec is None:
+        return None
+    values = {
+        name: columns["%s:%s" % (field, name)]
+        for name in spec["names"]
+    }
+    if spec["is_dict"]:
+        return values
+    return values[""]
+
+
+def _take(columns, indices):
+    return OrderedDict(
+        (key, column[indices]) for (key, column) in columns.items())
+
+
+def _concatenate(column_dicts):
+    result = OrderedDict()
+    for key, column in column_dicts[0].items():
+        if isinstance(column, PeptideBatch):
+            result[key] = PeptideBatch.concatenate(
+                [c[key] for c in column_dicts])
+        else:
+            result[key] = np.concatenate([c[key] for c in column_dicts])
+    return result
+
+
+def _num_rows(columns):
+    return len(list(columns.values())[0])
+
+
+def _save_shard(path, columns):
+    arrays = {}
+    for key, column in columns.items():
+        if isinstance(column, PeptideBatch):
+            column = column.compact()
+            arrays[key + ":residues"] = column.residues
+            arrays[key + ":lengths"] = column.lengths
+        else:
+            arrays[key] = column
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def _load_shard(path, keys):
+    columns = OrderedDict()
+    with np.load(path) as data:
+        for key in keys:
+            if key in data:
+                columns[key] = data[key]
+            else:
+                lengths = data[key + ":lengths"]
+                starts = np.zeros_like(lengths)
+                np.cumsum(lengths[:-1], out=starts[1:])
+                columns[key] = PeptideBatch(
+                    data[key + ":residues"], starts, lengths)
+    return columns
+
+
+class ShardedDatasetWriter(object):
+    """
+    Write training data to a ShardedDataset directory in pieces, so that
+    the whole dataset never has to be held in memory. Samples are written
+    as shards of shard_size samples; the manifest is only written by close(),
+    so an interrupted write doesn't leave behind a dataset which looks
+    complete.
+    """
+    def __init__(self, directory, shard_size=100000):
+        if shard_size <= 0:
+            raise ValueError("Invalid shard size: %s" % (shard_size,))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.spec = None
+        self.shard_sizes = []
+        self._pending = []
+        self._n_pending = 0
+
+    def append(self, inputs, outputs, sample_weight=None):
+        """
+        Add samples to the dataset. Every call must use the same input and
+        output names (and either always or never give sample weights).
+        Missing target values can be given as NaN, for use with masked
+        losses such as masked_mse.
+        """
+        spec = {
+            field: _field_spec(values)
+            for (field, values) in zip(
+                _FIELDS, [inputs, outputs, sample_weight])
+        }
+        if spec["inputs"] is None or spec["outputs"] is None:
+            raise ValueError("Expected inputs and outputs")
+        if self.spec is None:
+            self.spec = spec
+        elif spec != self.spec:
+            raise ValueError(
+                "Expected samples with fields %s but got %s" % (
+                    self.spec, spec))
+        columns = OrderedDict()
+        for field, values in zip(_FIELDS, [inputs, outputs, sample_weight]):
+            columns.update(_flatten(field, values))
+        lengths = {key: len(column) for (key, column) in columns.items()}
+        if len(set(lengths.values())) != 1:
+            raise ValueError(
+                "All inputs, outputs and weights must be of the same length, "
+                "given %s" % (lengths,))
+        self._pending.append(columns)
+        self._n_pending += _num_rows(columns)
+        while self._n_pending >= self.shard_size:
+            self._write_shard(self.shard_size)
+
+    def _write_shard(self, n_rows):
+        columns = _concatenate(self._pending)
+        self._pending = []
+        self._n_pending = 0
+        n_total = _num_rows(columns)
+        filename = SHARD_FILENAME_FORMAT % len(self.shard_sizes)
+        _save_shard(
+            os.path.join(self.directory, filename),
+            _take(columns, slice(0, n_rows)))
+        self.shard_sizes.append(n_rows)
+        if n_total > n_rows:
+            self._pending.append(_take(columns, slice(n_rows, n_total)))
+            self._n_pending = n_total - n_rows
+
+    def close(self):
+        """
+        Write any remaining samples as a final (smaller) shard followed by
+        the manifest, and return the finished ShardedDataset.
+        """
+        if self.spec is None:
+            raise ValueError("Can't create dataset without any samples")
+        if self._n_pending > 0:
+            self._write_shard(self._n_pending)
+        manifest = {
+            "spec": self.spec,
+            "shard_sizes": self.shard_sizes,
+            "n_samples": sum(self.shard_sizes),
+        }
+        with open(os.path.join(self.directory, MANIFEST_FILENAME), "w") as f:
+            f.write(ujson.dumps(manifest))
+        return ShardedDataset(self.directory, manifest)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class ShardedDataset(object):
+    """
+    Directory of training data shards along with a manifest describing
+    them. Pass a ShardedDataset as the inputs of Predictor.fit to train on
+    batches streamed from disk.
+    """
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+
+    @property
+    def spec(self):
+        return self.manifest["spec"]
+
+    @property
+    def shard_sizes(self):
+        return self.manifest["shard_sizes"]
+
+    @property
+    def n_shards(self):
+        return len(self.shard_sizes)
+
+    @property
+    def has_sample_weight(self):
+        return self.spec["sample_weight"] is not None
+
+    def __len__(self):
+        return self.manifest["n_samples"]
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, MANIFEST_FILENAME))
+
+    @classmethod
+    def open(cls, directory):
+        with open(os.path.join(directory, MANIFEST_FILENAME), "r") as f:
+            manifest = ujson.loads(f.read())
+        return cls(directory, manifest)
+
+    @classmethod
+    def create(
+            cls,
+            directory,
+            inputs,
+            outputs,
+            sample_weight=None,
+            shard_size=100000):
+        """
+        Write inputs, outputs and (optionally) sample weights to a new
+        dataset in the given directory. Inputs and outputs can be single
+        collections or dictionaries keyed by input/output name, in the same
+        form they would be given to Predictor.fit.
+        """
+        writer = ShardedDatasetWriter(directory, shard_size=shard_size)
+        writer.append(inputs, outputs, sample_weight=sample_weight)
+        return writer.close()
+
+    def _column_keys(self):
+        return [
+            "%s:%s" % (field, name)
+            for field in _FIELDS
+            if self.spec[field] is not None
+            for name in self.spec[field]["names"]
+        ]
+
+    def _load_columns(self, shard_index):
+        return _load_shard(
+            os.path.join(
+                self.directory, SHARD_FILENAME_FORMAT % shard_index),
+            self._column_keys())
+
+    def _to_tuple(self, columns):
+        return tuple(
+            _unflatten(field, self.spec[field], columns)
+            for field in _FIELDS)
+
+    def read_shard(self, shard_index):
+        """
+        Returns (inputs, outputs, sample_weight) of a single shard.
+        """
+        return self._to_tuple(self._load_columns(shard_index))
+
+    def n_batches(self, batch_size):
+        """
+        Number of batches in each epoch of iter_batches.
+        """
+        return (len(self) + batch_size - 1) // batch_size
+
+    def iter_batches(
+            self,
+            batch_size=32,
+            shuffle=True,
+            shuffle_buffer_size=DEFAULT_SHUFFLE_BUFFER_SIZE):
+        """
+        Generate (inputs, outputs, sample_weight) batches covering every
+        sample once.
+
+        When shuffle is True the shards are read in random order and their
+        samples are mixed into a buffer of at least shuffle_buffer_size
+        samples, from which batches are drawn at random. At most
+        shuffle_buffer_size plus one shard of samples are in memory at once.
+        """
+        if batch_size <= 0:
+            raise ValueError("Invalid batch size: %s" % (batch_size,))
+        if shuffle:
+            shard_order = np.random.permutation(self.n_shards)
+        else:
+            shard_order = np.arange(self.n_shards)
+        buffer = None
+        for shard_index in shard_order:
+            columns = self._load_columns(shard_index)
+            if buffer is None:
+                buffer = columns
+            else:
+                buffer = _concatenate([buffer, columns])
+            n_rows = _num_rows(buffer)
+            if shuffle:
+                buffer = _take(buffer, np.random.permutation(n_rows))
+                # keep shuffle_buffer_size samples to mix with later shards,
+                # only emitting complete batches before the last shard
+                n_emit = max(0, n_rows - shuffle_buffer_size)
+                n_emit -= n_emit % batch_size
+            else:
+                n_emit = n_rows - n_rows % batch_size
+            for start in range(0, n_emit, batch_size):
+                yield self._to_tuple(
+                    _take(buffer, slice(start, start + batch_size)))
+            if n_emit > 0:
+                buffer = _take(buffer, slice(n_emit, n_rows))
+        if buffer is not None:
+            n_rows = _num_rows(buffer)
+            for start in range(0, n_rows, batch_size):
+                yield self._to_tuple(
+                    _take(buffer, slice(start, start + batch_size)))
+
+    def batch_generator(
+            self,
+            batch_size=32,
+            shuffle=True,
+            shuffle_buffer_size=DEFAULT_SHUFFLE_BUFFER_SIZE):
+        """
+        Endlessly repeat iter_batches, for use with fit_generator along with
+        steps_per_epoch=n_batches(batch_size).
+        """
+        while True:
+            for batch in self.iter_batches(
+                    batch_size=batch_size,
+                    shuffle=shuffle,
+                    shuffle_buffer_size=shuffle_buffer_size):
+                yield batch
@@ -0,0 +1,217 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import numpy as np
+
+
+class SparseLabels(object):
+    """
+    Labels of n_samples samples for n_columns targets (e.g. affinities of
+    peptides for each of many alleles) where only the observed labels are
+    stored, sorted by sample as in a CSR matrix. Every label which isn't
+    stored is missing and becomes NaN when densified, so that it's ignored
+    by the masked losses used for Outputs.
+
+    Selecting samples (e.g. labels[indices]) returns another SparseLabels,
+    so batches only need to be densified right before they're used.
+    """
+    def __init__(self, indptr, columns, values, n_columns):
+        """
+        Parameters
+        ----------
+        indptr : np.ndarray
+            Array of n_samples + 1 offsets, the labels of sample i are at
+            positions indptr[i]:indptr[i + 1] of columns and values.
+
+        columns : np.ndarray
+            Target column of each observed label
+
+        values : np.ndarray
+            Value of each observed label
+
+        n_columns : int
+        """
+        indptr = np.asarray(indptr, dtype="int64")
+        columns = np.asarray(columns, dtype="int64")
+        values = np.asarray(values)
+        if indptr.ndim != 1 or len(indptr) == 0 or indptr[0] != 0:
+            raise ValueError("Invalid indptr array")
+        if columns.shape != values.shape or columns.ndim != 1:
+            raise ValueError(
+                "Mismatched shapes for columns %s and values %s" % (
+                    columns.shape, values.shape))
+        if indptr[-1] != len(values) or (np.diff(indptr) < 0).any():
+            raise ValueError("Invalid indptr array")
+        if len(columns) > 0 and (
+                columns.min() < 0 or columns.max() >= n_columns):
+            raise ValueError(
+                "Column indices out of range for %d columns" % (n_columns,))
+        self.indptr = indptr
+        self.columns = columns
+        self.values = values
+        self.n_columns = n_columns
+
+    @classmethod
+    def from_coo(cls, rows, columns, values, shape):
+        """
+        Create from (row, column, value) triples of observed labels.
+        """
+        n_samples, n_columns = shape
+        rows = np.asarray(rows, dtype="int64")
+        columns = np.asarray(columns, dtype="int64")
+        values = np.asarray(values)
+        if rows.shape != columns.shape:
+            raise ValueError(
+                "Mismatched shapes for rows %s and columns %s" % (
+                    rows.shape, columns.shape))
+        if len(rows) > 0 and (rows.min() < 0 or rows.max() >= n_samples):
+            raise ValueError(
+                "Row indices out of range for %d samples" % (n_samples,))
+        order = np.lexsort((columns, rows))
+        indptr = np.zeros(n_samples + 1, dtype="int64")
+        np.cumsum(np.bincount(rows, minlength=n_samples), out=indptr[1:])
+        return cls(indptr, columns[order], values[order], n_columns)
+
+    @classmethod
+    def from_scipy(cls, matrix):
+        """
+        Create from a SciPy sparse matrix, whose explicitly stored entries
+        (including zeros) are the observed labels.
+        """
+        coo = matrix.tocoo()
+        return cls.from_coo(coo.row, coo.col, coo.data, coo.shape)
+
+    @classmethod
+    def from_dense(cls, array):
+        """
+        Create from an array with NaN for every missing label.
+        """
+        array = np.asarray(array)
+        if array.ndim == 1:
+            array = array[:, np.newaxis]
+        rows, columns = np.nonzero(~np.isnan(array))
+        return cls.from_coo(
+            rows, columns, array[rows, columns], array.shape)
+
+    @classmethod
+    def from_columns(cls, n_samples, columns):
+        """
+        Create from a list containing (sample_indices, values) for the
+        observed labels of each column.
+        """
+        rows = []
+        column_indices = []
+        values = []
+        for j, (indices, column_values) in enumerate(columns):
+            indices = np.asarray(indices, dtype="int64")
+            rows.append(indices)
+            column_indices.append(np.full(len(indices), j, dtype="int64"))
+            values.append(np.asarray(column_values))
+        if len(columns) == 0:
+            return cls.from_coo([], [], [], (n_samples, 0))
+        return cls.from_coo(
+            np.concatenate(rows),
+            np.concatenate(column_indices),
+            np.concatenate(values),
+            (n_samples, len(columns)))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def shape(self):
+        return (len(self), self.n_columns)
+
+    @property
+    def n_observed(self):
+        return len(self.values)
+
+    @property
+    def rows(self):
+        """
+        Sample index of each observed label.
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    def observed_per_sample(self):
+        return np.diff(self.indptr)
+
+    def __repr__(self):
+        return "SparseLabels(n_samples=%d, n_columns=%d, n_observed=%d)" % (
+            len(self), self.n_columns, self.n_observed)
+
+    def take(self, indices):
+        """
+        Returns labels of the samples at the given indices.
+        """
+        indices = np.asarray(indices, dtype="int64")
+        starts = self.indptr[indices]
+        counts = self.indptr[indices + 1] - starts
+        indptr = np.zeros(len(indices) + 1, dtype="int64")
+        np.cumsum(counts, out=indptr[1:])
+        source = np.repeat(starts - indptr[:-1], counts) + np.arange(
+            indptr[-1])
+        return SparseLabels(
+            indptr, self.columns[source], self.values[source], self.n_columns)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step != 1:
+                return self.take(np.arange(start, stop, step))
+            # contiguous samples share a contiguous range of labels
+            stop = max(start, stop)
+            begin, end = self.indptr[start], self.indptr[stop]
+            return SparseLabels(
+                self.indptr[start:stop + 1] - begin,
+                self.columns[begin:end],
+                self.values[begin:end],
+                self.n_columns)
+        idx = np.asarray(idx)
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        elif idx.ndim == 0:
+            raise TypeError(
+                "SparseLabels can only be indexed by a slice or array")
+        return self.take(idx)
+
+    def column(self, j):
+        """
+        Returns labels of the jth column as a single column SparseLabels.
+        """
+        mask = self.columns == j
+        return SparseLabels.from_coo(
+            self.rows[mask],
+            np.zeros(mask.sum(), dtype="int64"),
+            self.values[mask],
+            (len(self), 1))
+
+    def with_values(self, values):
+        """
+        Returns labels with the same samples and columns but new values
+        (e.g. after transforming them).
+        """
+        return SparseLabels(self.indptr, self.columns, values, self.n_columns)
+
+    def to_dense(self, dtype="float32"):
+        """
+        Returns (n_samples, n_columns) array with NaN for missing labels.
+        """
+        result = np.full(self.shape, np.nan, dtype=dtype)
+        result[self.rows, self.columns] = self.values
+        return result
@@ -12,9 +12,9 @@
 
 import numpy
 
-from ..amino_acids import amino_acids_dict
-
-AMINO_ACIDS = list(amino_acids_dict)
+# letters of the 20 canonical amino acids, kept here rather than taken from
+# pepdata so that generating synthetic data doesn't import scikit-learn
+AMINO_ACIDS = list("ACDEFGHIKLMNPQRSTVWY")
 
 
 def random_peptides(num, length=9):
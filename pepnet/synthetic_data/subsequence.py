@@ -13,10 +13,7 @@
 import numpy
 import pandas
 
-from ..amino_acids import amino_acids_dict
-from .random_peptides import random_peptides
-
-AMINO_ACIDS = list(amino_acids_dict)
+from .random_peptides import random_peptides, AMINO_ACIDS
 
 
 def synthetic_peptides_by_subsequence(
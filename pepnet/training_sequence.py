@@ -0,0 +1,102 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Keras Sequence which encodes batches of raw training data on demand, so that
+Keras can prepare upcoming batches on worker threads or processes while the
+model trains on the current one.
+
+Importing this module imports Keras.
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import numpy as np
+from keras.utils import Sequence
+
+
+class PredictorSequence(Sequence):
+    """
+    Batches of (inputs, outputs[, sample_weights]) for training a Predictor,
+    where inputs are only encoded (and SparseLabels outputs only densified)
+    when a batch is requested. Outputs and sample weights are prepared once
+    up front. When shuffle is True the order of samples is permuted at the
+    end of every epoch, without encoding anything ahead of time.
+
+    Parameters
+    ----------
+    predictor : Predictor
+
+    inputs : list, array, PeptideBatch, EncodedArray or dict
+        Raw inputs, in any form accepted by Predictor.fit
+
+    outputs : list, array, SparseLabels or dict
+
+    sample_weight : array or dict, optional
+
+    batch_size : int
+
+    shuffle : bool
+    """
+    def __init__(
+            self,
+            predictor,
+            inputs,
+            outputs,
+            sample_weight=None,
+            batch_size=32,
+            shuffle=True):
+        if batch_size <= 0:
+            raise ValueError("Invalid batch size: %s" % (batch_size,))
+        self.predictor = predictor
+        self.inputs = predictor._input_dict(inputs)
+        self.outputs = predictor._prepare_outputs(outputs, encode=True)
+        self.sample_weight = predictor._prepare_sample_weights(sample_weight)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.n_samples = predictor._num_samples(self.inputs)
+        self.order = np.arange(self.n_samples)
+        if shuffle:
+            np.random.shuffle(self.order)
+
+    def __len__(self):
+        return (self.n_samples + self.batch_size - 1) // self.batch_size
+
+    def batch_indices(self, idx):
+        """
+        Indices of the samples in a batch, sorted so that memory-mapped
+        arrays are read in order.
+        """
+        if idx < 0 or idx >= len(self):
+            raise IndexError("Batch index %d out of range" % (idx,))
+        start = idx * self.batch_size
+        return np.sort(self.order[start:start + self.batch_size])
+
+    def __getitem__(self, idx):
+        indices = self.batch_indices(idx)
+        predictor = self.predictor
+        inputs = predictor._prepare_inputs(
+            predictor._take_samples(self.inputs, indices))
+        outputs = predictor._dense_outputs(
+            predictor._take_samples(self.outputs, indices))
+        if self.sample_weight is None:
+            return inputs, outputs
+        return inputs, outputs, predictor._take_samples(
+            self.sample_weight, indices)
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.order)
@@ -0,0 +1,105 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Binary format for model weights: every array is written contiguously into a
+single file, and a table of (offset, shape, dtype) entries which is stored
+alongside the architecture describes where to find each one.
+"""
+
+from __future__ import (
+    print_function,
+    division,
+    absolute_import,
+)
+
+import os
+
+import numpy as np
+
+# start every array on a 64 byte boundary so that memory mapped weights
+# are aligned for vectorized arithmetic
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_weights_file(filename, weights):
+    """
+    Write arrays into a binary file and return the table of entries needed
+    to read them back.
+
+    Parameters
+    ----------
+    filename : str
+
+    weights : list of np.ndarray
+
+    Returns list of dictionaries with keys "offset", "shape" and "dtype".
+    """
+    table = []
+    offset = 0
+    with open(filename, "wb") as f:
+        for w in weights:
+            w = np.asarray(w, order="C")
+            # always store little-endian so that files are portable
+            dtype = w.dtype.newbyteorder("<")
+            w = w.astype(dtype, copy=False)
+            aligned_offset = _aligned(offset)
+            f.write(b"\0" * (aligned_offset - offset))
+            f.write(w.tobytes())
+            table.append({
+                "offset": aligned_offset,
+                "shape": list(w.shape),
+                "dtype": dtype.str,
+            })
+            offset = aligned_offset + w.nbytes
+    return table
+
+
+def read_weights_file(filename, table, mmap_mode=None):
+    """
+    Read arrays written by write_weights_file.
+
+    Parameters
+    ----------
+    filename : str
+
+    table : list of dict
+        Entries returned by write_weights_file
+
+    mmap_mode : str, optional
+        If given (e.g. "r") then the returned arrays are views into a memory
+        map of the file instead of being read into memory.
+    """
+    if mmap_mode:
+        if os.path.getsize(filename) == 0:
+            buffer = np.zeros(0, dtype="uint8")
+        else:
+            buffer = np.memmap(filename, dtype="uint8", mode=mmap_mode)
+    else:
+        buffer = np.fromfile(filename, dtype="uint8")
+    weights = []
+    for entry in table:
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        n_bytes = int(np.prod(shape)) * dtype.itemsize
+        offset = entry["offset"]
+        if offset + n_bytes > len(buffer):
+            raise ValueError(
+                "Weights file '%s' is too short for array at offset %d" % (
+                    filename, offset))
+        weights.append(
+            buffer[offset:offset + n_bytes].view(dtype).reshape(shape))
+    return weights
@@ -0,0 +1,16 @@
+from pepnet import Predictor, SequenceInput, Output
+
+def make_conv_predictor(n_filters=4, encoding="onehot", output_name="y"):
+    """
+    Small convolutional Predictor of peptides up to length 8 with a single
+    sigmoid output, used by tests of ensembles and groups of predictors.
+    """
+    return Predictor(
+        inputs=[SequenceInput(
+            name="peptide",
+            length=8,
+            variable_length=True,
+            encoding=encoding,
+            conv_filter_sizes={3: n_filters},
+            global_pooling=True)],
+        outputs=[Output(name=output_name, dim=1, activation="sigmoid")])
@@ -0,0 +1,68 @@
+import shutil
+import tempfile
+
+from pepnet.encoder import Encoder
+from pepnet.dataset_store import EncodedDatasetStore
+from pepnet.sequence_input import SequenceInput
+from nose.tools import eq_, assert_raises
+import numpy as np
+
+def test_dataset_store_create_and_open():
+    directory = tempfile.mkdtemp()
+    try:
+        encoder = Encoder()
+        peptides = ["SIINFEKL", "AAA", "QQQQ", "AL"]
+        store = EncodedDatasetStore.create(
+            directory, encoder, peptides,
+            encoding="onehot", max_peptide_length=9, chunk_size=3)
+        expected = encoder.encode_onehot(peptides, max_peptide_length=9)
+        assert (store.array == expected).all()
+        reopened = EncodedDatasetStore.open(
+            directory, encoder, peptides=peptides,
+            encoding="onehot", max_peptide_length=9)
+        eq_(len(reopened), 4)
+        assert isinstance(reopened.array, np.memmap)
+        assert (reopened.encoded[1:3].array == expected[1:3]).all()
+    finally:
+        shutil.rmtree(directory)
+
+def test_dataset_store_stale_config():
+    directory = tempfile.mkdtemp()
+    try:
+        peptides = ["SIINFEKL", "AAA"]
+        EncodedDatasetStore.create(
+            directory, Encoder(), peptides,
+            encoding="index", max_peptide_length=9)
+        with assert_raises(ValueError):
+            EncodedDatasetStore.open(
+                directory, Encoder(), encoding="index", max_peptide_length=10)
+        with assert_raises(ValueError):
+            EncodedDatasetStore.open(
+                directory, Encoder(add_start_tokens=True),
+                encoding="index", max_peptide_length=9)
+        with assert_raises(ValueError):
+            EncodedDatasetStore.open(
+                directory, Encoder(), peptides=["SIINFEKL", "AAC"],
+                encoding="index", max_peptide_length=9)
+    finally:
+        shutil.rmtree(directory)
+
+def test_dataset_store_encoder_matches_sequence_input():
+    directory = tempfile.mkdtemp()
+    try:
+        peptides = ["SIINFEKL", "AAA", "QQQQ", "AL"]
+        EncodedDatasetStore.create(
+            directory, Encoder(), peptides,
+            encoding="onehot", max_peptide_length=9)
+        seq_input = SequenceInput(
+            length=9, variable_length=True, encoding="onehot")
+        store = EncodedDatasetStore.open(
+            directory, seq_input, peptides=peptides)
+        store.encoded.check_compatible(seq_input)
+        assert (store.array == seq_input.encode(peptides)).all()
+        with assert_raises(ValueError):
+            store.encoded.check_compatible(SequenceInput(
+                length=9, variable_length=True, encoding="onehot",
+                compact_input=True))
+    finally:
+        shutil.rmtree(directory)
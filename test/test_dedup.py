@@ -0,0 +1,38 @@
+from pepnet.encoder import Encoder
+from pepnet.peptide_batch import PeptideBatch
+from pepnet.dedup import find_unique_samples, DedupCounter
+from nose.tools import eq_
+import numpy as np
+
+peptides = ["SIINFEKL", "AAA", "SIINFEKL", "QYL", "AAA", "AAA"]
+
+def test_find_unique_samples():
+    unique_indices, inverse = find_unique_samples([peptides])
+    eq_(len(unique_indices), 3)
+    eq_([peptides[unique_indices[i]] for i in inverse], peptides)
+
+def test_find_unique_samples_multiple_columns():
+    alleles = np.array([0, 0, 1, 0, 0, 0])
+    unique_indices, inverse = find_unique_samples([peptides, alleles])
+    eq_(len(unique_indices), 4)
+
+def test_find_unique_samples_peptide_batch():
+    unique_indices, inverse = find_unique_samples(
+        [PeptideBatch.from_list(peptides)])
+    eq_(len(unique_indices), 3)
+
+def test_encode_deduplicated_same_as_encode():
+    encoder = Encoder()
+    for encoding, method in [
+            ("index", encoder.encode_index_array),
+            ("onehot", encoder.encode_onehot),
+            ("blosum", encoder.encode_blosum)]:
+        X = encoder.encode_deduplicated(
+            peptides, encoding=encoding, max_peptide_length=9)
+        assert (X == method(peptides, max_peptide_length=9)).all(), encoding
+    eq_(encoder.dedup_counter.n_samples, 3 * len(peptides))
+    eq_(encoder.dedup_counter.n_unique, 9)
+    eq_(encoder.dedup_counter.ratio, 2.0)
+
+def test_dedup_counter_empty():
+    eq_(DedupCounter().ratio, 1.0)
@@ -1,5 +1,5 @@
 from pepnet.encoder import Encoder
-from nose.tools import eq_
+from nose.tools import eq_, assert_raises
 import numpy as np
 
 def test_encoder_index_lists():
@@ -41,6 +41,21 @@ def test_encoder_index_array():
     ])
     assert (X == expected).all()
 
+def test_encoder_index_array_with_start_and_stop_tokens():
+    encoder = Encoder(add_start_tokens=True, add_stop_tokens=True)
+    X = encoder.encode_index_array(["SA", "S"], max_peptide_length=3)
+    d = encoder.index_dict
+    expected = np.array([
+        [d["^"], d["S"], d["A"], d["$"], 0],
+        [d["^"], d["S"], d["$"], 0, 0],
+    ])
+    eq_(X.dtype, np.uint8)
+    assert (X == expected).all(), X
+
+def test_encoder_index_array_invalid_token():
+    encoder = Encoder()
+    with assert_raises(ValueError):
+        encoder.encode_index_array(["SXS"])
 
 def test_encoder_FOFE():
     # turn off the gap character '-' used for ends of shorter sequences
@@ -54,6 +69,21 @@ def test_encoder_FOFE_bidirectional():
     x = encoder.encode_FOFE(["AAA", "SSS", "SASA"], bidirectional=True)
     eq_(x.shape, (3, 40))
 
+def test_encoder_FOFE_values():
+    encoder = Encoder(variable_length_sequences=False)
+    A_idx = encoder.index_dict["A"]
+    S_idx = encoder.index_dict["S"]
+    x = encoder.encode_FOFE(["AS", "SAA"], alpha=0.5, bidirectional=True)
+    eq_(x.dtype, np.float32)
+    eq_(x[0, A_idx], 0.5)
+    eq_(x[0, S_idx], 1.0)
+    eq_(x[0, 20 + A_idx], 1.0)
+    eq_(x[0, 20 + S_idx], 0.5)
+    eq_(x[1, A_idx], 1.5)
+    eq_(x[1, S_idx], 0.25)
+    eq_(x[1, 20 + A_idx], 0.75)
+    eq_(x[1, 20 + S_idx], 1.0)
+
 def test_encoder_blosum():
     encoder = Encoder(variable_length_sequences=False)
     x = encoder.encode_blosum(["AAA", "SSS", "EEE"])
@@ -69,6 +99,26 @@ def test_encoder_onehot():
     x = encoder.encode_onehot(["AAA", "SSS", "EEE"])
     eq_(x.shape, (3, 3, 20))
 
+def test_encoder_onehot_matches_index_array():
+    encoder = Encoder()
+    peptides = ["SYF", "QQ", "C"]
+    X_index = encoder.encode_index_array(peptides, max_peptide_length=4)
+    X = encoder.encode_onehot(peptides, max_peptide_length=4, dtype="uint8")
+    eq_(X.dtype, np.uint8)
+    eq_(X.shape, (3, 4, 21))
+    assert (X.argmax(axis=-1) == X_index).all()
+    # padding past the end of each peptide is left as all zeros
+    eq_(X.sum(axis=-1).tolist(), [[1, 1, 1, 0], [1, 1, 0, 0], [1, 0, 0, 0]])
+
+def test_encoder_onehot_out_buffer():
+    encoder = Encoder(variable_length_sequences=False)
+    out = np.empty((2, 3, 20), dtype="float32")
+    X = encoder.encode_onehot(["AAA", "SSS"], out=out)
+    assert X is out
+    assert (X == encoder.encode_onehot(["AAA", "SSS"])).all()
+    with assert_raises(ValueError):
+        encoder.encode_onehot(["AAA", "SSS"], dtype="uint8", out=out)
+
 def test_encoder_blosum_with_positional_features():
     encoder = Encoder(
         variable_length_sequences=False,
@@ -85,6 +135,14 @@ def test_encoder_pmbec_with_positional_features():
     x = encoder.encode_pmbec(["AAA", "SSS", "EEE"])
     eq_(x.shape, (3, 3, 22))
 
+def test_encoder_blosum_out_buffer():
+    encoder = Encoder()
+    out = np.empty((2, 4, 20), dtype="float32")
+    X = encoder.encode_blosum(["AAA", "SSSS"], max_peptide_length=4, out=out)
+    assert X is out
+    assert (X[0, 3] == 0).all()
+    assert (X[0, 0] == X[1, 0]).sum() < 20
+
 def test_encoder_onehot_with_positional_features():
     encoder = Encoder(
         variable_length_sequences=False,
@@ -93,3 +151,14 @@ def test_encoder_onehot_with_positional_features():
     x = encoder.encode_onehot(["AAA", "SSS", "EEE"])
     eq_(x.shape, (3, 3, 22))
 
+
+def test_encoder_positional_features_variable_length():
+    encoder = Encoder(
+        add_normalized_position=True,
+        add_normalized_centrality=True)
+    x = encoder.encode_blosum(["SYF", "SSSSS"], max_peptide_length=5)
+    eq_(x.shape, (2, 5, 22))
+    eq_(x[0, :, 20].tolist(), [1.0, 0.0, 1.0, 0.0, 0.0])
+    assert np.allclose(x[0, :, 21], [0, 1.0 / 3, 2.0 / 3, 0, 0])
+    eq_(x[1, :, 20].tolist(), [1.0, 0.5, 0.0, 0.5, 1.0])
+    assert np.allclose(x[1, :, 21], [0, 0.2, 0.4, 0.6, 0.8])
@@ -0,0 +1,74 @@
+from pepnet.encoder import Encoder
+from pepnet.encoding_cache import EncodingCache
+from pepnet.peptide_batch import PeptideBatch
+from nose.tools import eq_
+
+def test_encoding_cache_same_as_encoder():
+    encoder = Encoder()
+    cache = EncodingCache()
+    peptides = ["SIINFEKL", "AAA", "SIINFEKL"]
+
+    def encode_fn(x):
+        return encoder.encode_onehot(x, max_peptide_length=9)
+
+    X = cache.encode("onehot", peptides, encode_fn)
+    assert (X == encode_fn(peptides)).all()
+    eq_(cache.misses, 3)
+    eq_(cache.hits, 0)
+    eq_(len(cache), 2)
+    X = cache.encode("onehot", peptides[::-1], encode_fn)
+    assert (X == encode_fn(peptides[::-1])).all()
+    eq_(cache.hits, 3)
+
+def test_encoding_cache_lru_eviction():
+    encoder = Encoder()
+
+    def encode_fn(x):
+        return encoder.encode_index_array(x, max_peptide_length=3)
+
+    row_size = encode_fn(["AAA"])[0].nbytes
+    cache = EncodingCache(max_bytes=2 * (row_size + 200))
+    cache.encode("index", ["AAA", "SSS"], encode_fn)
+    # touch AAA so that SSS is the least recently used entry
+    cache.encode("index", ["AAA"], encode_fn)
+    cache.encode("index", ["QQQ"], encode_fn)
+    eq_(len(cache), 2)
+    eq_(cache.evictions, 1)
+    cache.encode("index", ["AAA"], encode_fn)
+    eq_(cache.stats()["hits"], 2)
+    cache.encode("index", ["SSS"], encode_fn)
+    eq_(cache.misses, 4)
+
+def test_encoding_cache_peptide_batch():
+    encoder = Encoder()
+    cache = EncodingCache()
+    given = []
+
+    def encode_fn(peptides):
+        given.append(peptides)
+        return encoder.encode_index_array(peptides, max_peptide_length=4)
+
+    batch = PeptideBatch.from_list(["SIIN", "AL", "SIIN"])
+    X = cache.encode("index", batch, encode_fn)
+    assert (X == encoder.encode_index_array(batch, max_peptide_length=4)).all()
+    # distinct missing peptides are encoded as a PeptideBatch
+    assert isinstance(given[0], PeptideBatch)
+    eq_(given[0].to_list(), ["SIIN", "AL"])
+    # strings share entries with the same peptides from a batch
+    cache.encode("index", ["AL", "SIIN"], encode_fn)
+    eq_(cache.hits, 2)
+    eq_(len(given), 1)
+
+def test_sequence_inputs_share_encoding_cache():
+    from pepnet import SequenceInput
+    from pepnet.encoding_cache import shared_encoding_cache
+    cache = shared_encoding_cache()
+    cache.clear()
+    peptides = ["SIINFEKL", "AAA", "QYL"]
+    input1 = SequenceInput(length=9, variable_length=True, cache_encodings=True)
+    input2 = SequenceInput(length=9, variable_length=True, cache_encodings=True)
+    X1 = input1.encode(peptides)
+    hits_before = cache.hits
+    X2 = input2.encode(peptides)
+    eq_(cache.hits - hits_before, len(peptides))
+    assert (X1 == X2).all()
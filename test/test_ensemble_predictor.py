@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+import os
+
+from pepnet import EnsemblePredictor
+from nose.tools import eq_, assert_raises
+import numpy as np
+
+from predictor_helpers import make_conv_predictor
+
+peptides = ["SIINFEKL", "AAAAAAA", "QQQQ", "YLLPAIVH"]
+
+def test_ensemble_shares_matching_encodings():
+    ensemble = EnsemblePredictor([
+        make_conv_predictor(),
+        make_conv_predictor(encoding="blosum"),
+        make_conv_predictor()])
+    eq_(ensemble.n_encodings, 2)
+    eq_(ensemble.member_input_names,
+        [["peptide"], ["peptide_1"], ["peptide"]])
+
+def test_ensemble_invalid_arguments():
+    with assert_raises(ValueError):
+        EnsemblePredictor([])
+    with assert_raises(ValueError):
+        EnsemblePredictor([make_conv_predictor()], reduction="mode")
+    with assert_raises(ValueError):
+        EnsemblePredictor([make_conv_predictor(), make_conv_predictor(output_name="z")])
+
+def test_ensemble_mean_and_median():
+    predictors = [make_conv_predictor() for _ in range(3)] + [
+        make_conv_predictor(encoding="blosum")]
+    member_predictions = np.array([
+        p.predict(peptides)["y"] for p in predictors])
+    mean = EnsemblePredictor(predictors).predict(peptides)["y"]
+    assert np.allclose(mean, member_predictions.mean(axis=0), atol=1e-6)
+    median = EnsemblePredictor(predictors, reduction="median").predict(
+        peptides)["y"]
+    assert np.allclose(
+        median, np.median(member_predictions, axis=0), atol=1e-6)
+
+def test_ensemble_save_and_load():
+    directory = tempfile.mkdtemp()
+    try:
+        ensemble = EnsemblePredictor(
+            [make_conv_predictor(), make_conv_predictor()], reduction="median")
+        expected = ensemble.predict(peptides)["y"]
+        filename = os.path.join(directory, "ensemble.json")
+        ensemble.save(filename)
+        loaded = EnsemblePredictor.load(filename, mmap_mode="r")
+        eq_(loaded.reduction, "median")
+        assert np.allclose(loaded.predict(peptides)["y"], expected)
+        from_dict = EnsemblePredictor.from_dict(ensemble.to_dict())
+        assert np.allclose(from_dict.predict(peptides)["y"], expected)
+    finally:
+        shutil.rmtree(directory)
+
+def max_reduction(x):
+    import keras.backend as K
+    return K.max(x, axis=1)
+
+def test_ensemble_custom_reduction():
+    predictors = [make_conv_predictor() for _ in range(3)]
+    member_predictions = np.array([
+        p.predict(peptides)["y"] for p in predictors])
+    ensemble = EnsemblePredictor(predictors, reduction=max_reduction)
+    expected = member_predictions.max(axis=0)
+    assert np.allclose(ensemble.predict(peptides)["y"], expected, atol=1e-6)
+    from_dict = EnsemblePredictor.from_dict(ensemble.to_dict())
+    assert from_dict.reduction is max_reduction
+    assert np.allclose(from_dict.predict(peptides)["y"], expected, atol=1e-6)
+
+def test_ensemble_lambda_reduction_not_serializable():
+    import keras.backend as K
+    ensemble = EnsemblePredictor(
+        [make_conv_predictor()], reduction=lambda x: K.max(x, axis=1))
+    with assert_raises(ValueError):
+        ensemble.to_dict()
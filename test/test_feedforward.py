@@ -16,3 +16,15 @@ def test_fixed_length_embedding_network():
     seqs = ["A" * 9, "L" * 9]
     y = model.predict(seqs)
     eq_(len(y), 2)
+
+def test_compact_input_blosum_network():
+    sequence_input = SequenceInput(
+        length=9, variable_length=True, encoding="blosum", compact_input=True)
+    X = sequence_input.encode(["A" * 9, "L" * 8])
+    eq_(X.shape, (2, 9))
+    eq_(X[1, 8], sequence_input.n_symbols)
+    model = Predictor(
+        inputs=sequence_input,
+        outputs=Output(1, activation="sigmoid"))
+    y = model.predict(["A" * 9, "L" * 8])
+    eq_(len(y), 2)
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+from nose.tools import eq_
+
+# modules which take seconds to import and should only be loaded once a
+# model is built or a default Encoder is created
+HEAVY_MODULES = ["keras", "tensorflow", "pepdata", "sklearn"]
+
+IMPORT_SCRIPT = """
+import sys
+import time
+start = time.time()
+import pepnet
+import pepnet.sequence_helpers
+import pepnet.synthetic_data
+elapsed = time.time() - start
+print("%%f %%s" %% (
+    elapsed, ",".join(m for m in %r if m in sys.modules)))
+""" % (HEAVY_MODULES,)
+
+def _import_pepnet():
+    """
+    Import pepnet in a fresh interpreter, returning the number of seconds
+    the import took and the heavy modules it loaded.
+    """
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT])
+    elapsed, _, loaded = output.decode("ascii").splitlines()[-1].partition(" ")
+    return float(elapsed), [m for m in loaded.split(",") if m]
+
+def test_import_does_not_load_heavy_dependencies():
+    eq_(_import_pepnet()[1], [])
+
+def test_import_time():
+    # only reported rather than asserted, since timings depend on the machine
+    elapsed, _ = _import_pepnet()
+    print("import pepnet took %0.3fs" % elapsed)
@@ -0,0 +1,33 @@
+from pepnet.losses import masked_mse, masked_binary_crossentropy
+import keras.backend as K
+import numpy as np
+
+nan = np.nan
+
+def _eval(loss, y_true, y_pred):
+    return K.eval(loss(
+        K.constant(np.array(y_true, dtype="float32")),
+        K.constant(np.array(y_pred, dtype="float32"))))
+
+def test_masked_mse_without_missing_targets():
+    y_true = [[1.0, 0.0], [0.5, 0.5]]
+    y_pred = [[0.0, 0.0], [0.5, 1.5]]
+    assert np.allclose(_eval(masked_mse, y_true, y_pred), [0.5, 0.5])
+
+def test_masked_mse_ignores_missing_targets():
+    y_true = [[1.0, nan], [nan, nan], [0.0, 2.0]]
+    y_pred = [[0.0, 5.0], [1.0, 1.0], [1.0, 1.0]]
+    # samples without observed targets get zero loss
+    assert np.allclose(_eval(masked_mse, y_true, y_pred), [1.0, 0.0, 1.0])
+
+def test_masked_binary_crossentropy_ignores_missing_targets():
+    y_true = [[1.0, nan], [nan, nan]]
+    y_pred = [[0.5, 0.9], [0.1, 0.1]]
+    assert np.allclose(
+        _eval(masked_binary_crossentropy, y_true, y_pred),
+        [np.log(2), 0.0])
+
+def test_masked_mse_without_observed_targets():
+    y_true = [[nan, nan], [nan, nan]]
+    y_pred = [[0.0, 5.0], [1.0, 1.0]]
+    assert np.allclose(_eval(masked_mse, y_true, y_pred), [0.0, 0.0])
@@ -0,0 +1,220 @@
+import os
+import pickle
+import shutil
+import tempfile
+
+from pepnet import Predictor, SequenceInput, Output
+from pepnet.numpy_model import NumpyModel, NumpyPredictor
+from nose.tools import eq_
+import numpy as np
+
+def _embedding_dense_model(n_symbols, length, embedding_dim=2):
+    rng = np.random.RandomState(0)
+    weights = [
+        rng.randn(n_symbols, embedding_dim).astype("float32"),
+        rng.randn(length * embedding_dim, 1).astype("float32"),
+        rng.randn(1).astype("float32"),
+    ]
+    ops = [
+        {"type": "embedding", "config": {"mask_zero": False},
+         "inputs": [0], "output": 1, "weights": [0]},
+        {"type": "flatten", "config": {}, "inputs": [1], "output": 2,
+         "weights": []},
+        {"type": "dense", "config": {"activation": "sigmoid", "use_bias": True},
+         "inputs": [2], "output": 3, "weights": [1, 2]},
+    ]
+    return NumpyModel(
+        ops=ops, weights=weights, input_ids=[0], output_ids=[3],
+        input_dtypes=["int32"])
+
+def test_numpy_conv_same_padding():
+    rng = np.random.RandomState(0)
+    x = rng.randn(2, 5, 3).astype("float32")
+    kernel = rng.randn(3, 3, 4).astype("float32")
+    model = NumpyModel(
+        ops=[{
+            "type": "conv1d",
+            "config": {
+                "strides": 1, "dilation_rate": 1, "padding": "same",
+                "activation": "linear", "use_bias": False, "masked": True},
+            "inputs": [0], "output": 1, "weights": [0]}],
+        weights=[kernel], input_ids=[0], output_ids=[1])
+    result = model.predict(x)
+    eq_(result.shape, (2, 5, 4))
+    padded = np.pad(x, ((0, 0), (1, 1), (0, 0)), mode="constant")
+    expected = np.zeros_like(result)
+    for t in range(5):
+        for i in range(3):
+            expected[:, t] += padded[:, t + i].dot(kernel[i])
+    assert np.allclose(result, expected, atol=1e-5)
+
+def test_numpy_masked_pooling():
+    indices = np.array([[1, 2, 0, 0], [2, 2, 2, 1]])
+    table = np.array([[0, 0], [-1, 3], [-2, 1]], dtype="float32")
+    ops = [
+        {"type": "embedding", "config": {"mask_zero": True},
+         "inputs": [0], "output": 1, "weights": [0]},
+        {"type": "max_pooling1d",
+         "config": {"pool_size": 2, "strides": 1, "padding": "valid",
+                    "masked": True},
+         "inputs": [1], "output": 2, "weights": []},
+        {"type": "global_average_pooling1d", "config": {"masked": True},
+         "inputs": [2], "output": 3, "weights": []},
+    ]
+    model = NumpyModel(
+        ops=ops, weights=[table], input_ids=[0], output_ids=[3],
+        input_dtypes=["int32"])
+    result = model.predict(indices)
+    # first row: pooled windows are [-1, 3], [0, 1], [0, 0] and the mask
+    # of the last window is 0
+    assert np.allclose(result[0], [-0.5, 2.0]), result
+    assert np.allclose(result[1], [-5.0 / 3, 5.0 / 3]), result
+
+def test_numpy_masked_global_max_pooling_negative_activations():
+    indices = np.array([[1, 2, 0]])
+    table = np.array([[5, 5], [-1, -3], [-2, 1]], dtype="float32")
+    results = []
+    for exclude_masked in [False, True]:
+        ops = [
+            {"type": "embedding", "config": {"mask_zero": True},
+             "inputs": [0], "output": 1, "weights": [0]},
+            {"type": "global_max_pooling1d",
+             "config": {"masked": True, "exclude_masked": exclude_masked},
+             "inputs": [1], "output": 2, "weights": []},
+        ]
+        model = NumpyModel(
+            ops=ops, weights=[table], input_ids=[0], output_ids=[2],
+            input_dtypes=["int32"])
+        results.append(model.predict(indices)[0])
+    # masked steps count as zeros unless they're excluded
+    assert np.allclose(results[0], [0, 1]), results[0]
+    assert np.allclose(results[1], [-1, 1]), results[1]
+
+def test_numpy_masking_and_zero_masked_steps():
+    x = np.array([[[1, -2], [0, 0], [3, 0]]], dtype="float32")
+    ops = [
+        {"type": "masking", "config": {"mask_value": 0.0},
+         "inputs": [0], "output": 1, "weights": []},
+        {"type": "dense", "config": {"activation": "linear", "use_bias": True},
+         "inputs": [1], "output": 2, "weights": [0, 1]},
+        {"type": "zero_masked_steps", "config": {},
+         "inputs": [2], "output": 3, "weights": []},
+        {"type": "global_max_pooling1d",
+         "config": {"masked": True, "exclude_masked": True},
+         "inputs": [3], "output": 4, "weights": []},
+    ]
+    kernel = np.array([[1.0], [1.0]], dtype="float32")
+    bias = np.array([-10.0], dtype="float32")
+    model = NumpyModel(
+        ops=ops, weights=[kernel, bias], input_ids=[0], output_ids=[4])
+    # the all-zero step is masked, so its dense output (-10) is ignored
+    # and the max is taken over -11 and -7
+    assert np.allclose(model.predict(x), [[-7.0]])
+
+def test_numpy_lstm_ignores_masked_steps():
+    rng = np.random.RandomState(1)
+    units = 3
+    weights = [
+        rng.randn(2, 4 * units).astype("float32"),
+        rng.randn(units, 4 * units).astype("float32"),
+        rng.randn(4 * units).astype("float32"),
+    ]
+    config = {
+        "rnn_type": "lstm", "units": units, "activation": "tanh",
+        "recurrent_activation": "hard_sigmoid", "use_bias": True,
+        "reset_after": False, "go_backwards": False,
+        "return_sequences": False}
+    table = rng.randn(4, 2).astype("float32")
+    ops = [
+        {"type": "embedding", "config": {"mask_zero": True},
+         "inputs": [0], "output": 1, "weights": [0]},
+        {"type": "rnn", "config": config,
+         "inputs": [1], "output": 2, "weights": [1, 2, 3]},
+    ]
+    model = NumpyModel(
+        ops=ops, weights=[table] + weights, input_ids=[0], output_ids=[2])
+    padded = model.predict(np.array([[1, 3, 2, 0, 0]]))
+    unpadded = model.predict(np.array([[1, 3, 2]]))
+    assert np.allclose(padded, unpadded)
+
+def test_numpy_predictor_save_load_and_pickle():
+    predictor = Predictor(
+        inputs=SequenceInput(length=3, variable_length=True, encoding="embedding"),
+        outputs=Output(dim=1, activation="sigmoid"))
+    n_symbols = predictor.inputs[0].n_symbols
+    numpy_predictor = NumpyPredictor(
+        architecture=predictor._architecture_dict(),
+        model=_embedding_dense_model(n_symbols, length=3))
+    peptides = ["SIY", "AL", "QQ"]
+    y = numpy_predictor.predict(peptides)
+    eq_(y.shape, (3,))
+    assert not predictor.is_built
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "numpy_model.json")
+        numpy_predictor.save(filename)
+        for mmap_mode in [None, "r"]:
+            loaded = NumpyPredictor.load(filename, mmap_mode=mmap_mode)
+            assert np.allclose(y, loaded.predict(peptides))
+    finally:
+        shutil.rmtree(directory)
+    unpickled = pickle.loads(pickle.dumps(numpy_predictor))
+    assert np.allclose(y, unpickled.predict(peptides))
+
+def test_compile_numpy_matches_keras():
+    predictor = Predictor(
+        inputs=SequenceInput(
+            length=10,
+            variable_length=True,
+            encoding="embedding",
+            embedding_dim=8,
+            mask_zero=True,
+            conv_filter_sizes=[{3: 4, 5: 4}, {2: 4}],
+            conv_batch_normalization=True,
+            pool_size=2,
+            pool_stride=1,
+            global_pooling=True,
+            dense_layer_sizes=[6],
+            n_highway_layers=1),
+        outputs=Output(dim=1, activation="sigmoid"))
+    peptides = ["SIINFEKL", "AAAAL", "QYQYQYQYQY", "MM"]
+    numpy_predictor = predictor.compile_numpy()
+    assert np.allclose(
+        predictor.predict(peptides),
+        numpy_predictor.predict(peptides),
+        atol=1e-5)
+
+def test_compile_numpy_matches_keras_rnn():
+    for rnn_type in ["lstm", "gru"]:
+        predictor = Predictor(
+            inputs=SequenceInput(
+                length=8,
+                variable_length=True,
+                encoding="onehot",
+                rnn_layer_sizes=[5],
+                rnn_type=rnn_type,
+                rnn_bidirectional=True),
+            outputs=Output(dim=2, activation="sigmoid", name="y"))
+        peptides = ["SIINFEKL", "AAL", "QYQ"]
+        y = predictor.predict(peptides)
+        y_numpy = predictor.compile_numpy().predict(peptides)
+        assert np.allclose(y["y"], y_numpy["y"], atol=1e-5)
+
+def test_compile_numpy_matches_keras_dynamic_length():
+    for encoding in ["embedding", "blosum"]:
+        predictor = Predictor(
+            inputs=SequenceInput(
+                length=10,
+                variable_length=True,
+                dynamic_length=True,
+                encoding=encoding,
+                conv_filter_sizes=[{3: 4}, {2: 4}],
+                pool_size=1,
+                pool_stride=1,
+                global_pooling=True),
+            outputs=Output(dim=1, activation="sigmoid"))
+        peptides = ["SIINFEKL", "AAAAL", "QYQYQYQYQY", "MM"]
+        assert np.allclose(
+            predictor.predict(peptides),
+            predictor.compile_numpy().predict(peptides),
+            atol=1e-5), encoding
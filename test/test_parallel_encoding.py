@@ -0,0 +1,86 @@
+from pepnet.encoder import Encoder
+from pepnet.peptide_batch import PeptideBatch
+import pepnet.parallel
+from nose.tools import eq_
+import numpy as np
+
+peptides = ["SIINFEKL", "AAA", "QYL", "YLLPAIVHI", "GILGFVFTL"] * 20
+
+def _with_parallel_threshold(fn):
+    def wrapped():
+        old_threshold = pepnet.parallel.MIN_PEPTIDES_FOR_PARALLEL_ENCODING
+        pepnet.parallel.MIN_PEPTIDES_FOR_PARALLEL_ENCODING = 0
+        try:
+            fn()
+        finally:
+            pepnet.parallel.MIN_PEPTIDES_FOR_PARALLEL_ENCODING = old_threshold
+    wrapped.__name__ = fn.__name__
+    return wrapped
+
+@_with_parallel_threshold
+def test_parallel_encoding_same_as_serial():
+    encoder = Encoder(add_start_tokens=True)
+    for method_name in [
+            "encode_index_array",
+            "encode_onehot",
+            "encode_blosum",
+            "encode_pmbec"]:
+        method = getattr(encoder, method_name)
+        serial = method(peptides, max_peptide_length=10)
+        parallel = method(peptides, max_peptide_length=10, n_jobs=3)
+        eq_(serial.dtype, parallel.dtype)
+        assert (serial == parallel).all(), method_name
+    assert np.allclose(
+        encoder.encode_FOFE(peptides, bidirectional=True),
+        encoder.encode_FOFE(peptides, bidirectional=True, n_jobs=3))
+
+@_with_parallel_threshold
+def test_parallel_encoding_peptide_batch():
+    encoder = Encoder()
+    batch = PeptideBatch.from_list(peptides)
+    out = np.zeros((len(peptides), 9), dtype="uint8")
+    X = encoder.encode_index_array(batch, n_jobs=2, out=out)
+    assert X is out
+    assert (X == encoder.encode_index_array(peptides)).all()
+
+@_with_parallel_threshold
+def test_parallel_encoding_result_is_memory_mapped():
+    encoder = Encoder()
+    X = encoder.encode_index_array(peptides, n_jobs=2)
+    assert isinstance(X, np.memmap)
+    assert (X == encoder.encode_index_array(peptides)).all()
+
+@_with_parallel_threshold
+def test_parallel_encoding_into_memmap():
+    import os
+    import tempfile
+    encoder = Encoder()
+    fd, path = tempfile.mkstemp(suffix=".npy")
+    os.close(fd)
+    try:
+        out = np.lib.format.open_memmap(
+            path, mode="w+", dtype="uint8", shape=(len(peptides), 9))
+        X = encoder.encode_index_array(peptides, n_jobs=2, out=out)
+        assert X is out
+        assert (np.load(path) == encoder.encode_index_array(peptides)).all()
+    finally:
+        os.unlink(path)
+
+@_with_parallel_threshold
+def test_parallel_encoding_reuses_pool():
+    encoder = Encoder()
+    encoder.encode_index_array(peptides, n_jobs=2)
+    pool = pepnet.parallel._pool
+    encoder.encode_onehot(peptides, n_jobs=2)
+    assert pepnet.parallel._pool is pool
+    pepnet.parallel.shutdown_pool()
+    assert pepnet.parallel._pool is None
+
+@_with_parallel_threshold
+def test_parallel_encoding_reuses_result_as_output():
+    encoder = Encoder()
+    X = encoder.encode_index_array(peptides, n_jobs=2)
+    X[:] = 0
+    Y = encoder.encode_index_array(peptides, n_jobs=2, out=X)
+    assert Y is X
+    assert (Y == encoder.encode_index_array(peptides)).all()
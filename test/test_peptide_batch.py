@@ -0,0 +1,62 @@
+from pepnet.peptide_batch import PeptideBatch
+from pepnet.encoder import Encoder
+from nose.tools import eq_
+import numpy as np
+import os
+import tempfile
+
+peptides = ["SIINFEKL", "AAA", "Q", "YLLPAIVHI"]
+
+def test_peptide_batch_from_list():
+    batch = PeptideBatch.from_list(peptides)
+    eq_(len(batch), 4)
+    eq_(batch.to_list(), peptides)
+    eq_(batch.lengths.tolist(), [8, 3, 1, 9])
+    eq_(batch.max_length, 9)
+    eq_(batch[1], "AAA")
+
+def test_peptide_batch_slicing_shares_residues():
+    batch = PeptideBatch.from_list(peptides)
+    sliced = batch[1:3]
+    assert sliced.residues is batch.residues
+    eq_(sliced.to_list(), ["AAA", "Q"])
+    eq_(batch[np.array([3, 0])].to_list(), ["YLLPAIVHI", "SIINFEKL"])
+
+def test_peptide_batch_from_array():
+    batch = PeptideBatch.from_array(np.array(peptides, dtype="S"))
+    eq_(batch.to_list(), peptides)
+    batch = PeptideBatch.from_array(np.array(peptides))
+    eq_(batch.to_list(), peptides)
+
+def test_peptide_batch_concatenate():
+    batch = PeptideBatch.from_list(peptides)
+    combined = PeptideBatch.concatenate([batch[np.array([3, 1])], ["KK"]])
+    eq_(combined.to_list(), ["YLLPAIVHI", "AAA", "KK"])
+    eq_(len(combined.residues), 14)
+
+def test_peptide_batch_file_roundtrip():
+    batch = PeptideBatch.from_list(peptides)
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    os.close(fd)
+    try:
+        batch.to_file(path)
+        eq_(PeptideBatch.from_file(path).to_list(), peptides)
+        eq_(PeptideBatch.from_file(path, mmap_mode="r").to_list(), peptides)
+    finally:
+        os.remove(path)
+
+def test_peptide_batch_encoding_same_as_list():
+    encoder = Encoder(add_start_tokens=True, add_stop_tokens=True)
+    batch = PeptideBatch.from_list(peptides)
+    assert (
+        encoder.encode_index_array(batch, 10) ==
+        encoder.encode_index_array(peptides, 10)).all()
+    assert (
+        encoder.encode_onehot(batch, 10) ==
+        encoder.encode_onehot(peptides, 10)).all()
+    assert (
+        encoder.encode_blosum(batch[1:], 10) ==
+        encoder.encode_blosum(peptides[1:], 10)).all()
+    assert np.allclose(
+        encoder.encode_FOFE(batch, bidirectional=True),
+        encoder.encode_FOFE(peptides, bidirectional=True))
@@ -1,10 +1,16 @@
+import shutil
+import tempfile
+
 import pandas
 from numpy.random import randn
 from numpy import log, exp
 
-from pepnet import Predictor, SequenceInput, NumericInput, Output
+from pepnet import (
+    Predictor, SequenceInput, NumericInput, Output, EncodedDatasetStore,
+    ShardedDataset)
 from pepnet.synthetic_data import synthetic_peptides_by_subsequence
-from nose.tools import eq_
+from nose.tools import eq_, assert_raises
+import numpy as np
 
 
 def test_simple_numeric_predictor():
@@ -93,3 +99,322 @@ def test_predictor_on_more_data():
     print(binder_mean_pred, nonbinder_mean_pred)
     assert binder_mean_pred > nonbinder_mean_pred * 2, (
         binder_mean_pred, nonbinder_mean_pred)
+
+def test_chunked_predict_same_as_predict():
+    predictor = Predictor(
+        inputs=[
+            SequenceInput(length=4, name="x1", variable_length=True),
+            NumericInput(dim=30, name="x2")],
+        outputs=[Output(name="y", dim=1, activation="sigmoid")],
+        dense_layer_sizes=[30],
+        dense_activation="relu")
+    inputs = {
+        "x1": ["SFY-", "AL", "QQQ"] * 5,
+        "x2": randn(15, 30)}
+    y = predictor.predict(inputs)["y"]
+    y_chunked = predictor.predict(inputs, chunk_size=4)["y"]
+    assert (y == y_chunked).all(), (y, y_chunked)
+
+def test_predict_iter():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, name="x", variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid", name="y")],
+        dense_layer_sizes=[30],
+        dense_activation="relu")
+    peptides = ["SFY", "AL", "QQQ", "SIIN", "Y"]
+    expected = predictor.predict({"x": peptides})["y"]
+    samples = ({"x": p} for p in peptides)
+    batches = list(predictor.predict_iter(samples, batch_size=2))
+    eq_([len(batch["x"]) for (batch, _) in batches], [2, 2, 1])
+    y = np.concatenate([predictions["y"] for (_, predictions) in batches])
+    assert np.allclose(y, expected), (y, expected)
+
+def test_chunked_predict_with_prefetch():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY-", "AL", "QQQ"] * 5
+    y = predictor.predict(peptides)
+    y_prefetched = predictor.predict(peptides, chunk_size=4, prefetch_depth=2)
+    assert np.allclose(y, y_prefetched), (y, y_prefetched)
+
+def _prefetch_threads():
+    import threading
+    from pepnet.prefetch import PREFETCH_THREAD_NAME
+    return [
+        thread for thread in threading.enumerate()
+        if thread.name == PREFETCH_THREAD_NAME]
+
+def _fail_after_first_predict(predictor):
+    model = predictor.model
+    original_predict = model.predict
+    calls = []
+    def predict(*args, **kwargs):
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("model failed")
+        return original_predict(*args, **kwargs)
+    model.predict = predict
+
+def test_chunked_predict_with_prefetch_stops_thread_on_error():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    _fail_after_first_predict(predictor)
+    peptides = ["SFY-", "AL", "QQQ"] * 20
+    with assert_raises(RuntimeError):
+        predictor.predict(peptides, chunk_size=2, prefetch_depth=2)
+    eq_(_prefetch_threads(), [])
+
+def test_predict_iter_with_prefetch_stops_thread():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY-", "AL", "QQQ"] * 20
+    batches = predictor.predict_iter(peptides, batch_size=2, prefetch_depth=2)
+    next(batches)
+    batches.close()
+    eq_(_prefetch_threads(), [])
+    _fail_after_first_predict(predictor)
+    with assert_raises(RuntimeError):
+        for _ in predictor.predict_iter(
+                peptides, batch_size=2, prefetch_depth=2):
+            pass
+    eq_(_prefetch_threads(), [])
+
+def test_predict_dedup_same_as_predict():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY-", "AL", "QQQ", "AL", "SFY-", "AL"]
+    y = predictor.predict(peptides)
+    y_dedup = predictor.predict(peptides, dedup=True)
+    assert np.allclose(y, y_dedup), (y, y_dedup)
+    eq_(predictor.dedup_counter.ratio, 2.0)
+
+def test_predict_from_dataset_store():
+    directory = tempfile.mkdtemp()
+    try:
+        seq_input = SequenceInput(length=4, variable_length=True)
+        predictor = Predictor(
+            inputs=[seq_input],
+            outputs=[Output(dim=1, activation="sigmoid")])
+        peptides = ["SFY", "AL", "QQQ", "ALAL"]
+        store = EncodedDatasetStore.create(directory, seq_input, peptides)
+        y = predictor.predict(peptides)
+        y_store = predictor.predict(store.encoded, chunk_size=3)
+        assert np.allclose(y, y_store), (y, y_store)
+        predictor.fit(store.encoded, [0, 1, 0, 1], epochs=1)
+    finally:
+        shutil.rmtree(directory)
+
+def test_sequence_input_encode_into_buffer():
+    seq_input = SequenceInput(
+        length=4, variable_length=True, encoding="embedding")
+    out = np.zeros((8, 4), dtype="int32")
+    result = seq_input.encode(["SFY", "AL"], out=out[:2])
+    assert (out[:2] == seq_input.encode(["SFY", "AL"])).all()
+    eq_(result.dtype, np.dtype("int32"))
+    seq_input = SequenceInput(length=4, variable_length=True)
+    out = np.zeros((2, 4, seq_input.n_input_dims), dtype="float32")
+    seq_input.encode(["SFY", "AL"], out=out)
+    assert (out == seq_input.encode(["SFY", "AL"])).all()
+
+def test_score_small_same_as_predict():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    predictor.warmup(["SFY"], max_batch_size=4)
+    peptides = ["SFY", "AL", "QQQ"]
+    assert np.allclose(predictor.predict(peptides), predictor.score_small(peptides))
+    # larger batches fall back to predict
+    peptides = peptides * 3
+    assert np.allclose(predictor.predict(peptides), predictor.score_small(peptides))
+
+def test_score_small_large_batch_without_warmup():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY", "AL", "QQQ"] * 30
+    assert np.allclose(predictor.predict(peptides), predictor.score_small(peptides))
+    # too many samples to warm up with, so predict was used directly
+    assert predictor._small_batch_state is None
+    predictor.warmup(peptides, max_batch_size=4, n_iters=1)
+    assert np.allclose(
+        predictor.predict(peptides[:4]), predictor.score_small(peptides[:4]))
+
+def test_score_small_empty_batch():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    eq_(len(predictor.score_small([])), 0)
+    assert predictor._small_batch_state is None
+    predictor.warmup(["SFY"], max_batch_size=4, n_iters=1)
+    eq_(len(predictor.score_small([])), 0)
+    eq_(len(predictor.score_small([], decode=False)), 0)
+
+
+
+def test_dynamic_length_requires_summarized_sequence():
+    assert_raises(
+        ValueError, SequenceInput, length=4, dynamic_length=True)
+    assert_raises(
+        ValueError,
+        SequenceInput,
+        length=4,
+        variable_length=True,
+        dynamic_length=True)
+    # padding has to be masked
+    assert_raises(
+        ValueError,
+        SequenceInput,
+        length=4,
+        variable_length=True,
+        dynamic_length=True,
+        encoding="embedding",
+        mask_zero=False,
+        global_pooling=True)
+    # local max pooling would see different windows once padding is trimmed
+    assert_raises(
+        ValueError,
+        SequenceInput,
+        length=4,
+        variable_length=True,
+        dynamic_length=True,
+        conv_filter_sizes=[{3: 4}, {3: 4}],
+        global_pooling=True)
+
+
+def test_length_buckets():
+    predictor = Predictor(
+        inputs=[SequenceInput(
+            length=6,
+            variable_length=True,
+            dynamic_length=True,
+            global_pooling=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY", "ALMNQ", "QQQ", "AL", "SIINF", "KK"]
+    buckets = predictor._length_buckets(peptides)
+    eq_([list(b) for b in buckets], [[3, 5], [0, 2], [1, 4]])
+    buckets = predictor._length_buckets(peptides * 2, batch_size=3)
+    eq_([len(b) for b in buckets], [3, 1, 3, 1, 3, 1])
+
+
+def test_bucketed_predict_same_as_predict():
+    predictor = Predictor(
+        inputs=[SequenceInput(
+            length=8,
+            variable_length=True,
+            dynamic_length=True,
+            encoding="embedding",
+            embedding_dim=8,
+            global_pooling=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY", "ALMNQ", "QQQ", "AL", "SIINFEKL", "KK"] * 3
+    assert np.allclose(
+        predictor.predict(peptides),
+        predictor.predict(peptides, bucket_by_length=True, chunk_size=4))
+    predictor.fit(
+        peptides, np.ones(len(peptides)),
+        epochs=1, batch_size=4, bucket_by_length=True)
+
+
+def test_bucketed_predict_same_as_predict_vector_encodings():
+    peptides = ["SFY", "ALMNQ", "QQQ", "AL", "SIINFEKL", "KK"] * 3
+    for encoding, compact_input in [
+            ("onehot", False),
+            ("blosum", False),
+            ("pmbec", True)]:
+        predictor = Predictor(
+            inputs=[SequenceInput(
+                length=8,
+                variable_length=True,
+                dynamic_length=True,
+                encoding=encoding,
+                compact_input=compact_input,
+                conv_filter_sizes=[{3: 4}, {2: 4}],
+                pool_size=1,
+                pool_stride=1,
+                global_pooling=True)],
+            outputs=[Output(dim=1, activation="sigmoid")])
+        assert np.allclose(
+            predictor.predict(peptides),
+            predictor.predict(peptides, bucket_by_length=True, chunk_size=4),
+            atol=1e-6), encoding
+
+
+def test_score_small_dynamic_length():
+    predictor = Predictor(
+        inputs=[SequenceInput(
+            length=8,
+            variable_length=True,
+            dynamic_length=True,
+            global_pooling=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY", "ALMNQ", "SIINFEKL"]
+    predictor.warmup(peptides, max_batch_size=4, n_iters=1)
+    assert np.allclose(
+        predictor.predict(peptides), predictor.score_small(peptides))
+
+
+def test_predictor_sequence_batches():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY", "AL", "QQQ", "KKKK", "SIIN"]
+    sequence = predictor.make_sequence(
+        peptides, np.arange(5), batch_size=2, shuffle=True)
+    eq_(len(sequence), 3)
+    seen = []
+    for idx in range(len(sequence)):
+        inputs, outputs = sequence[idx]
+        eq_(len(inputs), len(outputs))
+        seen.extend(outputs.ravel())
+    eq_(sorted(seen), list(range(5)))
+    sequence.on_epoch_end()
+    eq_(sorted(sequence.order), list(range(5)))
+
+
+def test_fit_sequence_without_shuffle_keeps_batch_order():
+    from pepnet.training_sequence import PredictorSequence
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY", "AL", "QQQ", "KKKK", "SIIN"] * 4
+    requested = []
+    original_getitem = PredictorSequence.__getitem__
+    def getitem(self, idx):
+        requested.append(idx)
+        return original_getitem(self, idx)
+    PredictorSequence.__getitem__ = getitem
+    try:
+        predictor.fit(
+            peptides, np.ones(len(peptides)), epochs=1, batch_size=4,
+            shuffle=False, sequence_min_samples=0)
+    finally:
+        PredictorSequence.__getitem__ = original_getitem
+    eq_(set(requested), set(range(5)))
+    eq_(requested, sorted(requested))
+
+
+def test_fit_with_workers():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    peptides = ["SFY", "AL", "QQQ", "KKKK", "SIIN"] * 4
+    predictor.fit(
+        peptides, np.ones(len(peptides)), epochs=1, batch_size=4, workers=2)
+
+
+def test_fit_sharded_dataset():
+    directory = tempfile.mkdtemp()
+    try:
+        peptides = ["SFY", "AL", "QQQ", "KKKK", "SIIN"] * 4
+        dataset = ShardedDataset.create(
+            directory, peptides, np.ones(len(peptides)), shard_size=6)
+        predictor = Predictor(
+            inputs=[SequenceInput(length=4, variable_length=True)],
+            outputs=[Output(dim=1, activation="sigmoid")])
+        predictor.fit(dataset, epochs=1, batch_size=4, shuffle_buffer_size=5)
+    finally:
+        shutil.rmtree(directory)
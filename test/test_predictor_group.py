@@ -0,0 +1,63 @@
+from pepnet import (
+    Predictor, PredictorGroup, SequenceInput, Output, SparseLabels)
+from nose.tools import eq_, assert_raises
+import numpy as np
+
+from predictor_helpers import make_conv_predictor
+
+def test_predictor_group_requires_compatible_predictors():
+    with assert_raises(ValueError):
+        PredictorGroup([])
+    with assert_raises(ValueError):
+        PredictorGroup([make_conv_predictor(4), make_conv_predictor(4, encoding="blosum")])
+    with assert_raises(ValueError):
+        PredictorGroup([make_conv_predictor(4), make_conv_predictor(4, output_name="z")])
+    group = PredictorGroup([make_conv_predictor(4), make_conv_predictor(8)])
+    eq_(len(group), 2)
+
+def test_predictor_group_fit_and_predict():
+    predictors = [make_conv_predictor(n) for n in [2, 4, 8]]
+    group = PredictorGroup(predictors)
+    peptides = ["SIINFEKL", "AAAAAAA", "QQQQ", "YLLPAIVH"] * 5
+    y = np.array([1, 0, 0, 1] * 5)
+    group.fit(peptides, y, epochs=2)
+    group_predictions = group.predict(peptides)
+    eq_(len(group_predictions), 3)
+    for predictor, predictions in zip(predictors, group_predictions):
+        assert np.allclose(predictor.predict(peptides)["y"], predictions["y"])
+
+def test_predictor_group_fit_sparse_labels():
+    predictors = [make_conv_predictor(n) for n in [2, 4]]
+    group = PredictorGroup(predictors)
+    peptides = ["SIINFEKL", "AAAAAAA", "QQQQ", "YLLPAIVH"] * 5
+    y = SparseLabels.from_dense(
+        np.array([1, np.nan, 0, 1] * 5, dtype="float32"))
+    # labels stay sparse until a batch is selected
+    outputs = group._prepare_outputs(y)
+    eq_(len(outputs), 2)
+    assert all(isinstance(x, SparseLabels) for x in outputs)
+    batch = group._dense_outputs(group._take_samples(outputs, [0, 1]))
+    eq_([x.shape for x in batch], [(2, 1), (2, 1)])
+    assert np.isnan(batch[0][1, 0])
+    history = group.fit(
+        peptides, y, epochs=1, batch_size=8, class_weight={0: 1.0, 1: 2.0},
+        verbose=0)
+    eq_(len(history.history["loss"]), 1)
+
+def test_predictor_group_partial_sample_weights():
+    predictors = [
+        Predictor(
+            inputs=[SequenceInput(name="peptide", length=8, variable_length=True)],
+            outputs=[
+                Output(name="a", dim=1, activation="sigmoid"),
+                Output(name="b", dim=1, activation="sigmoid")])
+        for _ in range(2)]
+    group = PredictorGroup(predictors)
+    peptides = ["SIINFEKL", "AAAAAAA", "QQQQ", "YLLPAIVH"]
+    y = {"a": np.array([1, 0, 0, 1]), "b": np.array([0, 1, 1, 0])}
+    with assert_raises(ValueError):
+        group.fit(
+            peptides, y, epochs=1, sample_weight={"a": np.ones(4)}, verbose=0)
+    group.fit(
+        peptides, y, epochs=1, verbose=0, sequence_min_samples=0,
+        sample_weight={"a": np.ones(4), "b": np.ones(4)})
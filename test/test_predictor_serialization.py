@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+
 from pepnet import Predictor, SequenceInput, Output
 from nose.tools import eq_
 import numpy as np
@@ -19,3 +23,35 @@ def test_predictor_weights_all_ones():
     predictor2 = Predictor.from_json(predictor.to_json())
     for w in predictor2.get_weights():
         assert (w == np.ones_like(w)).all(), "Expected %s to be all 1s" % (w,)
+
+def test_predictor_binary_weights_round_trip():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=3, variable_length=True, encoding="embedding")],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "model.json")
+        predictor.save(filename)
+        for mmap_mode in [None, "r"]:
+            predictor2 = Predictor.load(filename, mmap_mode=mmap_mode)
+            for w, w2 in zip(predictor.get_weights(), predictor2.get_weights()):
+                assert np.allclose(w, w2)
+        # files written by to_json_file can also be loaded
+        predictor.to_json_file(filename)
+        eq_(predictor, Predictor.load(filename))
+    finally:
+        shutil.rmtree(directory)
+
+def test_predictor_builds_lazily():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=3, variable_length=True, encoding="embedding")],
+        outputs=[Output(dim=1, activation="sigmoid")])
+    predictor2 = Predictor.from_json(predictor.to_json())
+    assert not predictor2.is_built
+    y = predictor.predict(["SIY", "AL"])
+    y2 = predictor2.predict(["SIY", "AL"])
+    assert np.allclose(y, y2)
+    assert predictor2.is_built
+    assert not predictor2._compiled
+    predictor2.fit(["SIY", "AL"], [0, 1], epochs=1)
+    assert predictor2._compiled
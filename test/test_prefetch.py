@@ -0,0 +1,26 @@
+from pepnet.prefetch import prefetch
+from nose.tools import eq_, assert_raises
+
+def test_prefetch_preserves_order():
+    eq_(list(prefetch(range(100), queue_depth=3)), list(range(100)))
+
+def test_prefetch_reraises_errors():
+    def generate():
+        yield 1
+        raise ValueError("oops")
+    values = []
+    with assert_raises(ValueError):
+        for x in prefetch(generate()):
+            values.append(x)
+    eq_(values, [1])
+
+def test_prefetch_stops_early():
+    consumed = []
+    def generate():
+        for i in range(1000):
+            consumed.append(i)
+            yield i
+    gen = prefetch(generate(), queue_depth=2)
+    eq_(next(gen), 0)
+    gen.close()
+    assert len(consumed) < 1000
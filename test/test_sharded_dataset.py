@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+
+from pepnet.sharded_dataset import ShardedDataset, ShardedDatasetWriter
+from nose.tools import eq_, assert_raises
+import numpy as np
+
+def _make_samples(n):
+    peptides = ["A" * (1 + i % 9) + "K" * (i // 9) for i in range(n)]
+    targets = np.arange(n, dtype="float32")
+    targets[::5] = np.nan
+    return peptides, targets
+
+def _peptide_index(peptide):
+    n_a = peptide.count("A")
+    return (n_a - 1) + 9 * peptide.count("K")
+
+def test_sharded_dataset_create_and_read():
+    directory = tempfile.mkdtemp()
+    try:
+        peptides, targets = _make_samples(25)
+        dataset = ShardedDataset.create(
+            directory, peptides, targets, shard_size=10)
+        eq_(dataset.shard_sizes, [10, 10, 5])
+        reopened = ShardedDataset.open(directory)
+        eq_(len(reopened), 25)
+        shard_peptides, shard_targets, weights = reopened.read_shard(1)
+        eq_(shard_peptides.to_list(), peptides[10:20])
+        assert np.allclose(
+            shard_targets, targets[10:20], equal_nan=True)
+        eq_(weights, None)
+    finally:
+        shutil.rmtree(directory)
+
+def test_sharded_dataset_shuffled_batches_cover_every_sample():
+    directory = tempfile.mkdtemp()
+    try:
+        peptides, targets = _make_samples(53)
+        with ShardedDatasetWriter(directory, shard_size=8) as writer:
+            for start in range(0, 53, 20):
+                writer.append(
+                    {"peptide": peptides[start:start + 20]},
+                    {"y": targets[start:start + 20]},
+                    sample_weight={"y": np.arange(start, min(53, start + 20))})
+        dataset = ShardedDataset.open(directory)
+        batches = list(dataset.iter_batches(
+            batch_size=4, shuffle=True, shuffle_buffer_size=12))
+        eq_(len(batches), dataset.n_batches(4))
+        seen = []
+        for inputs, outputs, weights in batches:
+            indices = [_peptide_index(p) for p in inputs["peptide"]]
+            eq_(list(weights["y"]), indices)
+            assert np.allclose(
+                outputs["y"], targets[indices], equal_nan=True)
+            seen.extend(indices)
+        eq_(sorted(seen), list(range(53)))
+    finally:
+        shutil.rmtree(directory)
+
+def test_sharded_dataset_writer_checks_fields():
+    directory = tempfile.mkdtemp()
+    try:
+        writer = ShardedDatasetWriter(directory, shard_size=8)
+        writer.append(["SIINFEKL"], [1.0])
+        with assert_raises(ValueError):
+            writer.append({"peptide": ["SIINFEKL"]}, [1.0])
+        with assert_raises(ValueError):
+            writer.append(["SIINFEKL", "AAA"], [1.0])
+        assert not ShardedDataset.exists(directory)
+        writer.close()
+        assert ShardedDataset.exists(directory)
+    finally:
+        shutil.rmtree(directory)
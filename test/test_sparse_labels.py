@@ -0,0 +1,59 @@
+from pepnet import SparseLabels, Predictor, SequenceInput, Output
+from nose.tools import eq_, assert_raises
+import numpy as np
+
+nan = np.nan
+dense = np.array([
+    [1.0, nan, nan],
+    [nan, nan, nan],
+    [nan, 2.0, 3.0],
+    [4.0, nan, nan],
+], dtype="float32")
+
+def _same(x, y):
+    return np.allclose(x, y, equal_nan=True)
+
+def test_sparse_labels_from_dense():
+    labels = SparseLabels.from_dense(dense)
+    eq_(labels.shape, (4, 3))
+    eq_(labels.n_observed, 4)
+    eq_(list(labels.observed_per_sample()), [1, 0, 2, 1])
+    assert _same(labels.to_dense(), dense)
+
+def test_sparse_labels_constructors_agree():
+    from_coo = SparseLabels.from_coo(
+        [3, 2, 0, 2], [0, 2, 0, 1], [4.0, 3.0, 1.0, 2.0], (4, 3))
+    from_columns = SparseLabels.from_columns(
+        4, [([0, 3], [1.0, 4.0]), ([2], [2.0]), ([2], [3.0])])
+    assert _same(from_coo.to_dense(), dense)
+    assert _same(from_columns.to_dense(), dense)
+
+def test_sparse_labels_select_samples():
+    labels = SparseLabels.from_dense(dense)
+    assert _same(labels[1:3].to_dense(), dense[1:3])
+    assert _same(labels[::2].to_dense(), dense[::2])
+    indices = np.array([3, 2, 2, 1])
+    assert _same(labels[indices].to_dense(), dense[indices])
+    assert _same(labels.column(1).to_dense(), dense[:, 1:2])
+    with assert_raises(TypeError):
+        labels[0]
+
+def test_predictor_keeps_sparse_outputs_until_densified():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=3, activation="sigmoid", transform=lambda x: x * 2)])
+    labels = SparseLabels.from_dense(dense)
+    outputs = predictor._prepare_outputs(labels, encode=True)
+    assert isinstance(outputs, SparseLabels)
+    batch = predictor._take_samples(outputs, np.array([2, 3]))
+    assert _same(predictor._dense_outputs(batch), dense[[2, 3]] * 2)
+    with assert_raises(ValueError):
+        predictor._prepare_outputs(SparseLabels.from_dense(dense[:, :2]))
+
+def test_fit_with_sparse_labels():
+    predictor = Predictor(
+        inputs=[SequenceInput(length=4, variable_length=True)],
+        outputs=[Output(dim=3, activation="sigmoid")])
+    labels = SparseLabels.from_dense(np.vstack([dense] * 4) / 4)
+    predictor.fit(["SFY", "AL", "QQQ", "KKKK"] * 4, labels, epochs=2, batch_size=2)
+    assert not np.isnan(predictor.predict(["SFY"])).any()
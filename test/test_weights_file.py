@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+
+from pepnet.weights_file import write_weights_file, read_weights_file
+from nose.tools import eq_, assert_raises
+import numpy as np
+
+def test_weights_file_round_trip():
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "model.weights")
+        weights = [
+            np.arange(6, dtype="float32").reshape((2, 3)),
+            np.array([1.5], dtype="float64"),
+            np.zeros((0, 4), dtype="float32"),
+            np.array(3, dtype="int64"),
+        ]
+        table = write_weights_file(filename, weights)
+        for mmap_mode in [None, "r"]:
+            loaded = read_weights_file(filename, table, mmap_mode=mmap_mode)
+            eq_(len(loaded), len(weights))
+            for w, w_loaded in zip(weights, loaded):
+                eq_(w.shape, w_loaded.shape)
+                eq_(w.dtype, w_loaded.dtype)
+                assert (w == w_loaded).all()
+        for entry in table:
+            eq_(entry["offset"] % 64, 0)
+    finally:
+        shutil.rmtree(directory)
+
+def test_weights_file_truncated():
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "model.weights")
+        table = write_weights_file(filename, [np.ones(10, dtype="float32")])
+        table[0]["shape"] = [20]
+        with assert_raises(ValueError):
+            read_weights_file(filename, table)
+    finally:
+        shutil.rmtree(directory)